@@ -6,9 +6,27 @@ import math
 import time
 import json
 
+import numpy as np
 from PySide import QtCore, QtGui
 
 import commons
+import compare
+import export
+import colormap
+import legend
+import journal
+import inspector
+import stationstore
+
+
+def rgb2Image(rgb, imageformat=QtGui.QImage.Format_RGB32):
+    # QImage can be created outside the GUI thread (not the QPixmap)
+    (height, width) = rgb.shape
+    buffer = rgb.tostring()
+    image = QtGui.QImage(buffer, width, height, imageformat)
+
+    # Copy, the image not own the buffer
+    return image.copy()
 
 
 class FreqDialog(QtGui.QDialog):
@@ -123,49 +141,175 @@ class FreqDialog(QtGui.QDialog):
         self.showFiles(files)
 
 
-class ExportDialog(QtGui.QDialog):
-    def __init__(self, parent=None):
-        super(ExportDialog, self).__init__(parent)
+class DatasLoader(QtCore.QThread):
+    """Load a capture and rasterize the heatmap outside the GUI thread"""
+    progress = QtCore.Signal(object, int, str)
+    preview = QtCore.Signal(object, object)
+    loaded = QtCore.Signal(object, object)
+    failed = QtCore.Signal(object, str)
 
-        # Edit
-        self.exportEdit = QtGui.QTextEdit()
+    previewwidth = 256
 
-        # Button
-        # buttonBox = QtGui.QDialogButtonBox(QtGui.QDialogButtonBox.Ok | QtGui.QDialogButtonBox.Cancel)
-        # buttonBox.accepted(self.valid)
+    def __init__(self, filename, parent=None):
+        super(DatasLoader, self).__init__(parent)
+        self.filename = filename
+        self.cancelled = False
 
-        # Add edit section
-        grid = QtGui.QGridLayout()
-        grid.setSpacing(10)
+    def cancel(self):
+        self.cancelled = True
 
-        grid.addWidget(self.exportEdit)
-        # grid.addWidget(buttonBox)
+    def run(self):
+        # A missing scaninfo or a malformed capture
+        try:
+            self.load()
+        except Exception as e:
+            self.failed.emit(self, '%s' % e)
 
-        self.setLayout(grid)
-        self.setGeometry(100, 100, 640, 640)
-        self.setWindowTitle('Review')
+    def load(self):
+        result = {'filename': self.filename}
 
+        # Load samples and summaries
+        self.progress.emit(self, 0, "Loading samples")
+        sdrdatas = commons.SDRDatas(self.filename)
+        sdrdatas.samples
+        if self.cancelled:
+            return
 
-class FreqTableItem(QtGui.QTableWidgetItem):
-    def __lt__(self, other):
-        return (commons.hz2Float(self.data(QtCore.Qt.DisplayRole)) <
-                commons.hz2Float(other.data(QtCore.Qt.DisplayRole)))
+        self.progress.emit(self, 40, "Loading summaries")
+        sdrdatas.summaries
+        heatmapcfg = sdrdatas.scaninfo['global']['heatmap']
+        result['sdrdatas'] = sdrdatas
+        if self.cancelled:
+            return
 
+        # Low resolution preview, scaled to the full heatmap size
+        self.progress.emit(self, 60, "Preview")
+        (height, width) = sdrdatas.samples.shape
+        step = max(1, width // self.previewwidth)
+        if step > 1:
+            (dbmin, dbmax) = colormap.dbLimits(sdrdatas.summaries, heatmapcfg['clip'])
+            rgb = colormap.applyLUT(
+                sdrdatas.samples[::step, ::step], dbmin, dbmax, heatmapcfg['palette'], heatmapcfg['lutsize']
+            )
+            self.preview.emit(self, {'sdrdatas': sdrdatas, 'image': rgb2Image(rgb).scaled(width, height)})
+        if self.cancelled:
+            return
 
-class MyTableModel(QtCore.QAbstractTableModel):
-    def __init__(self, parent, mylist, header, *args):
-        QtCore.QAbstractTableModel.__init__(self, parent, *args)
-        self.mylist = mylist
-        self.header = header
+        # Full heatmap
+        self.progress.emit(self, 70, "Heatmap")
+        rgb = sdrdatas.heatmapRGB(heatmapcfg['palette'], heatmapcfg['clip'], heatmapcfg['lutsize'])
+        result['image'] = rgb2Image(rgb)
+        if self.cancelled:
+            return
+
+        # Scan result and legend stations
+        self.progress.emit(self, 90, "Loading stations")
+        result['filefreqs'] = os.path.join(os.path.abspath(os.path.join(os.path.dirname(self.filename), '..')),
+                                           "scanresult.json")
+        stations = MainWindow.loadStations(result['filefreqs'])
+        result['jsonstations'] = [journal.StationJournal(result['filefreqs']).replay(stations)]
+        for legend in heatmapcfg['stationsfilenames']:
+            result['jsonstations'].append(MainWindow.loadStations(legend, True))
+        if self.cancelled:
+            return
 
-    def rowCount(self, parent):
-        return len(self.mylist)
+        self.progress.emit(self, 100, "Loaded")
+        self.loaded.emit(self, result)
+
+
+class CompareLoader(QtCore.QThread):
+    """Load the other captures and compute the comparison outside the GUI thread"""
+    computed = QtCore.Signal(object, object, object)
+    failed = QtCore.Signal(object, str)
+
+    def __init__(self, reference, filenames, mode, comparison=None, parent=None):
+        super(CompareLoader, self).__init__(parent)
+        self.reference = reference
+        self.filenames = filenames
+        self.mode = mode
+        self.comparison = comparison
+
+    def run(self):
+        try:
+            # The others captures are loaded once, then only the mode changes
+            if self.comparison is None:
+                others = [commons.SDRDatas(filename) for filename in self.filenames]
+                self.comparison = compare.Comparison(self.reference, others)
+
+            rgb = compare.compareRGB(self.comparison.compute(self.mode), self.mode)
+            self.computed.emit(self, self.comparison, rgb2Image(rgb, QtGui.QImage.Format_ARGB32))
+        except Exception as e:
+            self.failed.emit(self, '%s' % e)
+
+
+class SlicePlot(QtGui.QWidget):
+    """Draw a samples slice, decimated to the widget width"""
+
+    def __init__(self, title, parent=None):
+        super(SlicePlot, self).__init__(parent)
+        self.title = title
+        self.values = np.array([])
+        self.cursor = -1
+        self.setMinimumSize(200, 80)
+
+    def setValues(self, values, cursor=-1):
+        self.values = values
+        self.cursor = cursor
+        self.update()
+
+    def setMarker(self, cursor):
+        if cursor != self.cursor:
+            self.cursor = cursor
+            self.update()
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), QtCore.Qt.black)
+        painter.setPen(QtGui.QPen(QtCore.Qt.gray, 1))
+        painter.drawText(4, 12, self.title)
+        if not len(self.values):
+            return
 
-    def columnCount(self, parent):
-        if self.rowCount(parent) == 0:
+        width = self.width()
+        height = self.height()
+        values = inspector.decimate(self.values, width)
+        dbmin = np.min(values)
+        dbmax = np.max(values)
+        scale = (height - 1) / max(dbmax - dbmin, 1e-9)
+
+        # Build the polyline
+        stepx = float(width) / len(values)
+        polygon = QtGui.QPolygonF()
+        for (idx, value) in enumerate(values):
+            polygon.append(QtCore.QPointF(idx * stepx, (height - 1) - ((value - dbmin) * scale)))
+        painter.setPen(QtGui.QPen(QtCore.Qt.yellow, 1))
+        painter.drawPolyline(polygon)
+
+        # Hovered position
+        if 0 <= self.cursor < len(self.values):
+            posx = self.cursor * float(width) / len(self.values)
+            painter.setPen(QtGui.QPen(QtCore.Qt.red, 1))
+            painter.drawLine(QtCore.QLineF(posx, 0, posx, height))
+
+
+class StationTableModel(QtCore.QAbstractTableModel):
+    """Table model over the stations store, rows are given by its sort and filter order"""
+
+    def __init__(self, store, parent=None):
+        QtCore.QAbstractTableModel.__init__(self, parent)
+        self.store = store
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
             return 0
 
-        return len(self.mylist[0])
+        return self.store.rowCount()
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self.store.headers)
 
     def data(self, index, role):
         if not index.isValid():
@@ -173,13 +317,46 @@ class MyTableModel(QtCore.QAbstractTableModel):
         elif role != QtCore.Qt.ItemDataRole.DisplayRole:
             return None
 
-        return self.mylist[index.row()][index.column()]
+        return self.store.display(self.store.row(index.row()), index.column())
 
     def headerData(self, col, orientation, role):
         if orientation == QtCore.Qt.Orientation.Horizontal and role == QtCore.Qt.ItemDataRole.DisplayRole:
-            return self.header[col]
+            return self.store.headers[col]
         return None
 
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        self.store.sort(column, order == QtCore.Qt.DescendingOrder)
+        self.layoutChanged.emit()
+
+    def setFilter(self, text):
+        self.beginResetModel()
+        self.store.setFilter(text)
+        self.endResetModel()
+
+    def setStations(self, stations):
+        self.beginResetModel()
+        self.store.load(stations)
+        self.endResetModel()
+
+    def stationRow(self, index):
+        return self.store.row(index.row())
+
+    def insertOrUpdate(self, row, values):
+        self.beginResetModel()
+        if row == -1:
+            row = self.store.append(values)
+        else:
+            self.store.update(row, values)
+        self.endResetModel()
+
+        return row
+
+    def removeStations(self, rows):
+        self.beginResetModel()
+        self.store.remove(rows)
+        self.endResetModel()
+
 
 class FreqScene(QtGui.QGraphicsScene):
     maxstep = 3
@@ -222,23 +399,11 @@ class FreqScene(QtGui.QGraphicsScene):
         return self.freqstart + (posx * self.freqstep)
 
     def generateHeatmap(self, datas):
-        # Try load file
-        image = QtGui.QImage(datas.summaries['samples']['nbsamplescolumn'], datas.summaries['samples']['nblines'],
-                             QtGui.QImage.Format_RGB32)
-
-        y = 0
-        for line in datas.samples:
-            x = 0
-            for sample in line:
-                g = datas.power2RGB(sample)
-                rgb = QtGui.qRgb(int(g * 255), int(g * 255), 50)
-
-                image.setPixel(x, y, rgb)
-                x += 1
-
-            y += 1
+        # Colorize all samples with the palette lookup table
+        heatmapcfg = datas.scaninfo['global']['heatmap']
+        rgb = datas.heatmapRGB(heatmapcfg['palette'], heatmapcfg['clip'], heatmapcfg['lutsize'])
 
-        return QtGui.QPixmap.fromImage(image)
+        return QtGui.QPixmap.fromImage(rgb2Image(rgb))
 
     def wheelEvent(self, e):
 
@@ -267,6 +432,8 @@ class FreqScene(QtGui.QGraphicsScene):
 
 
 class RulerItem(QtGui.QGraphicsItem):
+    gradientinterval = [1000, 5000, 10000, 50000, 100000, 500000, 1000000, 5000000, 10000000, 50000000, 100000000]
+
     def __init__(self):
         self.bigheight = 15
         self.middleheight = 10
@@ -278,48 +445,96 @@ class RulerItem(QtGui.QGraphicsItem):
         fontfilename = os.path.join(dirname, "Vera.ttf")
         fontid = QtGui.QFontDatabase.addApplicationFont(fontfilename);
         self.font = QtGui.QFont(QtGui.QFontDatabase.applicationFontFamilies(fontid)[0], 10)
+        self.fm = QtGui.QFontMetrics(self.font)
+
+        # Ticks and labels, computed once per freq range
+        self.geometrykey = None
+        self.tickpos = np.array([])
+        self.tickheights = np.array([])
+        self.labels = []
+        self.labelpos = np.array([])
+        self.textwidth = 0
 
         QtGui.QGraphicsItem.__init__(self)
 
+        # Give the exposed rect to paint
+        self.setFlag(QtGui.QGraphicsItem.ItemUsesExtendedStyleOption, True)
+
     def boundingRect(self):
         return QtCore.QRectF(QtCore.QPointF(0, 0), QtCore.QSizeF(self.scene().width(), self.height()))
 
     def height(self):
-        fm = QtGui.QFontMetrics(self.font)
-        return self.bigheight + fm.height()
+        return self.bigheight + self.fm.height()
+
+    def updateGeometry(self):
+        freqstart = self.scene().freqstart
+        freqend = self.scene().freqend
+        freqstep = self.scene().freqstep
+        if self.geometrykey == (freqstart, freqend, freqstep):
+            return
+
+        self.geometrykey = (freqstart, freqend, freqstep)
+        grandientheights = [self.supersmallheight, self.smallheight, self.middleheight, self.bigheight]
+        self.textwidth = self.fm.width(commons.float2Hz(freqend))
+        span = int(freqend - freqstart)
+
+        # Search the visible intervals (at least 3 pixels) and the labels interval
+        tickintervals = []
+        labelinterval = None
+        for ginterval in self.gradientinterval:
+            if len(tickintervals) < len(grandientheights):
+                widthinterval = ginterval / freqstep
+                if widthinterval >= 3:
+                    tickintervals.append(ginterval)
+
+                if labelinterval is None and self.textwidth < widthinterval:
+                    labelinterval = ginterval
+
+        # Each interval is a multiple of the previous, keep the biggest tick height
+        self.tickpos = np.array([])
+        self.tickheights = np.array([])
+        if tickintervals:
+            freqs = np.arange(0, span, tickintervals[0])
+            self.tickpos = freqs / freqstep
+            self.tickheights = np.zeros(len(freqs))
+            for (level, ginterval) in enumerate(tickintervals):
+                self.tickheights[freqs % ginterval == 0] = grandientheights[level]
+
+        # Labels text
+        self.labels = []
+        if labelinterval is not None:
+            for freq in range(0, span, labelinterval):
+                textpos = (freq / freqstep) - (self.textwidth / 2)
+                if textpos > 0:
+                    self.labels.append((textpos, commons.float2Hz(freq + freqstart)))
+        self.labelpos = np.array([label[0] for label in self.labels])
 
     def paint(self, painter, options, widget):
+        if not self.scene().freqstep:
+            return
+
+        self.updateGeometry()
         painter.setPen(
             QtGui.QPen(QtCore.Qt.white, 1, QtCore.Qt.SolidLine))  # , QtCore.Qt.RoundCap, QtCore.Qt.RoundJoin))
+        painter.setFont(self.font)
 
-        gradientinterval = [1000, 5000, 10000, 50000, 100000, 500000, 1000000, 5000000, 10000000, 50000000, 100000000]
-        grandientheights = [self.supersmallheight, self.smallheight, self.middleheight, self.bigheight]
-
-        fm = QtGui.QFontMetrics(self.font)
-        posheight = -1
-        for ginterval in gradientinterval:
-            if posheight < len(grandientheights) - 1:
-                mess = commons.float2Hz(self.scene().freqend)
-                widthinterval = ginterval / self.scene().freqstep
-                if widthinterval >= 3:
-                    posheight += 1
-                    for freq in range(0, int(self.scene().freqend - self.scene().freqstart), ginterval):
-                        posx = freq / self.scene().freqstep
-                        line = QtCore.QLineF(QtCore.QPointF(posx, self.height() - grandientheights[posheight]),
-                                             QtCore.QPointF(posx, self.height()))
+        # Only draw the exposed part
+        exposedleft = options.exposedRect.left()
+        exposedright = options.exposedRect.right()
 
-                        painter.drawLine(line)
-                        painter.setFont(self.font)
+        height = self.height()
+        first = np.searchsorted(self.tickpos, exposedleft, 'left')
+        last = np.searchsorted(self.tickpos, exposedright, 'right')
+        for idx in range(first, last):
+            posx = self.tickpos[idx]
+            painter.drawLine(QtCore.QLineF(posx, height - self.tickheights[idx], posx, height))
 
-                textwidth = fm.width(mess)
-                if textwidth * 1 < widthinterval:
-                    for freq in range(0, int(self.scene().freqend - self.scene().freqstart), ginterval):
-                        posx = freq / self.scene().freqstep
-                        textpos = posx - (textwidth / 2)
-                        if textpos > 0:
-                            mess = commons.float2Hz(freq + self.scene().freqstart)
-                            painter.drawText(QtCore.QRectF(textpos, 0, textwidth + (textwidth / 2), fm.height()), mess)
-                            painter.setFont(self.font)
+        textrectwidth = self.textwidth + (self.textwidth / 2)
+        first = np.searchsorted(self.labelpos, exposedleft - textrectwidth, 'left')
+        last = np.searchsorted(self.labelpos, exposedright, 'right')
+        for idx in range(first, last):
+            (textpos, mess) = self.labels[idx]
+            painter.drawText(QtCore.QRectF(textpos, 0, textrectwidth, self.fm.height()), mess)
 
 
 class LegendItem(QtGui.QGraphicsItem):
@@ -339,6 +554,7 @@ class LegendItem(QtGui.QGraphicsItem):
         self.textsizey = fm.height()
 
         # For legend drawing
+        self.layout = legend.LegendLayout(fm.width)
         self.legends_row = []
         self.spacebefore = 2
         self.lineordotpos = 7
@@ -412,86 +628,28 @@ class LegendItem(QtGui.QGraphicsItem):
 
 
     def updateLegendSize(self, jsonstations):
-        # Search legends can be show in heatmap
-        legends_can_draw = []
-
-        for jsoncontent in jsonstations:
-            for station in jsoncontent['stations']:
-                if 'name' in station:
-                    if 'freq_left' in station:
-                        station['freq_left'] = commons.hz2Float(station['freq_left'])
-                        station['freq_right'] = commons.hz2Float(station['freq_right'])
-                        station['bw'] = station['freq_right'] - station['freq_left']
-                        station['freq_center'] = station['freq_left'] + (station['bw'] / 2)
-                    else:
-                        station['freq_center'] = commons.hz2Float(station['freq_center'])
-                        station['bw'] = commons.hz2Float(station['bw'])
-                        station['freq_left'] = station['freq_center'] - (station['bw'] / 2)
-                        station['freq_right'] = station['freq_left'] + station['bw']
-
-                    # Calc Cropped freq (for drawing in heatmap)
-                    fm = QtGui.QFontMetrics(self.font)
-                    textsizex = fm.width(station['name'])
-                    station['cropped_left'] = max(station['freq_left'], self.scene().freqstart - self.scene().freqstep)
-                    station['cropped_right'] = min(station['freq_right'], self.scene().freqend + self.scene().freqstep)
-                    station['cropped_bw'] = station['cropped_right'] - station['cropped_left']
-                    station['cropped_center'] = station['cropped_left'] + (station['cropped_bw'] / 2)
-                    station['posleft'] = (station['cropped_left'] - self.scene().freqstart) / self.scene().freqstep
-                    station['poscenter'] = (station['cropped_center'] - self.scene().freqstart) / self.scene().freqstep
-                    station['posright'] = (station['cropped_right'] - self.scene().freqstart) / self.scene().freqstep
-                    station['textleft'] = ((station[
-                                                'cropped_center'] - self.scene().freqstart) / self.scene().freqstep) - (
-                                              textsizex / 2)
-                    station['textright'] = ((station[
-                                                 'cropped_center'] - self.scene().freqstart) / self.scene().freqstep) + (
-                                               textsizex / 2)
-                    # calc min and max position (line or text)
-                    station['cropminleft'] = min(station['posleft'], station['textleft'])
-                    station['cropmaxright'] = max(station['posright'], station['textright'])
-
-                    if 0 <= station['cropminleft'] <= self.scene().width() or \
-                                            0 <= station['cropmaxright'] <= self.scene().width():
-                        legends_can_draw.append(station)
-                    else:
-                        if station['cropminleft'] <= 0 and station['cropmaxright'] >= self.scene().width():
-                            legends_can_draw.append(station)
-
-
-        # Order legends by bandwith
-        legends_can_draw = sorted(legends_can_draw, key=lambda x: x['bw'], reverse=True)
-
-        self.legends_row = []
-        for station in legends_can_draw:
-            append_in_same_line = False
-            for lineidx in range(len(self.legends_row)):
-                nbcolumns = len(self.legends_row[lineidx])
-                # Check if can i append the freq
-                if nbcolumns > 0:
-                    if station['cropminleft'] >= self.legends_row[lineidx][nbcolumns - 1]['cropmaxright'] or \
-                                    station['cropmaxright'] <= self.legends_row[lineidx][0]['cropminleft']:
-                        append_in_same_line = True
-                        break
-
-                if nbcolumns > 1:
-                    for column in range(1, nbcolumns):
-                        if station['cropminleft'] >= self.legends_row[lineidx][column - 1]['cropmaxright'] and \
-                                        station['cropmaxright'] <= self.legends_row[lineidx][column]['cropminleft']:
-                            append_in_same_line = True
-                            break
-
-                if append_in_same_line == True:
-                    break
-
-            if append_in_same_line:
-                self.legends_row[lineidx].append(station)
-                self.legends_row[lineidx] = sorted(self.legends_row[lineidx], key=lambda x: x['cropminleft'])
-            else:
-                maxnb_lines = self.parent.sdrdatas.scaninfo['global']['heatmap']['maxnb_lines']
-                if len(self.legends_row) + 1 <= maxnb_lines:
-                    self.legends_row.append([])
-                    self.legends_row[len(self.legends_row) - 1].append(station)
-
-        self.legends_row.reverse()
+        # Full layout, the view or the stations files changed
+        scene = self.scene()
+        self.layout.maxnb_lines = self.parent.sdrdatas.scaninfo['global']['heatmap']['maxnb_lines']
+        self.layout.setView(scene.freqstart, scene.freqend, scene.freqstep, scene.width())
+        self.layout.layout(jsonstations)
+        self.updateRows()
+
+    def addStation(self, station):
+        self.layout.addStation(station)
+        self.updateRows()
+
+    def removeStation(self, station):
+        self.layout.removeStation(station)
+        self.updateRows()
+
+    def updateStation(self, oldstation, newstation):
+        self.layout.updateStation(oldstation, newstation)
+        self.updateRows()
+
+    def updateRows(self):
+        self.prepareGeometryChange()
+        self.legends_row = self.layout.displayRows()
         self.legends_height = len(self.legends_row) * self.totallineheight
 
 
@@ -516,6 +674,27 @@ class MainWindow(QtGui.QMainWindow):
         self.config = None
         self.jsonstations = []
         self.rootdir = {}
+        self.loader = None
+
+        # Captures comparison
+        self.comparison = None
+        self.comparer = None
+
+        # Cursor inspector
+        self.inspector = None
+        self.inspectedcell = (-1, -1)
+        self.currentmousepos = None
+        self.mousedelay = 16
+        self.mousetimer = QtCore.QTimer(self)
+        self.mousetimer.setSingleShot(True)
+        self.mousetimer.timeout.connect(self.processMouseMove)
+
+        # Stations edits journal
+        self.journal = None
+        self.savedelay = 1000
+        self.savetimer = QtCore.QTimer(self)
+        self.savetimer.setSingleShot(True)
+        self.savetimer.timeout.connect(self.flushFreqs)
 
         self.createActions()
         self.createMenus()
@@ -528,10 +707,10 @@ class MainWindow(QtGui.QMainWindow):
 
         # Create Freq Dialog
         self.freqdialog = FreqDialog()
-        self.exportdialog = ExportDialog()
 
         # Create Table view
         self.createTbView()
+        self.createInspectorView()
 
         # Create view
         self.view = QtGui.QGraphicsView(self.scene)
@@ -546,9 +725,16 @@ class MainWindow(QtGui.QMainWindow):
         self.setCentralWidget(self.widget)
         self.setWindowTitle("Diagramscene")
 
+        # Loading progress
+        self.progressbar = QtGui.QProgressBar()
+        self.progressbar.setRange(0, 100)
+        self.progressbar.setMaximumWidth(200)
+        self.progressbar.setVisible(False)
+        self.statusBar().addPermanentWidget(self.progressbar)
+
 
     def save2Image(self):
-        (filename, ext) = os.path.splitext(self.sdrdatas.csvfilename)
+        filename = commons.csvBasename(self.sdrdatas.csvfilename)
         imgfile = '%s%s' % (filename, '.png')
         exists = os.path.exists(imgfile)
         if not exists:
@@ -564,101 +750,26 @@ class MainWindow(QtGui.QMainWindow):
         fullname, _ = QtGui.QFileDialog.getOpenFileName(self, "Open File", self.rootdir)
         if fullname != '':
             self.loadDatas(fullname)
-            self.updateScene()
 
 
-    def export2TXT(self):
-        jsonfreqs = self.tablefreq2JSON()
-
-        lines = []
-        for station in jsonfreqs['stations']:
-            lines.append("%s %s" % (station['freq_center'], station['name']))
+    def exportFreqs(self, exportformat):
+        defaultname = os.path.join(os.path.dirname(self.filefreqs), "export.%s" % exportformat)
+        filename, _ = QtGui.QFileDialog.getSaveFileName(self, "Export File", defaultname)
+        if filename == '':
+            return
 
-        text = '\n'.join(lines)
-        self.exportdialog.exportEdit.setText(text)
-        self.exportdialog.exec_()  # == QtGui.QDialog.Accepted:
+        # The uniden bands are in the JSON config
+        if self.config is None:
+            self.config = commons.loadConfigFile(commons.getJSONConfigFilename(), None)
 
-    def export2Uniden(self):
         jsonfreqs = self.tablefreq2JSON()
+        export.exportStations(filename, jsonfreqs, exportformat, self.config)
 
-        unidenstation = {}
-
-        bands = self.config['export']['uniden']['bands']
-
-        # Fill station with uniden channel number
-        for station in jsonfreqs['stations']:
-            if 'uniden' in station['othervalues']:
-                freqcenter = float(station['freq_center'].replace('M', ''))
-                mode = "AUTO"
-                if station['mode'] != "UNDEFINED":
-                    mode = station['mode']
-                # Check station in the uniden range capability
-                inrage = False
-                for (bstart, bend) in bands:
-                    if freqcenter >= bstart and freqcenter <=bend:
-                        inrage = True
-                        break
-
-                if inrage:
-                    uniden = station['othervalues']['uniden']
-
-                    line = ['{']
-                    line.append("cmd => 'CIN',")
-                    line.append("index => '%s'," % uniden['channel'])
-                    line.append("name => '%s'," % station['name'].replace("'", "")[:15])
-                    line.append("frq => '%s'," % freqcenter)
-                    line.append("mod => '%s'," % mode)
-                    line.append("ctcss_dcs => '0',")
-                    line.append("dly => '0',")
-                    line.append("lout => '0',")
-                    line.append("pri => '0',")
-                    line.append('},')
-                    unidenstation[uniden['channel']] = '\n'.join(line)
-
-        # Fill station other station
-        channel = 1
-        for station in jsonfreqs['stations']:
-            freqcenter = float(station['freq_center'].replace('M', ''))
-            mode = "AUTO"
-            if station['mode'] != "UNDEFINED":
-                mode = station['mode']
-            # Check station in the uniden range capability
-            inrage = False
-            for (bstart, bend) in bands:
-                if freqcenter >= bstart and freqcenter <=bend:
-                    inrage = True
-                    break
-
-            if inrage:
-                if 'uniden' not in station['othervalues']:
-                    # No overwriter previous inserted station
-                    while channel in unidenstation:
-                        channel += 1
-                    if channel > 499:
-                        break
-
-                    line = ['{']
-                    line.append("cmd => 'CIN',")
-                    line.append("index => '%s'," % channel)
-                    line.append("name => '%s'," % station['name'].replace("'", "")[:15])
-                    line.append("frq => '%s'," % station['freq_center'].replace('M',''))
-                    line.append("mod => '%s'," % mode)
-                    line.append("ctcss_dcs => '0',")
-                    line.append("dly => '0',")
-                    line.append("lout => '0',")
-                    line.append("pri => '0',")
-                    line.append('},')
-                    unidenstation[channel] = '\n'.join(line)
-
-        lines = ['[']
-        for key, station in unidenstation.iteritems():
-            lines.append(unidenstation[key])
-        lines.append(']')
-
-        text = '\n'.join(lines)
-        self.exportdialog.exportEdit.setText(text)
-        self.exportdialog.exec_()  # == QtGui.QDialog.Accepted:
+    def export2TXT(self):
+        self.exportFreqs('txt')
 
+    def export2Uniden(self):
+        self.exportFreqs('uniden')
 
     def initScene(self):
         self.scene = FreqScene(self)
@@ -692,9 +803,15 @@ class MainWindow(QtGui.QMainWindow):
         self.scene.rectbandwidth.setBrush(QtGui.QBrush(QtCore.Qt.gray))
         self.scene.rectbandwidth.setOpacity(0.5)
 
+        # Comparison layer, over the heatmap
+        self.scene.comparelayer = QtGui.QGraphicsPixmapItem()
+        self.scene.comparelayer.setOpacity(0.8)
+        self.scene.comparelayer.setVisible(False)
+
         # Add items in the scene
         self.scene.addItem(self.scene.ruler)
         self.scene.addItem(self.scene.heatmap)
+        self.scene.addItem(self.scene.comparelayer)
         self.scene.addItem(self.scene.legend)
         self.scene.addItem(self.scene.linefreq)
         self.scene.addItem(self.scene.linetime)
@@ -731,11 +848,10 @@ class MainWindow(QtGui.QMainWindow):
         self.italicAction.setChecked(font.italic())
         self.underlineAction.setChecked(font.underline())
 
-    def clickeditemfreq(self, item):
-        freqtbitem = self.tablefreq.item(item.row(), 0)
-        bwitem = self.tablefreq.item(item.row(), 1)
-        freqhz = commons.hz2Float(freqtbitem.text())
-        bwhz = commons.hz2Float(bwitem.text())
+    def clickeditemfreq(self, index):
+        station = self.stationstore.station(self.stationmodel.stationRow(index))
+        freqhz = station['freq_hz']
+        bwhz = station['bw_hz']
 
         self.selected_center_pos = QtCore.QPointF(self.scene.Hz2Pos(freqhz), 0)
         self.bandwidth_pixels = bwhz / self.scene.freqstep
@@ -751,23 +867,9 @@ class MainWindow(QtGui.QMainWindow):
             self.scene.mousestep = FreqScene.stepselected
             self.updateFreqsData()
 
-    def doubleclickeditemfreq(self, item):
-        freqtbitem = self.tablefreq.item(item.row(), 0)
-        bwitem = self.tablefreq.item(item.row(), 1)
-        nameitem = self.tablefreq.item(item.row(), 2)
-        modeitem = self.tablefreq.item(item.row(), 3)
-        authoritem = self.tablefreq.item(item.row(), 4)
-        otheritem = self.tablefreq.item(item.row(), 5)
-
-        values = {
-            'freq_center': freqtbitem.text(),
-            'bw': bwitem.text(),
-            'name': nameitem.text(),
-            'mode': modeitem.text(),
-            'authorname': authoritem.text(),
-            'othervalues': json.loads(otheritem.text())
-        }
-        self.showDialogFreq(item.row(), values)
+    def doubleclickeditemfreq(self, index):
+        rowid = self.stationmodel.stationRow(index)
+        self.showDialogFreq(rowid, self.stationstore.station(rowid))
 
     def showDialogFreq(self, rowid, values):
         # Fill the edit fields
@@ -794,106 +896,78 @@ class MainWindow(QtGui.QMainWindow):
                 'othervalues': json.loads(self.freqdialog.otherEdit.toPlainText()),
             }
             self.insertOrUpdateFreq(rowid, edtresult)
-            self.jsonstations[0] = self.saveFreqs()
-            self.scene.legend.updateLegendSize(self.jsonstations)
+
+            # Only move the edited legend
+            if rowid == -1:
+                self.scene.legend.addStation(edtresult)
+                self.recordFreqs('add', edtresult)
+            else:
+                self.scene.legend.updateStation(values, edtresult)
+                self.recordFreqs('update', edtresult, values)
             self.view.update()
 
 
     def insertOrUpdateFreq(self, rowid, values):
-        if rowid == -1:
-            rowid = self.tablefreq.rowCount()
-            self.tablefreq.insertRow(rowid)
-
-        # Items
-        freqtbitem = FreqTableItem(values['freq_center'])
-        bwitem = QtGui.QTableWidgetItem(values['bw'])
-
-        # Freq title
-        nameitem = QtGui.QTableWidgetItem("")
-        if 'name' in values:
-            nameitem.setText(values['name'])
-
-        # Mode
-        modeitem = QtGui.QTableWidgetItem("UNDEFINED")
-        if 'mode' in values:
-            modeitem.setText(values['mode'])
-
-        # Author
-        authoritem = QtGui.QTableWidgetItem("UNDEFINED")
-        if 'authorname' in values:
-            authoritem.setText(values['authorname'])
-
-        otheritem = QtGui.QTableWidgetItem("{}")
-        if 'othervalues' in values:
-            othervalues = json.dumps(
-                values['othervalues'], sort_keys=True,
-                indent=4, separators=(',', ': ')
-            )
-            otheritem.setText(othervalues)
-
-        self.tablefreq.setItem(rowid, 0, freqtbitem)
-        self.tablefreq.setItem(rowid, 1, bwitem)
-        self.tablefreq.setItem(rowid, 2, nameitem)
-        self.tablefreq.setItem(rowid, 3, modeitem)
-        self.tablefreq.setItem(rowid, 4, authoritem)
-        self.tablefreq.setItem(rowid, 5, otheritem)
+        return self.stationmodel.insertOrUpdate(rowid, values)
 
     def deleteFreqs(self, rows):
 
-        # Get all row index
+        # Get all stations index
         indexes = []
         for row in rows:
-            indexes.append(row.row())
-
-        # Reverse sort
-        indexes = sorted(indexes, reverse=True)
+            indexes.append(self.stationmodel.stationRow(row))
 
-        # Delete rows
+        # Delete legends and stations
         for rowidx in indexes:
-            self.tablefreq.removeRow(rowidx)
+            station = self.stationstore.station(rowidx)
+            self.scene.legend.removeStation(station)
+            self.recordFreqs('delete', station)
+        self.stationmodel.removeStations(indexes)
 
-        # Save freqs to file
-        self.jsonstations[0] = self.saveFreqs()
-        self.scene.legend.updateLegendSize(self.jsonstations)
         self.view.update()
 
     def tablefreq2JSON(self, ignoreNotIdentified=False):
-        rowcount = self.tablefreq.rowCount()
-        self.tablefreq.sortItems(0)
-
-        jsonfreqs = {'stations': []}
-        for row in range(rowcount):
-            freqtbitem = self.tablefreq.item(row, 0)
-            bwitem = self.tablefreq.item(row, 1)
-            nameitem = self.tablefreq.item(row, 2)
-            modeitem = self.tablefreq.item(row, 3)
-            authoritem = self.tablefreq.item(row, 4)
-            otheritem = self.tablefreq.item(row, 5)
-
-            item = {
-                'freq_center': freqtbitem.text(),
-                'bw': bwitem.text(),
-                'name': nameitem.text(),
-                'mode': modeitem.text(),
-                'authorname': authoritem.text(),
-                'othervalues': json.loads(otheritem.text())
-            }
-            jsonfreqs['stations'].append(item)
+        return self.stationstore.toJSON()
 
-        return jsonfreqs
+    def recordFreqs(self, action, values, oldvalues=None):
+        # The journal is written when no edit since savedelay, none while loading
+        if not self.journal:
+            return
+
+        self.journal.record(action, values, oldvalues)
+        self.savetimer.start(self.savedelay)
+
+    def flushFreqs(self):
+        if not self.journal:
+            return
+
+        self.journal.flush()
+        if self.journal.needCompact():
+            self.saveFreqs()
 
     def saveFreqs(self):
+        if not self.journal or not self.journal.isDirty():
+            return None
+
+        self.savetimer.stop()
         jsonfreqs = self.tablefreq2JSON()
-        exists = os.path.exists(self.filefreqs)
-        if exists:
-            os.rename(self.filefreqs, "%s.%s.backup" % (self.filefreqs, int(time.time())))
-        commons.saveJSON(self.filefreqs, jsonfreqs)
+        self.journal.compact(jsonfreqs)
+        self.jsonstations[0] = jsonfreqs
 
         return jsonfreqs
 
+    def closeEvent(self, event):
+        self.saveFreqs()
+        super(MainWindow, self).closeEvent(event)
+
 
-    def loadStations(self, filename):
-        jsondata = commons.loadJSON(filename)
+    @staticmethod
+    def loadStations(filename, cached=False):
+        # Cached stations are shared, only use it for read only legends
+        if cached:
+            jsondata = commons.loadCachedJSON(filename)
+        else:
+            jsondata = commons.loadJSON(filename)
         if not jsondata:
             jsondata = {'stations': []}
 
@@ -905,21 +979,55 @@ class MainWindow(QtGui.QMainWindow):
         dock.setAllowedAreas(QtCore.Qt.LeftDockWidgetArea | QtCore.Qt.RightDockWidgetArea)
 
         # Init table
-        headers = ["Freq", "Bw", 'Name', 'Mode', 'Author', "Others"]
-        self.tablefreq = QtGui.QTableWidget()
+        self.stationstore = stationstore.StationStore()
+        self.stationmodel = StationTableModel(self.stationstore, self)
+        self.tablefreq = QtGui.QTableView()
+        self.tablefreq.setModel(self.stationmodel)
         self.tablefreq.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
         self.tablefreq.setSelectionBehavior(QtGui.QAbstractItemView.SelectRows)
-        self.tablefreq.itemClicked.connect(self.clickeditemfreq)
-        self.tablefreq.itemDoubleClicked.connect(self.doubleclickeditemfreq)
+        self.tablefreq.setSortingEnabled(True)
+        self.tablefreq.sortByColumn(0, QtCore.Qt.AscendingOrder)
+        self.tablefreq.clicked.connect(self.clickeditemfreq)
+        self.tablefreq.doubleClicked.connect(self.doubleclickeditemfreq)
 
-        self.tablefreq.setColumnCount(len(headers))
-        self.tablefreq.setHorizontalHeaderLabels(headers)
+        # Fixed rows height, the view don't measure each row
+        self.tablefreq.verticalHeader().setResizeMode(QtGui.QHeaderView.Fixed)
         self.tablefreq.verticalHeader().hide()
+        self.tablefreq.horizontalHeader().setStretchLastSection(True)
+
+        # Filter
+        self.filterfreq = QtGui.QLineEdit()
+        self.filterfreq.setPlaceholderText("Filter")
+        self.filterfreq.textChanged.connect(self.stationmodel.setFilter)
 
-        dock.setWidget(self.tablefreq)
+        vbox = QtGui.QVBoxLayout()
+        vbox.setContentsMargins(0, 0, 0, 0)
+        vbox.addWidget(self.filterfreq)
+        vbox.addWidget(self.tablefreq)
+        widget = QtGui.QWidget()
+        widget.setLayout(vbox)
+
+        dock.setWidget(widget)
         self.addDockWidget(QtCore.Qt.LeftDockWidgetArea, dock)
 
 
+    def createInspectorView(self):
+        dock = QtGui.QDockWidget("Inspector", self)
+        dock.setAllowedAreas(QtCore.Qt.TopDockWidgetArea | QtCore.Qt.BottomDockWidgetArea)
+
+        # Spectrum of the hovered line and time of the hovered column
+        self.spectrumplot = SlicePlot("Spectrum")
+        self.timeplot = SlicePlot("Time")
+
+        hbox = QtGui.QHBoxLayout()
+        hbox.addWidget(self.spectrumplot)
+        hbox.addWidget(self.timeplot)
+        widget = QtGui.QWidget()
+        widget.setLayout(hbox)
+
+        dock.setWidget(widget)
+        self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, dock)
+
     def createActions(self):
         # File
         self.openAction = QtGui.QAction("&Open", self, shortcut="Ctrl+O",
@@ -950,6 +1058,14 @@ class MainWindow(QtGui.QMainWindow):
         self.fitToWindowAct = QtGui.QAction("Fit", self, shortcut="Ctrl+F",
                                             statusTip="Fit windows", triggered=self.fitToWindow)
 
+        # Compare
+        self.compareAction = QtGui.QAction("&Compare with", self, shortcut="Ctrl+K",
+                                           statusTip="Compare with other captures", triggered=self.compareWith,
+                                           enabled=False)
+        self.clearcompareAction = QtGui.QAction("C&lear comparison", self, shortcut="Ctrl+L",
+                                                statusTip="Hide the comparison", triggered=self.clearCompare,
+                                                enabled=False)
+
 
     def createMenus(self):
         self.fileMenu = self.menuBar().addMenu("&File")
@@ -968,6 +1084,9 @@ class MainWindow(QtGui.QMainWindow):
         self.viewMenu.addAction(self.normalSizeAct)
         self.viewMenu.addSeparator()
         self.viewMenu.addAction(self.fitToWindowAct)
+        self.viewMenu.addSeparator()
+        self.viewMenu.addAction(self.compareAction)
+        self.viewMenu.addAction(self.clearcompareAction)
 
 
     def createToolbars(self):
@@ -996,6 +1115,7 @@ class MainWindow(QtGui.QMainWindow):
         self.stepfreq = QtGui.QComboBox()
         self.stepfreq.addItems(["5k", "6.25k", "10k", "12.5k"])
         self.stepfreq.setCurrentIndex(3)
+        self.stepfreq.currentIndexChanged.connect(self.updateSnapStep)
         #self.stepfreq.currentIndexChanged[str].connect(self.scenestepChanged)
 
         # self.stepfreq = QtGui.QSpinBox()
@@ -1009,6 +1129,7 @@ class MainWindow(QtGui.QMainWindow):
         self.lblcurrentfreq = QtGui.QLabel()
         self.lblselectedfreq = QtGui.QLabel()
         self.lblselectedbw = QtGui.QLabel()
+        self.lblpower = QtGui.QLabel()
 
         font = QtGui.QFont("Courier New", 16)
         font.setBold(True)
@@ -1023,18 +1144,22 @@ class MainWindow(QtGui.QMainWindow):
         self.lblcurrentfreq.setToolTip("Current Freq")
         self.lblselectedfreq.setToolTip("Selected Freq")
         self.lblselectedbw.setToolTip("Bandwidth")
+        self.lblpower.setToolTip("Power")
 
         self.lblcurrentfreq.setFont(font)
         self.lblselectedfreq.setFont(font)
         self.lblselectedbw.setFont(font)
+        self.lblpower.setFont(font)
 
         self.lblcurrentfreq.setStyleSheet('QLabel { color: red }')
         self.lblselectedfreq.setStyleSheet('QLabel { color: green }')
         self.lblselectedbw.setStyleSheet('QLabel { color: magenta }')
+        self.lblpower.setStyleSheet('QLabel { color: cyan }')
 
         self.lblcurrentfreq.setAlignment(QtCore.Qt.AlignCenter)
         self.lblselectedfreq.setAlignment(QtCore.Qt.AlignCenter)
         self.lblselectedbw.setAlignment(QtCore.Qt.AlignCenter)
+        self.lblpower.setAlignment(QtCore.Qt.AlignCenter)
 
         self.pointerToolbar = self.addToolBar("Select freq")
         # self.pointerToolbar.addWidget(pointerButton)
@@ -1047,6 +1172,15 @@ class MainWindow(QtGui.QMainWindow):
         self.pointerToolbar.addWidget(self.lblcurrentfreq)
         self.pointerToolbar.addWidget(self.lblselectedfreq)
         self.pointerToolbar.addWidget(self.lblselectedbw)
+        self.pointerToolbar.addWidget(self.lblpower)
+
+        # Comparison mode
+        self.comparemode = QtGui.QComboBox()
+        self.comparemode.addItems(compare.MODES)
+        self.comparemode.currentIndexChanged.connect(self.updateCompare)
+
+        self.compareToolbar = self.addToolBar("Compare")
+        self.compareToolbar.addWidget(self.comparemode)
 
     def keyPressEvent(self, e):
         ReduceBW = 81
@@ -1163,6 +1297,10 @@ class MainWindow(QtGui.QMainWindow):
         if (mouseEvent.button() != QtCore.Qt.LeftButton):
             return
 
+        # Use the last mouse position
+        if self.mousetimer.isActive():
+            self.processMouseMove()
+
         # Selected center freq
         if self.scene.mousestep == FreqScene.stepmove:
             self.selected_center_pos = self.currentroundedpos
@@ -1185,13 +1323,22 @@ class MainWindow(QtGui.QMainWindow):
         if not self.sdrdatas:
             return
 
-        # Begin freq selection
-        self.currentmousepos = mouseEvent.scenePos()
+        # Only the last position is used, at the display refresh rate
+        self.currentmousepos = QtCore.QPointF(mouseEvent.scenePos())
+        if not self.mousetimer.isActive():
+            self.mousetimer.start(self.mousedelay)
+
+    def updateSnapStep(self, *args):
+        if self.inspector:
+            self.inspector.setSnapStep(self.stepfreq.currentText())
+
+    def processMouseMove(self):
+        self.mousetimer.stop()
+        if not self.sdrdatas or not self.inspector or self.currentmousepos is None:
+            return
 
         # Compute rounded step
-        self.roundstep = commons.hz2Float(self.stepfreq.currentText())
-        self.roundsteppixel = self.roundstep / self.scene.freqstep
-        snapedpos = int(self.currentmousepos.x() / self.roundsteppixel) * self.roundsteppixel
+        snapedpos = self.inspector.snapPos(self.currentmousepos.x())
         self.currentroundedpos = QtCore.QPointF(snapedpos,self.currentmousepos.y())
 
 
@@ -1209,58 +1356,207 @@ class MainWindow(QtGui.QMainWindow):
                 self.bwfreq *= 2
 
         self.updateFreqsData()
+        self.updateInspector()
+
+    def updateInspector(self):
+        # Power under the cursor, read from the samples in memory
+        heatmappos = self.currentmousepos - self.scene.heatmap.pos()
+        readout = self.inspector.readout(heatmappos.x(), heatmappos.y())
+        if readout is None:
+            self.lblpower.setText("")
+            return
+
+        self.lblpower.setText(" Power: %.2f dB" % readout['power'])
+        if readout['line'] != self.inspectedcell[0]:
+            self.spectrumplot.setValues(self.inspector.spectrumSlice(readout['line']), readout['column'])
+        else:
+            self.spectrumplot.setMarker(readout['column'])
+        if readout['column'] != self.inspectedcell[1]:
+            self.timeplot.setValues(self.inspector.timeSlice(readout['column']), readout['line'])
+        else:
+            self.timeplot.setMarker(readout['line'])
+        self.inspectedcell = (readout['line'], readout['column'])
+
+    def compareWith(self):
+        filenames, _ = QtGui.QFileDialog.getOpenFileNames(self, "Compare with", self.rootdir)
+        if not filenames:
+            return
+
+        self.clearCompare()
+        self.startCompare(CompareLoader(self.sdrdatas, filenames, self.comparemode.currentText(), None, self))
+
+    def updateCompare(self, *args):
+        if not self.comparison:
+            return
+
+        self.startCompare(CompareLoader(self.sdrdatas, [], self.comparemode.currentText(), self.comparison, self))
+
+    def startCompare(self, comparer):
+        # No other comparison until this one is computed
+        self.comparer = comparer
+        self.comparemode.setEnabled(False)
+        self.compareAction.setEnabled(False)
+        self.statusBar().showMessage("Comparing %s" % comparer.mode)
+
+        comparer.computed.connect(self.compareFinished)
+        comparer.failed.connect(self.compareFailed)
+        comparer.finished.connect(comparer.deleteLater)
+        comparer.start()
+
+    def compareFinished(self, comparer, comparison, image):
+        if comparer is not self.comparer:
+            return
+
+        self.comparer = None
+        self.comparison = comparison
+        self.comparemode.setEnabled(True)
+        self.compareAction.setEnabled(True)
+        self.clearcompareAction.setEnabled(True)
+
+        self.scene.comparelayer.setPixmap(QtGui.QPixmap.fromImage(image))
+        self.scene.comparelayer.setPos(self.scene.heatmap.pos())
+        self.scene.comparelayer.setVisible(True)
+        self.statusBar().showMessage("Compare %s with %s capture(s)" % (comparer.mode, len(comparison.others)))
+
+    def compareFailed(self, comparer, error):
+        if comparer is not self.comparer:
+            return
+
+        self.comparer = None
+        self.comparemode.setEnabled(True)
+        self.compareAction.setEnabled(self.sdrdatas is not None)
+        self.statusBar().showMessage("Can't compare %s" % comparer.mode)
+        QtGui.QMessageBox.warning(self, "Comparison failed", error)
+
+    def clearCompare(self):
+        # The running comparison is ignored
+        self.comparer = None
+        self.comparison = None
+        self.comparemode.setEnabled(True)
+        self.scene.comparelayer.setVisible(False)
+        self.clearcompareAction.setEnabled(False)
 
     def loadDatas(self, filename):
         self.exportMenu.setEnabled(False)
         self.saveimageAction.setEnabled(False)
+        self.compareAction.setEnabled(False)
+        self.clearCompare()
 
         exists = os.path.isfile(filename)
         if exists:
-            iscsvfile = filename.rfind(".csv") > -1 or filename.rfind(".running") > -1
+            iscsvfile = filename.rfind(".csv") > -1 or filename.rfind(".running") > -1 or \
+                filename.endswith(commons.COMPACTEXT)
             if iscsvfile:
-                # Load files
-                self.sdrdatas = commons.SDRDatas(filename)
-
-                # Load scan result
-                self.jsonstations = []
-                self.filefreqs = os.path.join(os.path.abspath(os.path.join(os.path.dirname(filename), '..')),
-                                              "scanresult.json")
-                self.jsonstations.append(self.loadStations(self.filefreqs))
-
-                globalcfg = self.sdrdatas.scaninfo['global']
-                for legend in self.sdrdatas.scaninfo['global']['heatmap']['stationsfilenames']:
-                    self.jsonstations.append(self.loadStations(legend))
-
-                # Add to table
-                while self.tablefreq.rowCount() > 0:
-                    self.tablefreq.removeRow(0)
-                for data in self.jsonstations[0]['stations']:
-                    self.insertOrUpdateFreq(-1, data)
-                self.tablefreq.sortItems(0)
-                self.tablefreq.resizeColumnsToContents()
-
-                # Refresh status
-                argumentcfg = self.sdrdatas.scaninfo['arguments']
-                self.statusBar().showMessage("?[%s] @[%s] => %s" % (
-                    argumentcfg['location']['name'],
-                    globalcfg['author']['name'],
-                    filename)
-                )
-                self.exportMenu.setEnabled(True)
-                self.saveimageAction.setEnabled(True)
-
-
-    def updateScene(self):
+                # Cancel the previous loading, its results will be ignored
+                if self.loader:
+                    self.loader.cancel()
+
+                # Save the edits of the previous file
+                self.saveFreqs()
+                self.journal = None
+                self.tablefreq.setEnabled(False)
+
+                self.sdrdatas = None
+                self.inspector = None
+                self.loader = DatasLoader(filename, self)
+                self.loader.progress.connect(self.loadProgress)
+                self.loader.preview.connect(self.loadPreview)
+                self.loader.loaded.connect(self.loadFinished)
+                self.loader.failed.connect(self.loadFailed)
+                self.loader.finished.connect(self.loader.deleteLater)
+                self.loader.start()
+
+    def loadProgress(self, loader, percent, message):
+        if loader is not self.loader:
+            return
+
+        self.progressbar.setValue(percent)
+        self.progressbar.setVisible(percent < 100)
+        self.statusBar().showMessage("%s %s" % (message, loader.filename))
+
+    def loadPreview(self, loader, result):
+        if loader is not self.loader:
+            return
+
+        summaries = result['sdrdatas'].summaries
+        self.scene.setFreqRange(summaries['freq']['start'], summaries['freq']['end'], summaries['freq']['step'])
+        pixmap = QtGui.QPixmap.fromImage(result['image'])
+        self.scene.heatmap.setPixmap(pixmap)
+        self.scene.heatmap.setPos(QtCore.QPointF(0, self.scene.ruler.height()))
+        self.scene.legend.setVisible(False)
+
+        totalheight = self.scene.ruler.height() + pixmap.height()
+        self.scene.setSceneRect(QtCore.QRectF(0, 0, pixmap.width(), totalheight))
+        self.view.update()
+
+    def loadFailed(self, loader, error):
+        if loader is not self.loader:
+            return
+
+        self.loader = None
+        self.progressbar.setValue(0)
+        self.progressbar.setVisible(False)
+        self.statusBar().showMessage("Can't load %s" % loader.filename)
+        QtGui.QMessageBox.warning(self, "Loading failed", "%s\n\n%s" % (loader.filename, error))
+
+    def loadFinished(self, loader, result):
+        if loader is not self.loader:
+            return
+
+        self.loader = None
+        self.sdrdatas = result['sdrdatas']
+        self.filefreqs = result['filefreqs']
+        self.jsonstations = result['jsonstations']
+
+        # Cursor inspector over the loaded samples
+        summaries = self.sdrdatas.summaries
+        self.inspector = inspector.CursorInspector(
+            self.sdrdatas.samples, summaries['freq']['start'], summaries['freq']['step'], self.sdrdatas.times
+        )
+        self.inspector.setSnapStep(self.stepfreq.currentText())
+        self.inspectedcell = (-1, -1)
+
+        # Compact the edits replayed from a previous session
+        self.journal = journal.StationJournal(self.filefreqs)
+        if self.journal.nbjournaled:
+            self.journal.compact(self.jsonstations[0])
+
+        # Add to table
+        self.stationmodel.setStations(self.jsonstations[0]['stations'])
+        self.tablefreq.setEnabled(True)
+        if self.stationstore.rowCount() <= 1000:
+            self.tablefreq.resizeColumnsToContents()
+
+        # Refresh status
+        globalcfg = self.sdrdatas.scaninfo['global']
+        argumentcfg = self.sdrdatas.scaninfo['arguments']
+        self.statusBar().showMessage("?[%s] @[%s] => %s" % (
+            argumentcfg['location']['name'],
+            globalcfg['author']['name'],
+            result['filename'])
+        )
+        self.exportMenu.setEnabled(True)
+        self.saveimageAction.setEnabled(True)
+        self.compareAction.setEnabled(True)
+
+        self.updateScene(result['image'])
+
+
+    def updateScene(self, image=None):
         # Reset scene
         self.scene.setFreqRange(self.sdrdatas.summaries['freq']['start'], self.sdrdatas.summaries['freq']['end'],
                                 self.sdrdatas.summaries['freq']['step'])
 
         # Generate Heatmap image
-        pixmap = self.scene.generateHeatmap(self.sdrdatas)
+        if image is None:
+            pixmap = self.scene.generateHeatmap(self.sdrdatas)
+        else:
+            pixmap = QtGui.QPixmap.fromImage(image)
         self.scene.heatmap.setPixmap(pixmap)
 
         # Update the legend freqs
         self.scene.legend.updateLegendSize(self.jsonstations)
+        self.scene.legend.setVisible(True)
 
         # Set items positions
         self.scene.heatmap.setPos(QtCore.QPointF(0, self.scene.ruler.height()))
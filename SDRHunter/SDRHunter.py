@@ -11,18 +11,28 @@ import os
 import sys
 import json
 import shlex
+import socket
 import time
 import pprint
 import argparse
+import cProfile
+import tempfile
+import threading
 import subprocess
 #from collections import OrderedDict
 #import matplotlib.pyplot as plt
 
 import numpy as np
-import scipy.signal as signal
-from tabulate import tabulate
 
+# scipy, tabulate and the sqlite, networking and archive modules are imported by the actions using them,
+# for the startup time
 import commons
+import baseline
+import candidates
+import colormap
+import export
+import journal
+import profiling
 
 # Todo: In searchstations, save after Nb Loop
 # TODO: rename range into freqs_range
@@ -50,6 +60,13 @@ def showVerbose(config, mess):
     if config['global']['verbose']:
         print mess
 
+def showMalformed(sdrdatas):
+    # Ignored by the parser, like the truncated last line of a killed rtl_power
+    if sdrdatas.nbmalformed:
+        print "%s%s malformed lines ignored in %s%s" % (
+            tcolor.ORANGE, sdrdatas.nbmalformed, sdrdatas.csvfilename, tcolor.DEFAULT
+        )
+
 def loadJSON(filename):
     exists = os.path.isfile(filename)
     if exists:
@@ -116,7 +133,21 @@ def executeShell(cmd, directory=None):
     return output
 
 
+def executeShellCompressed(cmd, filename, compression, directory=None):
+    # The command writes on stdout, the errors in a file to not block the pipe
+    with tempfile.TemporaryFile() as errors:
+        p = subprocess.Popen(cmd, shell=True, cwd=directory, stdout=subprocess.PIPE, stderr=errors)
+        commons.writeCSVStream(p.stdout, filename, compression)
+        if p.wait():
+            print 'Failed running %s' % cmd
+            errors.seek(0)
+            raise Exception(errors.read())
+
+
 def executeRTLPower(cmdargs, config, scanlevel, start):
+    import metrics
+    import retention
+
     # Create directory if not exists
     if not os.path.isdir(scanlevel['scandir']):
         print "executeRTLPower SCANDIR: %s" % scanlevel['scandir']
@@ -125,9 +156,9 @@ def executeRTLPower(cmdargs, config, scanlevel, start):
     for gain in scanlevel['gains']:
         filename = calcFilename(scanlevel, start, gain)
 
-        # Ignore call rtl_power if file already exist
-        csv_filename = "%s.csv" % filename
-        exists = os.path.isfile(csv_filename)
+        # Ignore call rtl_power if file already exist, or was compacted
+        csv_filename = "%s%s" % (filename, commons.COMPRESSIONS.get(scanlevel['compression'], '.csv'))
+        exists = retention.isCaptured(filename)
         if exists:
             showVerbose(
                 config,
@@ -138,7 +169,8 @@ def executeRTLPower(cmdargs, config, scanlevel, start):
                     tcolor.DEFAULT
                 )
             )
-            return
+            metrics.registry.inc('sdrhunter_windows_pending', -1, {'scanlevel': scanlevel['name']})
+            continue
         else:
             running_filename = "%s.running" % filename
             exists = os.path.isfile(running_filename)
@@ -163,7 +195,10 @@ def executeRTLPower(cmdargs, config, scanlevel, start):
             if os.name == "nt":
                 cmddir = "C:\\SDRHunter\\rtl-sdr-release\\x32"
 
-            cmd = "rtl_power -p %s -g %s -f %s:%s:%s -i %s -e %s \"%s\"" % (
+            # Compressed captures are written from the rtl_power stdout
+            output = "-" if scanlevel['compression'] else running_filename
+            cmd = "rtl_power -d %s -p %s -g %s -f %s:%s:%s -i %s -e %s \"%s\"" % (
+                config['global']['device'],
                 config['global']['ppm'],
                 gain,
                 start,
@@ -171,24 +206,82 @@ def executeRTLPower(cmdargs, config, scanlevel, start):
                 scanlevel['binsize'],
                 scanlevel['interval'],
                 scanlevel['quitafter'],
-                running_filename
+                output
             )
 
-            # Create Scan info file
-            createScanInfoFile(cmdargs, config, scanlevel, start, gain)
+            # Free the disk before rtl_power fails mid capture
+            retention.enforceHighWater(config)
+
+            with profiling.profiler.window('scan', scanlevel['name'], start, gain):
+                # Create Scan info file
+                createScanInfoFile(cmdargs, config, scanlevel, start, gain)
+
+                # Call rtl_power shell command
+                with profiling.profiler.stage('rtl_power'):
+                    duration = executeRTLPowerRetries(cmd, cmddir, config, scanlevel, start, gain, running_filename)
+
+                # Rename file
+                os.rename(running_filename, csv_filename)
+                profiling.profiler.addWritten(csv_filename)
 
-            # Call rtl_power shell command
-            executeShell(cmd, cmddir)
+            captureMetrics(scanlevel, csv_filename, duration)
 
-            # Rename file
-            os.rename(running_filename, csv_filename)
+
+def executeRTLPowerRetries(cmd, cmddir, config, scanlevel, start, gain, running_filename):
+    import metrics
+
+    # Retry a failed rtl_power, the dongle is shown in the metrics while running
+    labels = {'scanlevel': scanlevel['name']}
+    windowlabels = {
+        'device': config['global']['device'], 'scanlevel': scanlevel['name'],
+        'start': commons.float2Hz(start), 'gain': gain
+    }
+    metrics.registry.set('sdrhunter_dongle_window', 1, windowlabels)
+    try:
+        for retry in range(config['global']['retries'] + 1):
+            begin = time.time()
+            try:
+                if scanlevel['compression']:
+                    executeShellCompressed(cmd, running_filename, scanlevel['compression'], cmddir)
+                else:
+                    executeShell(cmd, cmddir)
+                return time.time() - begin
+            except Exception:
+                metrics.registry.inc('sdrhunter_failures_total', 1, labels)
+                if retry >= config['global']['retries']:
+                    raise
+                metrics.registry.inc('sdrhunter_retries_total', 1, labels)
+                print "%sScan '%s' : retry %s/%s%s" % (
+                    tcolor.RED, scanlevel['name'], retry + 1, config['global']['retries'], tcolor.DEFAULT
+                )
+    finally:
+        metrics.registry.remove('sdrhunter_dongle_window', windowlabels)
+
+
+def captureMetrics(scanlevel, csv_filename, duration):
+    import metrics
+
+    labels = {'scanlevel': scanlevel['name']}
+    metrics.registry.inc('sdrhunter_windows_completed_total', 1, labels)
+    metrics.registry.inc('sdrhunter_windows_pending', -1, labels)
+    metrics.registry.inc('sdrhunter_rtlpower_seconds_total', duration)
+    metrics.registry.set('sdrhunter_rtlpower_last_seconds', duration)
+    metrics.registry.inc('sdrhunter_capture_bytes_total', os.path.getsize(csv_filename))
+
+    # Read the capture again only for a metrics server
+    if not metrics.registry.exported:
+        return
+
+    with commons.openCSVFile(csv_filename) as f:
+        nblines = sum(1 for line in f)
+    metrics.registry.inc('sdrhunter_lines_ingested_total', nblines)
+    metrics.registry.set('sdrhunter_lines_per_second', nblines / duration if duration > 0 else 0)
 
 def loadOrGenerateSummaryFile(csv_filename):
-    (filename, ext) = os.path.splitext(csv_filename)
+    filename = commons.csvBasename(csv_filename)
     summary_filename = '%s%s' % (filename, '.summary')
 
     sdrdatas = commons.SDRDatas(csv_filename)
-    sdrdatas.genSummarizeSignal()
     saveJSON(summary_filename, sdrdatas.summaries)
 
 def executeSumarizeSignals(cmdargs, config, scanlevel, start):
@@ -196,7 +289,7 @@ def executeSumarizeSignals(cmdargs, config, scanlevel, start):
         filename = calcFilename(scanlevel, start, gain)
 
         # ignore if rtl_power file not exists
-        csv_filename = "%s.csv" % filename
+        csv_filename = commons.csvFilename(filename)
         exists = os.path.isfile(csv_filename)
         if not exists:
             showVerbose(
@@ -231,18 +324,26 @@ def executeSumarizeSignals(cmdargs, config, scanlevel, start):
         )
 
 
-        sdrdatas = commons.SDRDatas(csv_filename)
-        sdrdatas.genSummarizeSignal()
-        saveJSON(summary_filename, sdrdatas.summaries)
+        with profiling.profiler.window('gensummaries', scanlevel['name'], start, gain):
+            sdrdatas = commons.SDRDatas(csv_filename)
+            with profiling.profiler.stage('parse'):
+                sdrdatas.csv
+            profiling.profiler.addRead(csv_filename)
+            showMalformed(sdrdatas)
+            with profiling.profiler.stage('summarize'):
+                summaries = sdrdatas.summaries
+            with profiling.profiler.stage('save'):
+                saveJSON(summary_filename, summaries)
+            profiling.profiler.addWritten(summary_filename)
 
 
-def executeSearchStations(config, stations, scanlevel, start):
+def executeSearchStations(config, stationcandidates, scanlevel, start, gain, noisebaseline=None):
 
 
-    filename = calcFilename(scanlevel, start)
+    filename = calcFilename(scanlevel, start, gain)
 
     # ignore if rtl_power file not exists
-    csv_filename = "%s.csv" % filename
+    csv_filename = commons.csvFilename(filename)
     exists = os.path.isfile(csv_filename)
     if not exists:
         showVerbose(
@@ -268,18 +369,53 @@ def executeSearchStations(config, stations, scanlevel, start):
             )
         )
         return
-    summaries = loadJSON(summary_filename)
+    with profiling.profiler.stage('parse'):
+        summaries = commons.loadCachedJSON(summary_filename)
+    profiling.profiler.addRead(summary_filename)
+
+    smooth_max = commons.smooth(np.array(summaries['max']['signal']),10, 'flat')
+
+    # Threshold with the location baseline, built from the previous captures of the same signal
+    if noisebaseline:
+        nbvalues = len(summaries['max']['signal'])
+        samples = smooth_max[:nbvalues]
+        (floor, thresholds) = noisebaseline.thresholds(
+            summaries['freq']['start'], nbvalues, scanlevel['minrelativedb'], config['global']['baseline']['nbstd']
+        )
+
+        # The window file is overwritten by each scan, the capture time tells them apart
+        source = "%s %s" % (os.path.basename(summary_filename), summaries['time']['start'])
+        noisebaseline.update(summaries['freq']['start'], samples, source)
+
+        if np.all(np.isfinite(thresholds)):
+            if not np.any(samples > thresholds):
+                showVerbose(
+                    config,
+                    "%sFind stations '%s' : %shz-%shz%s no deviation from baseline" % (
+                        tcolor.GREEN,
+                        scanlevel['name'], commons.float2Hz(start), commons.float2Hz(start + scanlevel['windows']),
+                        tcolor.DEFAULT,
+                    )
+                )
+                return
+
+            print "%sFind stations '%s' : %shz-%shz from baseline" % (
+                tcolor.DEFAULT,
+                scanlevel['name'], commons.float2Hz(start), commons.float2Hz(start + scanlevel['windows']),
+            )
+            with profiling.profiler.stage('peaksearch'):
+                searchStationBaseline(scanlevel, stationcandidates, summaries, samples, floor, thresholds)
+            return
 
     print "%sFind stations '%s' : %shz-%shz" % (
         tcolor.DEFAULT,
         scanlevel['name'], commons.float2Hz(start), commons.float2Hz(start + scanlevel['windows']),
     )
 
-    smooth_max = commons.smooth(np.array(summaries['max']['signal']),10, 'flat')
-
     limitmin = summaries['min']['peak']['min']['mean'] - summaries['min']['peak']['min']['std']
     limitmax = summaries['max']['mean'] + summaries['max']['std']
-    searchStation(scanlevel, stations, summaries, smooth_max, limitmin, limitmax)
+    with profiling.profiler.stage('peaksearch'):
+        searchStation(scanlevel, stationcandidates, summaries, smooth_max, limitmin, limitmax)
 
 
 
@@ -302,7 +438,7 @@ def executeHeatmapParameters(cmdargs, config, scanlevel, start):
             )
             continue
 
-        summaries = loadJSON(summary_filename)
+        summaries = commons.loadCachedJSON(summary_filename)
         params_filename = "%s.hparam" % filename
         exists = os.path.isfile(params_filename)
         if exists:
@@ -362,7 +498,7 @@ def executeHeatmap(cmdargs, config, scanlevel, start):
     for gain in scanlevel['gains']:
         filename = calcFilename(scanlevel, start, gain)
 
-        csv_filename = "%s.csv" % filename
+        csv_filename = commons.csvFilename(filename)
         exists = os.path.isfile(csv_filename)
         if not exists:
             showVerbose(
@@ -408,30 +544,25 @@ def executeHeatmap(cmdargs, config, scanlevel, start):
             gain,
         )
 
-        print "CSV: %s" % csv_filename
-        datas = commons.SDRDatas(csv_filename)
-        for line in datas.samples:
-            print len(line)
-
-        print ""
-
-
-        # # Check calc or check if Heatmap paramters exists
-        # cmd = "python heatmap.py --parameters %s %s %s" % (
-        #     params_filename,
-        #     csv_filename,
-        #     img_filename
-        # )
-        # print cmd
-        #
-        # # Call heatmap.py shell command
-        # executeShell(cmd, config['global']['heatmap']['dirname'])
+        # Render with the same colormap as HeapAnalyzer
+        with profiling.profiler.window('genheatmaps', scanlevel['name'], start, gain):
+            heatmapcfg = config['global']['heatmap']
+            datas = commons.SDRDatas(csv_filename)
+            with profiling.profiler.stage('parse'):
+                datas.csv
+            profiling.profiler.addRead(csv_filename)
+            showMalformed(datas)
+            with profiling.profiler.stage('render'):
+                rgb = datas.heatmapRGB(heatmapcfg['palette'], heatmapcfg['clip'], heatmapcfg['lutsize'])
+            with profiling.profiler.stage('save'):
+                colormap.saveHeatmapImage(img_filename, rgb)
+            profiling.profiler.addWritten(img_filename)
 
 def executeSpectre(cmdargs, config, scanlevel, start):
     for gain in scanlevel['gains']:
         filename = calcFilename(scanlevel, start, gain)
 
-        csv_filename = "%s.csv" % filename
+        csv_filename = commons.csvFilename(filename)
         exists = os.path.isfile(csv_filename)
         if not exists:
             showVerbose(
@@ -457,7 +588,7 @@ def executeSpectre(cmdargs, config, scanlevel, start):
                 )
             )
             return
-        summaries = loadJSON(summary_filename)
+        summaries = commons.loadCachedJSON(summary_filename)
 
         # Check if scan exist
         img_filename = "%s_spectre.png" % filename
@@ -512,6 +643,8 @@ def executeSpectre(cmdargs, config, scanlevel, start):
 
 
 def showInfo(config, args):
+    from tabulate import tabulate
+
     # Show config
     result_scan = []
     if 'configs' in config:
@@ -556,11 +689,43 @@ def showInfo(config, args):
         pprint.pprint(config['global'],indent=2)
 
 
-def searchStation(scanlevel, stations, summaries, samples, limitmin, limitmax):
+def appendCandidate(stationcandidates, freq_center, bw, maxdb, relativedb):
+    # Merged with the other candidates at the end of the search
+    stationcandidates.append({'freq_center': freq_center, 'bw': bw, 'powerdb': maxdb, 'relativedb': relativedb})
+
+
+def upperRuns(isup):
+    # First and last index of each consecutive upper samples
+    edges = np.diff(np.concatenate(([0], isup.astype(np.int8), [0])))
+    return (np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1)
+
+
+def searchStationBaseline(scanlevel, stationcandidates, summaries, samples, floor, thresholds):
+    freqstep = summaries['freq']['step']
+    bwmin = commons.hz2Float(scanlevel['minscanbw'])
+    bwmax = commons.hz2Float(scanlevel['maxscanbw'])
+
+    # All the bins compared in one pass
+    (startups, endups) = upperRuns(samples > thresholds)
+    for (startup, endup) in zip(startups.tolist(), endups.tolist()):
+        maxidx = startup + int(np.argmax(samples[startup:endup + 1]))
+        maxdb = samples[maxidx]
+
+        bw_nbstep = endup - startup
+        bw = bw_nbstep * freqstep
+        freqidx = startup + int(bw_nbstep / 2)
+        freq_center = summaries['freq']['start'] + (freqidx * freqstep)
+
+        relativedb = maxdb - floor[maxidx]
+        if bwmin <= bw <= bwmax and relativedb > scanlevel['minrelativedb']:
+            print "Freq:%s / Bw:%s / Abs: %s dB / From baseline:%.2f dB" % (commons.float2Hz(freq_center), commons.float2Hz(bw), maxdb, relativedb)
+            appendCandidate(stationcandidates, freq_center, bw, maxdb, relativedb)
+
+
+def searchStation(scanlevel, stationcandidates, summaries, samples, limitmin, limitmax):
 
     #search_limit = sorted(limit_list)
     freqstep = summaries['freq']['step']
-    stations['stations'] = sorted(stations['stations'], key=lambda x: commons.hz2Float(x['freq_center']) - commons.hz2Float((x['bw'])))
 
     bwmin = commons.hz2Float(scanlevel['minscanbw'])
     bwmax = commons.hz2Float(scanlevel['maxscanbw'])
@@ -610,46 +775,46 @@ def searchStation(scanlevel, stations, summaries, samples, limitmin, limitmax):
                     if bwmin <= bw <= bwmax and deltadb > scanlevel['minrelativedb']:
 
                         print "Freq:%s / Bw:%s / Abs: %s dB / From ground:%.2f dB" % (commons.float2Hz(freq_center), commons.float2Hz(bw), maxdb, maxdb - limitmax)
-
-                        found = False
-                        for station in stations['stations']:
-                            if freq_center >= commons.hz2Float(station['freq_center']) - bw and freq_center <= commons.hz2Float(station['freq_center']) + bw:
-                                found = True
-                                break
-
-                        if not found:
-
-                            stations['stations'].append(
-                                {'freq_center': commons.float2Hz(freq_center),
-                                  'bw': commons.float2Hz(bw),
-                                  'powerdb': float("%.2f" % maxdb),
-                                  'relativedb': float("%.2f" % (maxdb - limitmin))
-                                }
-                            )
-                            stations['stations'] = sorted(stations['stations'], key=lambda x: commons.hz2Float(x['freq_center']) - commons.hz2Float(x['bw']))
+                        appendCandidate(stationcandidates, freq_center, bw, maxdb, maxdb - limitmin)
 
 
                     startup = -1
 
 
 def scan(config, args):
+    import metrics
+    import retention
+
+    # Compact the old captures while scanning
+    if 'scans' in config and config['global']['retention']['background']:
+        retention.RetentionWorker(config).start()
+
     if 'scans' in config:
         for scanlevel in config['scans']:
             if not scanlevel['scanfromstations']:
                 range = np.linspace(scanlevel['freq_start'],scanlevel['freq_end'], num=scanlevel['nbstep'], endpoint=False)
+                metrics.registry.set(
+                    'sdrhunter_windows_pending', len(range) * len(scanlevel['gains']), {'scanlevel': scanlevel['name']}
+                )
                 for left_freq in range:
                     executeRTLPower(args, config, scanlevel, left_freq)
 
 
 def zoomedscan(config, args):
+    import metrics
+
     if 'scans' in config:
         for scanlevel in config['scans']:
             if scanlevel['scanfromstations']:
-                stations = loadJSON(scanlevel['stationsfilename'])
+                stations = commons.loadCachedJSON(scanlevel['stationsfilename'])
                 confirmed_station = []
                 for station in stations['stations']:
                     if 'name' in station:
                         confirmed_station.append(station)
+                metrics.registry.set(
+                    'sdrhunter_windows_pending', len(confirmed_station) * len(scanlevel['gains']),
+                    {'scanlevel': scanlevel['name']}
+                )
                 for station in confirmed_station:
                     freq_left = commons.hz2Float(station['freq_center']) - commons.hz2Float(scanlevel['windows'] / 2)
                     executeRTLPower(args, config, scanlevel, freq_left)
@@ -664,7 +829,7 @@ def generateSummaries(config, args):
 
             # For scanlevel with stationsfilename
             if 'stationsfilename' in scanlevel:
-                stations = loadJSON(scanlevel['stationsfilename'])
+                stations = commons.loadCachedJSON(scanlevel['stationsfilename'])
                 if stations:
                     confirmed_station = []
                     for station in stations['stations']:
@@ -674,16 +839,270 @@ def generateSummaries(config, args):
                         freq_left = commons.hz2Float(station['freq_center']) - commons.hz2Float(scanlevel['windows'] / 2)
                         executeSumarizeSignals(args, config, scanlevel, freq_left)
 
-def searchStations(config, args):
+def executeSearchBursts(config, store, scanlevel, start):
+    import bursts
+
+    for gain in scanlevel['gains']:
+        filename = calcFilename(scanlevel, start, gain)
+
+        # ignore if rtl_power file not exists
+        csv_filename = commons.csvFilename(filename)
+        exists = os.path.isfile(csv_filename)
+        if not exists:
+            showVerbose(
+                config,
+                "%s %s not exist%s" % (
+                    tcolor.RED,
+                    csv_filename,
+                    tcolor.DEFAULT,
+                )
+            )
+            continue
+
+        # Ignore the captures already analysed
+        capture = os.path.basename(csv_filename)
+        if store.hasCapture(capture):
+            showVerbose(
+                config,
+                "%sSearch bursts '%s' : %shz-%shz%s for %s gain" % (
+                    tcolor.GREEN,
+                    scanlevel['name'], commons.float2Hz(start), commons.float2Hz(start + scanlevel['windows']),
+                    gain,
+                    tcolor.DEFAULT,
+                )
+            )
+            continue
+
+        with profiling.profiler.window('searchbursts', scanlevel['name'], start, gain):
+            sdrdatas = commons.SDRDatas(csv_filename)
+            with profiling.profiler.stage('parse'):
+                sdrdatas.csv
+            profiling.profiler.addRead(csv_filename)
+            showMalformed(sdrdatas)
+            burstscfg = config['global']['bursts']
+            with profiling.profiler.stage('detect'):
+                events = bursts.detectBursts(
+                    sdrdatas.samples, sdrdatas.freq_start, sdrdatas.freq_step, sdrdatas.times,
+                    burstscfg['mindb'], burstscfg['nbstd'], burstscfg['minsize'], burstscfg['maxlinefraction']
+                )
+            with profiling.profiler.stage('save'):
+                store.add(capture, events)
+
+        print "%sSearch bursts '%s' : %shz-%shz for %s gain, %s bursts" % (
+            tcolor.DEFAULT,
+            scanlevel['name'], commons.float2Hz(start), commons.float2Hz(start + scanlevel['windows']),
+            gain, len(events)
+        )
+
+def searchBursts(config, args):
+    import bursts
+
     if 'scans' in config:
+        store = bursts.EventStore(os.path.join(config['global']['rootdir'], args.location, "bursts.sqlite"))
         for scanlevel in config['scans']:
-            stations_filename = os.path.join(config['global']['rootdir'], args.location, "scanresult.json")
-            stations = loadStations(stations_filename)
             range = np.linspace(scanlevel['freq_start'],scanlevel['freq_end'], num=scanlevel['nbstep'], endpoint=False)
             for left_freq in range:
-                executeSearchStations(config, stations, scanlevel, left_freq)
+                executeSearchBursts(config, store, scanlevel, left_freq)
+        store.close()
+
+def loadBaseline(config, scanlevel, gain):
+    # One baseline by location, scan level and gain
+    filename = os.path.join(scanlevel['scandir'], "baseline-%07.2fdB.npz" % gain)
+    freq_step = commons.hz2Float(scanlevel['binsize'])
+
+    return baseline.NoiseBaseline(
+        filename, scanlevel['freq_start'], scanlevel['freq_end'] + scanlevel['windows'], freq_step,
+        config['global']['baseline']['history'], config['global']['baseline']['minobs']
+    )
+
+def searchStations(config, args):
+    if 'scans' in config:
+        # Candidates of all the scan levels, windows and gains
+        stationcandidates = []
+        for scanlevel in config['scans']:
+            range = np.linspace(scanlevel['freq_start'],scanlevel['freq_end'], num=scanlevel['nbstep'], endpoint=False)
+            for gain in scanlevel['gains']:
+                noisebaseline = loadBaseline(config, scanlevel, gain)
+                for left_freq in range:
+                    with profiling.profiler.window('searchstations', scanlevel['name'], left_freq, gain):
+                        executeSearchStations(config, stationcandidates, scanlevel, left_freq, gain, noisebaseline)
+
+                if os.path.isdir(scanlevel['scandir']):
+                    noisebaseline.save()
+
+        # Merged once, with the stations edits not yet compacted
+        stations_filename = os.path.join(config['global']['rootdir'], args.location, "scanresult.json")
+        stationsjournal = journal.StationJournal(stations_filename)
+        stations = stationsjournal.replay(loadStations(stations_filename))
+        added = candidates.mergeStations(stations, stationcandidates)
+        print "%s candidates, %s new stations" % (len(stationcandidates), len(added))
+
+        stationsjournal.compact(stations)
+
 
-            saveJSON(stations_filename, stations)
+def applyRetention(config, args):
+    import retention
+
+    if 'scans' in config:
+        for scanlevel in config['scans']:
+            result = retention.applyRetention(config, scanlevel)
+            print "Retention '%s' : %s compacted, %s rolled up, %.1fMB freed" % (
+                scanlevel['name'], result['compacted'], result['rolledup'], result['freed'] / 1024.0 ** 2
+            )
+
+
+def loadJobConfig(configs, location, configname):
+    # The configs stay loaded while the JSON file is not modified
+    filename = commons.getJSONConfigFilename()
+    mtime = os.path.getmtime(filename)
+    key = (location, configname)
+    if key not in configs or configs[key][0] != mtime:
+        cmdline = ['-l', location] + (['-c', configname] if configname else [])
+        configs[key] = (mtime, commons.loadConfigFile(filename, parse_arguments(cmdline)))
+
+    return configs[key][1]
+
+
+def runWorker(config, args):
+    import jobs
+
+    # Resident process, the jobs are submitted with jobs.py
+    jobsconfig = config['global']['jobs']
+    queue = jobs.JobQueue(jobs.databaseFilename(config))
+    configs = {}
+    configslock = threading.Lock()
+
+    def executeJob(job):
+        cmdline = ['-a', job['action'], '-l', job['location']]
+        if job['configname']:
+            cmdline += ['-c', job['configname']]
+        if job['output']:
+            cmdline += ['-o', job['output']]
+
+        with configslock:
+            jobconfig = loadJobConfig(configs, job['location'], job['configname'])
+        executeAction(jobconfig, parse_arguments(cmdline))
+
+    # The jobs of a stopped worker are run again
+    queue.requeueRunning()
+
+    worker = jobs.JobWorker(queue, executeJob, jobsconfig['concurrency'], jobsconfig['poll'])
+    print "Worker on %s" % queue.filename
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+    finally:
+        queue.close()
+
+
+def clusterWindows(config):
+    import retention
+
+    # The windows of the scan not yet captured, by gain
+    windows = []
+    for scanlevel in config.get('scans', []):
+        if scanlevel['scanfromstations']:
+            continue
+        range = np.linspace(scanlevel['freq_start'],scanlevel['freq_end'], num=scanlevel['nbstep'], endpoint=False)
+        for left_freq in range.tolist():
+            for gain in scanlevel['gains']:
+                if not retention.isCaptured(calcFilename(scanlevel, left_freq, gain)):
+                    windows.append({'scanlevel': scanlevel['name'], 'start': left_freq, 'gain': gain})
+
+    return windows
+
+
+def runCoordinator(config, args):
+    import cluster
+
+    # Own the sweep plan, the workers stream back their captures
+    clustercfg = config['global']['cluster']
+    scanlevels = dict([(scanlevel['name'], scanlevel) for scanlevel in config['scans']])
+
+    def capturefilename(window, ext):
+        return "%s%s" % (calcFilename(scanlevels[window['scanlevel']], window['start'], window['gain']), ext)
+
+    plan = cluster.SweepPlan(clusterWindows(config), clustercfg['lease'])
+    coordinator = cluster.Coordinator(plan, capturefilename, clustercfg['host'], clustercfg['port'])
+    coordinator.start()
+    print "Coordinator on %s:%s, %s windows" % (clustercfg['host'], coordinator.port, len(plan.pending))
+    try:
+        while not plan.finished():
+            time.sleep(clustercfg['poll'])
+            status = plan.status()
+            showVerbose(config, "%(done)s done, %(leased)s leased, %(pending)s pending" % status)
+
+        # The waiting workers learn that the sweep is finished
+        time.sleep(clustercfg['poll'] * 2)
+    finally:
+        coordinator.stop()
+
+
+def runClusterWorker(config, args):
+    import cluster
+
+    # Capture the windows leased by the coordinator
+    clustercfg = config['global']['cluster']
+    address = (clustercfg['host'], clustercfg['port'])
+    if args.coordinator:
+        (host, port) = args.coordinator.rsplit(':', 1)
+        address = (host, int(port))
+    scanlevels = dict([(scanlevel['name'], scanlevel) for scanlevel in config['scans']])
+
+    def capture(window):
+        scanlevel = dict(scanlevels[window['scanlevel']], gains=[window['gain']])
+        executeRTLPower(args, config, scanlevel, window['start'])
+        return commons.csvFilename(calcFilename(scanlevel, window['start'], window['gain']))
+
+    name = "%s-%s" % (socket.gethostname(), config['global']['device'])
+    worker = cluster.ClusterWorker(address, name, capture, clustercfg['heartbeat'], clustercfg['poll'])
+    print "%s captures sent to %s:%s" % (worker.run(), address[0], address[1])
+
+
+def sendCaptures(config, args):
+    import retention
+    import transfer
+
+    # The finished captures of all the locations, not yet received
+    transfercfg = config['global']['transfer']
+    address = (transfercfg['host'], transfercfg['port'])
+    if args.receiver:
+        (host, port) = args.receiver.rsplit(':', 1)
+        address = (host, int(port))
+
+    dirnames = []
+    for scanlevel in config.get('scans', []):
+        dirnames += retention.captureDirs(config, scanlevel)
+
+    sender = transfer.Sender(config['global']['rootdir'], address, transfercfg['batchsize'], transfercfg['retry'])
+    print "%s files sent to %s:%s" % (sender.send(dirnames), address[0], address[1])
+
+
+def receiveCaptures(config, args):
+    import transfer
+
+    transfercfg = config['global']['transfer']
+    receiver = transfer.Receiver(
+        config['global']['rootdir'], transfercfg['host'], transfercfg['port'], transfercfg['maxbusy']
+    )
+    print "Receiving in %s on %s:%s" % (config['global']['rootdir'], transfercfg['host'], receiver.port)
+    try:
+        receiver.server.serve_forever()
+    except KeyboardInterrupt:
+        receiver.server.server_close()
+
+
+def exportStations(config, args, exportformat):
+    # Stations with the edits not yet compacted
+    stations_filename = os.path.join(config['global']['rootdir'], args.location, "scanresult.json")
+    stations = journal.StationJournal(stations_filename).replay(loadStations(stations_filename))
+
+    filename = args.output
+    if not filename:
+        filename = os.path.join(config['global']['rootdir'], args.location, "export.%s" % exportformat)
+
+    export.exportStations(filename, stations, exportformat, config)
 
 def generateHeatmapParameters(config, args):
     if 'scans' in config:
@@ -694,7 +1113,7 @@ def generateHeatmapParameters(config, args):
 
             # For scanlevel with stationsfilename
             if 'stationsfilename' in scanlevel:
-                stations = loadJSON(scanlevel['stationsfilename'])
+                stations = commons.loadCachedJSON(scanlevel['stationsfilename'])
                 confirmed_station = []
                 for station in stations['stations']:
                     if 'name' in station:
@@ -713,7 +1132,7 @@ def generateHeatmaps(config, args):
 
             # For scanlevel with stationsfilename
             if 'stationsfilename' in scanlevel:
-                stations = loadJSON(scanlevel['stationsfilename'])
+                stations = commons.loadCachedJSON(scanlevel['stationsfilename'])
                 confirmed_station = []
                 for station in stations['stations']:
                     if 'name' in station:
@@ -731,7 +1150,7 @@ def generateSpectres(config, args):
 
             # For scanlevel with stationsfilename
             if 'stationsfilename' in scanlevel:
-                stations = loadJSON(scanlevel['stationsfilename'])
+                stations = commons.loadCachedJSON(scanlevel['stationsfilename'])
                 confirmed_station = []
                 for station in stations['stations']:
                     if 'name' in station:
@@ -760,9 +1179,18 @@ def parse_arguments(cmdline=""):
             'zoomedscan',
             'gensummaries',
             'searchstations',
+            'searchbursts',
             'genheatmapparameters',
             'genheatmaps',
-            'genspectres'
+            'genspectres',
+            'exporttxt',
+            'exportuniden',
+            'retention',
+            'worker',
+            'coordinator',
+            'clusterworker',
+            'send',
+            'receive'
         ],
         help='Action'
     )
@@ -791,6 +1219,63 @@ def parse_arguments(cmdline=""):
         help='Config name'
     )
 
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        dest='profile',
+        default=False,
+        help='Time the stages of each window'
+    )
+
+    parser.add_argument(
+        '--cprofile',
+        action='store_true',
+        dest='cprofile',
+        default=False,
+        help='Also dump the cProfile stats of the action, implies --profile'
+    )
+
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        dest='daemon',
+        default=False,
+        help='Repeat the action every metrics interval, and serve the metrics'
+    )
+
+    parser.add_argument(
+        '--metrics-port',
+        action='store',
+        dest='metricsport',
+        type=int,
+        default=None,
+        help='Serve the Prometheus metrics on this local port'
+    )
+
+    parser.add_argument(
+        '--coordinator',
+        action='store',
+        dest='coordinator',
+        default=None,
+        help='host:port of the coordinator, for clusterworker'
+    )
+
+    parser.add_argument(
+        '--receiver',
+        action='store',
+        dest='receiver',
+        default=None,
+        help='host:port of the analysis host, for send'
+    )
+
+    parser.add_argument(
+        '-o', '--output',
+        action='store',
+        dest='output',
+        default=None,
+        help='Export filename (- for stdout)'
+    )
+
 
     parser.add_argument(
         '-v', '--version',
@@ -799,18 +1284,14 @@ def parse_arguments(cmdline=""):
     )
 
     a = parser.parse_args(cmdline)
-    return a
 
+    # The cProfile stats are saved beside the profiling trace
+    a.profile = a.profile or a.cprofile
 
-def main():
-    # Parse arguments
-    args = parse_arguments(sys.argv[1:])  # pragma: no cover
+    return a
 
-    # Load JSON config
-    config = commons.loadConfigFile(commons.getJSONConfigFilename(), args)
-    if not config:
-        raise Exception("No infos found in %s" % args.filename)
 
+def executeAction(config, args):
     # Execute successive action
     if args.action:
         if 'infos' == args.action:
@@ -828,6 +1309,9 @@ def main():
         if 'searchstations' == args.action:
             searchStations(config, args)
 
+        if 'searchbursts' == args.action:
+            searchBursts(config, args)
+
         if 'genheatmapparameters' == args.action:
             generateHeatmapParameters(config, args)
 
@@ -837,6 +1321,99 @@ def main():
         if 'genspectres' == args.action:
             generateSpectres(config, args)
 
+        if 'exporttxt' == args.action:
+            exportStations(config, args, 'txt')
+
+        if 'exportuniden' == args.action:
+            exportStations(config, args, 'uniden')
+
+        if 'retention' == args.action:
+            applyRetention(config, args)
+
+        if 'worker' == args.action:
+            runWorker(config, args)
+
+        if 'coordinator' == args.action:
+            runCoordinator(config, args)
+
+        if 'clusterworker' == args.action:
+            runClusterWorker(config, args)
+
+        if 'send' == args.action:
+            sendCaptures(config, args)
+
+        if 'receive' == args.action:
+            receiveCaptures(config, args)
+
+
+def runDaemon(config, args, interval):
+    import metrics
+
+    # Repeat the action, a failed sweep is retried at the next one
+    while True:
+        begin = time.time()
+        try:
+            executeAction(config, args)
+        except Exception as e:
+            print "%sSweep failed: %s%s" % (tcolor.RED, e, tcolor.DEFAULT)
+        metrics.registry.inc('sdrhunter_sweeps_total')
+
+        time.sleep(max(0, interval - (time.time() - begin)))
+
+
+def main():
+    # Parse arguments
+    args = parse_arguments(sys.argv[1:])  # pragma: no cover
+
+    # Load JSON config
+    config = commons.loadConfigFile(commons.getJSONConfigFilename(), args)
+    if not config:
+        raise Exception("No infos found in %s" % args.filename)
+
+    # Profiling trace, in the location directory
+    if args.profile:
+        profilename = os.path.join(
+            config['global']['rootdir'], args.location, "profiles",
+            "%s-%s" % (args.action, time.strftime("%Y%m%d-%H%M%S"))
+        )
+        profiling.profiler.start("%s.jsonl" % profilename)
+        if args.cprofile:
+            cprofiler = cProfile.Profile()
+            cprofiler.enable()
+
+    # Metrics endpoint
+    metricsserver = None
+    metricsconfig = config['global']['metrics']
+    try:
+        if args.daemon or args.metricsport is not None:
+            import metrics
+
+            port = metricsconfig['port'] if args.metricsport is None else args.metricsport
+            metricsserver = metrics.MetricsServer(metrics.registry, port, metricsconfig['host'])
+            metricsserver.start()
+            print "Metrics on http://%s:%s/metrics" % (metricsconfig['host'], metricsserver.port)
+
+        if args.daemon:
+            runDaemon(config, args, metricsconfig['interval'])
+        else:
+            executeAction(config, args)
+    finally:
+        # Also the profile of a failed action
+        if args.profile:
+            if args.cprofile:
+                cprofiler.disable()
+                cprofiler.dump_stats("%s.prof" % profilename)
+
+            from tabulate import tabulate
+
+            print ""
+            print tabulate(profiling.profiler.summary(), headers=profiling.Profiler.summaryheaders, stralign="right")
+            print "Profile trace: %s" % profiling.profiler.tracefilename
+            profiling.profiler.stop()
+
+        if metricsserver:
+            metricsserver.stop()
+
 
 if __name__ == '__main__':
     main()  # pragma: no cover
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Noise floor baseline per location and frequency bin"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import os
+import warnings
+
+import numpy as np
+
+import commons
+
+# IQR to std for a normal distribution
+IQR2STD = 1.349
+
+# Lower spread, in dB
+MINSPREAD = 0.1
+
+# Observed signal, the one compared with the thresholds
+SIGNAL = 'smoothmax'
+
+
+def setBaselineDefaults(baseline):
+    if 'history' not in baseline:
+        baseline['history'] = 10
+    if 'minobs' not in baseline:
+        baseline['minobs'] = 3
+    if 'nbstd' not in baseline:
+        baseline['nbstd'] = 3
+
+    return baseline
+
+
+class NoiseBaseline(object):
+    """Last smoothed max signals of each frequency bin, the floor is their median"""
+
+    def __init__(self, filename, freq_start, freq_end, freq_step, history=10, minobs=3):
+        self.filename = filename
+        self.history = history
+        self.minobs = minobs
+
+        self.freq_start = float(freq_start)
+        self.freq_step = float(freq_step)
+        self.nbbins = int(np.ceil((freq_end - freq_start) / freq_step))
+
+        self.load()
+
+    def reset(self):
+        # Ring buffer of observations by bin
+        self.values = np.empty((self.history, self.nbbins), dtype=np.float32)
+        self.values.fill(np.nan)
+        self.nextidx = np.zeros(self.nbbins, dtype=np.int16)
+        self.nbobs = np.zeros(self.nbbins, dtype=np.int16)
+        self.sources = set()
+
+    def load(self):
+        self.reset()
+        if not os.path.isfile(self.filename):
+            return
+
+        content = np.load(self.filename)
+        sameparams = content['values'].shape == self.values.shape \
+            and float(content['freq_start']) == self.freq_start and float(content['freq_step']) == self.freq_step
+        if not sameparams:
+            # Scan level changed since the baseline creation
+            return
+
+        if 'signal' not in content.files or str(content['signal']) != SIGNAL:
+            # Built from another signal
+            return
+
+        self.values = content['values']
+        self.nextidx = content['nextidx']
+        self.nbobs = content['nbobs']
+        self.sources = set(content['sources'].tolist())
+
+    def save(self):
+        tmpfilename = '%s.tmp' % self.filename
+        with open(tmpfilename, 'wb') as f:
+            np.savez(
+                f, values=self.values, nextidx=self.nextidx, nbobs=self.nbobs,
+                freq_start=self.freq_start, freq_step=self.freq_step, sources=np.array(sorted(self.sources)),
+                signal=SIGNAL
+            )
+        commons.replaceFile(tmpfilename, self.filename)
+
+    def binSlice(self, freq_start, nbvalues):
+        # Window bins in the baseline, the window can exceed the baseline range
+        first = int(np.round((freq_start - self.freq_start) / self.freq_step))
+        left = max(first, 0)
+        right = min(first + nbvalues, self.nbbins)
+
+        return (first, left, max(left, right))
+
+    def update(self, freq_start, signal, source=None):
+        if source is not None and source in self.sources:
+            return False
+
+        signal = np.asarray(signal, dtype=np.float32)
+        (first, left, right) = self.binSlice(freq_start, len(signal))
+        if right > left:
+            bins = np.arange(left, right)
+            self.values[self.nextidx[bins], bins] = signal[left - first:right - first]
+            self.nextidx[bins] = (self.nextidx[bins] + 1) % self.history
+            self.nbobs[bins] = np.minimum(self.nbobs[bins] + 1, self.history)
+
+        if source is not None:
+            self.sources.add(source)
+
+        return True
+
+    def window(self, freq_start, nbvalues):
+        # Floor and spread for a window bins, NaN if not enough observations
+        floor = np.empty(nbvalues)
+        floor.fill(np.nan)
+        spread = floor.copy()
+
+        (first, left, right) = self.binSlice(freq_start, nbvalues)
+        if right > left:
+            values = self.values[:, left:right]
+            with warnings.catch_warnings():
+                # Bins without any observation stay NaN
+                warnings.simplefilter('ignore', RuntimeWarning)
+                (q25, q50, q75) = np.nanpercentile(values, [25, 50, 75], axis=0)
+
+            known = self.nbobs[left:right] >= self.minobs
+            floor[left - first:right - first] = np.where(known, q50, np.nan)
+            spread[left - first:right - first] = np.where(known, np.maximum((q75 - q25) / IQR2STD, MINSPREAD), np.nan)
+
+        return (floor, spread)
+
+    def thresholds(self, freq_start, nbvalues, minrelativedb=5, nbstd=3):
+        (floor, spread) = self.window(freq_start, nbvalues)
+        return (floor, floor + np.maximum(minrelativedb, nbstd * spread))
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Bursts detection on the time axis of the captures"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import sqlite3
+import datetime
+
+import numpy as np
+
+# MAD to std for a normal distribution
+MAD2STD = 1.4826
+
+# rtl_power date format
+TIMEFORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def setBurstsDefaults(bursts):
+    if 'mindb' not in bursts:
+        bursts['mindb'] = 6
+    if 'nbstd' not in bursts:
+        bursts['nbstd'] = 4
+    if 'minsize' not in bursts:
+        bursts['minsize'] = 2
+    if 'maxduration' in bursts:
+        raise Exception("The bursts maxduration is renamed maxlinefraction, a fraction of the capture lines")
+
+    # Longer events are continuous signals, found by searchstations
+    if 'maxlinefraction' not in bursts:
+        bursts['maxlinefraction'] = 0.5
+    if not 0 < bursts['maxlinefraction'] <= 1:
+        raise Exception("The bursts maxlinefraction %s is not in ]0, 1]" % bursts['maxlinefraction'])
+
+    return bursts
+
+
+def times2Seconds(times):
+    # Seconds since the first line
+    if not len(times):
+        return np.array([])
+
+    dates = [datetime.datetime.strptime(dtime, TIMEFORMAT) for dtime in times]
+    return np.array([(date - dates[0]).total_seconds() for date in dates])
+
+
+def noiseThresholds(samples, mindb=6, nbstd=4, maxlines=256):
+    # Robust floor of each frequency column, a burst is short compared to the capture
+    lines = samples[::max(1, samples.shape[0] // maxlines)]
+    floor = np.median(lines, axis=0)
+    spread = np.median(np.abs(lines - floor), axis=0) * MAD2STD
+
+    return (floor, floor + np.maximum(mindb, nbstd * spread))
+
+
+def detectBursts(samples, freq_start, freq_step, times, mindb=6, nbstd=4, minsize=2, maxlinefraction=0.5, floor=None):
+    import scipy.ndimage as ndimage
+
+    (nblines, nbcolumns) = samples.shape
+    if floor is None:
+        (floor, thresholds) = noiseThresholds(samples, mindb, nbstd)
+    else:
+        thresholds = floor + mindb
+
+    # Connected upper cells, diagonals included
+    (labels, nblabels) = ndimage.label(samples > thresholds, structure=np.ones((3, 3)))
+    if not nblabels:
+        return []
+
+    # Statistics only on the labeled cells
+    positions = np.flatnonzero(labels)
+    celllabels = labels.ravel()[positions]
+    cellvalues = samples.ravel()[positions]
+    sizes = np.bincount(celllabels, minlength=nblabels + 1)[1:]
+
+    # Peak, the last cell of each label sorted by value
+    order = np.lexsort((cellvalues, celllabels))
+    lasts = np.cumsum(sizes) - 1
+    peaks = cellvalues[order[lasts]]
+    peakcolumns = positions[order[lasts]] % nbcolumns
+    objects = ndimage.find_objects(labels)
+
+    seconds = times2Seconds(times)
+    linestep = seconds[-1] / (nblines - 1) if nblines > 1 else 0
+
+    events = []
+    for idx in range(nblabels):
+        (lines, columns) = objects[idx]
+        nbeventlines = lines.stop - lines.start
+        if sizes[idx] < minsize or nbeventlines > maxlinefraction * nblines:
+            continue
+
+        peakcolumn = peakcolumns[idx]
+        events.append({
+            'start': times[lines.start],
+            'duration': float(nbeventlines * linestep),
+            'freq_center': freq_start + (((columns.start + columns.stop - 1) / 2.0) * freq_step),
+            'bw': (columns.stop - columns.start) * freq_step,
+            'freq_peak': freq_start + (peakcolumn * freq_step),
+            'peakdb': float(peaks[idx]),
+            'relativedb': float(peaks[idx] - floor[peakcolumn]),
+            'nbcells': int(sizes[idx]),
+        })
+
+    return events
+
+
+class EventStore(object):
+    """Bursts events, indexed by frequency and start time"""
+
+    fields = ['capture', 'start', 'duration', 'freq_center', 'bw', 'freq_peak', 'peakdb', 'relativedb', 'nbcells']
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.db = sqlite3.connect(filename)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS events ('
+            'id INTEGER PRIMARY KEY, capture TEXT, start TEXT, duration REAL, freq_center REAL, bw REAL, '
+            'freq_peak REAL, peakdb REAL, relativedb REAL, nbcells INTEGER)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS events_freq ON events (freq_center)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS events_start ON events (start)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS events_capture ON events (capture)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS captures (capture TEXT PRIMARY KEY, nbevents INTEGER)')
+        self.db.commit()
+
+    def hasCapture(self, capture):
+        # Already analysed, even without events
+        cursor = self.db.execute('SELECT 1 FROM captures WHERE capture = ?', (capture,))
+        return cursor.fetchone() is not None
+
+    def add(self, capture, events):
+        # Replace the previous events of the capture
+        self.db.execute('DELETE FROM events WHERE capture = ?', (capture,))
+        self.db.execute('INSERT OR REPLACE INTO captures (capture, nbevents) VALUES (?, ?)', (capture, len(events)))
+        self.db.executemany(
+            'INSERT INTO events (%s) VALUES (%s)' % (', '.join(self.fields), ', '.join(['?'] * len(self.fields))),
+            [[capture] + [event[field] for field in self.fields[1:]] for event in events]
+        )
+        self.db.commit()
+
+    def query(self, freq_min=None, freq_max=None, start_min=None, start_max=None):
+        conditions = []
+        params = []
+        for (condition, value) in [
+            ('freq_center >= ?', freq_min), ('freq_center <= ?', freq_max),
+            ('start >= ?', start_min), ('start <= ?', start_max)
+        ]:
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+
+        sql = 'SELECT %s FROM events' % ', '.join(self.fields)
+        if conditions:
+            sql += ' WHERE %s' % ' AND '.join(conditions)
+        sql += ' ORDER BY start, freq_center'
+
+        return [dict(zip(self.fields, row)) for row in self.db.execute(sql, params)]
+
+    def close(self):
+        self.db.close()
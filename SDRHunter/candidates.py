@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Merge the stations candidates found in a search run"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import numpy as np
+
+import units
+
+
+def clusterIds(freqs, bws):
+    # Sorted candidates, a new cluster begins when the gap is bigger than the bandwidths
+    if not len(freqs):
+        return np.array([], dtype=np.int64)
+
+    gaps = np.diff(freqs)
+    breaks = gaps > np.maximum(bws[:-1], bws[1:])
+
+    return np.concatenate(([0], np.cumsum(breaks)))
+
+
+def clusterCandidates(candidates):
+    # Keep the strongest candidate of each cluster, with the hits count
+    if not candidates:
+        return []
+
+    freqs = np.array([candidate['freq_center'] for candidate in candidates], dtype=np.float64)
+    bws = np.array([candidate['bw'] for candidate in candidates], dtype=np.float64)
+    powers = np.array([candidate['powerdb'] for candidate in candidates], dtype=np.float64)
+
+    order = np.argsort(freqs, kind='mergesort')
+    ids = clusterIds(freqs[order], bws[order])
+    hits = np.bincount(ids)
+
+    # Strongest, the last of each cluster sorted by power
+    byid = np.lexsort((powers[order], ids))
+    strongests = order[byid[np.cumsum(hits) - 1]]
+
+    merged = []
+    for (idx, nbhits) in zip(strongests.tolist(), hits.tolist()):
+        candidate = dict(candidates[idx])
+        candidate['hits'] = nbhits
+        merged.append(candidate)
+
+    return merged
+
+
+def mergeStations(stations, candidates):
+    # Add the candidates not near a known station
+    known = stations['stations']
+    knownfreqs = np.sort(units.hz.parseArray([station['freq_center'] for station in known]))
+
+    added = []
+    for candidate in clusterCandidates(candidates):
+        freq_center = candidate['freq_center']
+        bw = candidate['bw']
+
+        # Known station in [freq_center - bw, freq_center + bw]
+        left = np.searchsorted(knownfreqs, freq_center - bw, side='left')
+        right = np.searchsorted(knownfreqs, freq_center + bw, side='right')
+        if right > left:
+            continue
+
+        added.append({
+            'freq_center': units.hz.format(freq_center),
+            'bw': units.hz.format(bw),
+            'powerdb': float("%.2f" % candidate['powerdb']),
+            'relativedb': float("%.2f" % candidate['relativedb']),
+            'hits': candidate['hits'],
+        })
+
+    stations['stations'] = sorted(
+        known + added, key=lambda x: units.hz.parse(x['freq_center']) - units.hz.parse(x['bw'])
+    )
+
+    return added
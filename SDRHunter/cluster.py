@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Sweep windows leased by a coordinator to the scanning nodes over TCP"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+import SocketServer
+
+import commons
+
+CHUNKSIZE = 64 * 1024
+
+# Written with the capture by the worker, sent after it
+SIDECAREXTS = ['.scaninfo']
+
+
+def setClusterDefaults(cluster):
+    if 'host' not in cluster:
+        cluster['host'] = '0.0.0.0'
+    if 'port' not in cluster:
+        cluster['port'] = 9160
+
+    # Seconds, a lease without heartbeat is given to another worker
+    if 'lease' not in cluster:
+        cluster['lease'] = 60
+    if 'heartbeat' not in cluster:
+        cluster['heartbeat'] = 10
+    if 'poll' not in cluster:
+        cluster['poll'] = 5
+
+    return cluster
+
+
+class SweepPlan(object):
+    """Windows to capture, leased to a worker until completed or expired"""
+
+    def __init__(self, windows, lease=60):
+        self.lock = threading.Lock()
+        self.lease = lease
+        self.pending = list(windows)
+        self.leases = {}
+        self.done = []
+
+    def acquire(self, worker, now=None):
+        # The next window, the expired leases first
+        now = time.time() if now is None else now
+        with self.lock:
+            self.expire(now)
+            if not self.pending:
+                return None
+
+            leaseid = uuid.uuid4().hex
+            window = self.pending.pop(0)
+            self.leases[leaseid] = {'window': window, 'worker': worker, 'expires': now + self.lease}
+
+            return {'lease': leaseid, 'window': window, 'ttl': self.lease}
+
+    def expire(self, now):
+        for (leaseid, lease) in self.leases.items():
+            if lease['expires'] < now:
+                del self.leases[leaseid]
+                self.pending.insert(0, lease['window'])
+
+    def heartbeat(self, leaseid, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            if leaseid not in self.leases:
+                return False
+            self.leases[leaseid]['expires'] = now + self.lease
+            return True
+
+    def complete(self, leaseid):
+        with self.lock:
+            lease = self.leases.pop(leaseid, None)
+            if lease is None:
+                return None
+            self.done.append(lease['window'])
+            return lease['window']
+
+    def release(self, leaseid):
+        # Failed capture, for another worker
+        with self.lock:
+            lease = self.leases.pop(leaseid, None)
+            if lease is not None:
+                self.pending.append(lease['window'])
+
+    def finished(self):
+        with self.lock:
+            return not self.pending and not self.leases
+
+    def status(self):
+        with self.lock:
+            return {'pending': len(self.pending), 'leased': len(self.leases), 'done': len(self.done)}
+
+
+def readMessage(rfile):
+    line = rfile.readline()
+    if not line:
+        raise Exception("Connection closed")
+
+    return json.loads(line)
+
+
+def writeMessage(wfile, message):
+    wfile.write('%s\n' % json.dumps(message))
+    wfile.flush()
+
+
+class CoordinatorHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        message = readMessage(self.rfile)
+        try:
+            response = self.server.coordinator.dispatch(message, self.rfile)
+        except Exception as e:
+            response = {'error': '%s' % e}
+        writeMessage(self.wfile, response)
+
+
+class CoordinatorServer(SocketServer.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class Coordinator(object):
+    """Lease the windows of the plan, and save the captures streamed by the workers"""
+
+    def __init__(self, plan, capturefilename, host='0.0.0.0', port=9160):
+        self.plan = plan
+        self.capturefilename = capturefilename
+        self.server = CoordinatorServer((host, port), CoordinatorHandler)
+        self.server.coordinator = self
+        self.port = self.server.server_address[1]
+        self.thread = None
+
+    def dispatch(self, message, rfile):
+        if message['type'] == 'lease':
+            lease = self.plan.acquire(message['worker'])
+            return {'lease': lease, 'finished': lease is None and self.plan.finished()}
+
+        if message['type'] == 'heartbeat':
+            return {'ok': self.plan.heartbeat(message['lease'])}
+
+        if message['type'] == 'fail':
+            print "Capture failed on %s: %s" % (message['worker'], message['error'])
+            self.plan.release(message['lease'])
+            return {'ok': True}
+
+        if message['type'] == 'complete':
+            return {'ok': self.receiveCapture(message, rfile)}
+
+        if message['type'] == 'status':
+            return self.plan.status()
+
+        raise Exception("Unknown message %s" % message['type'])
+
+    def receiveCapture(self, message, rfile):
+        # Read the whole stream even for an expired lease, then keep or drop it
+        window = None
+        with self.plan.lock:
+            lease = self.plan.leases.get(message['lease'])
+            if lease:
+                window = lease['window']
+
+        # The capture then its sidecars
+        filenames = []
+        for (ext, size) in zip(message['exts'], message['sizes']):
+            filename = self.capturefilename(window, ext) if window else os.devnull
+            tmpfilename = '%s.receiving' % filename if window else os.devnull
+            dirname = os.path.dirname(filename)
+            if window and dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+
+            remaining = size
+            with open(tmpfilename, 'wb') as f:
+                while remaining:
+                    chunk = rfile.read(min(CHUNKSIZE, remaining))
+                    if not chunk:
+                        raise Exception("Capture of %s truncated" % message['worker'])
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            filenames.append((tmpfilename, filename))
+
+        if window is None or self.plan.complete(message['lease']) is None:
+            if window:
+                for (tmpfilename, filename) in filenames:
+                    os.remove(tmpfilename)
+            return False
+
+        # The capture last, it marks the window as captured
+        for (tmpfilename, filename) in reversed(filenames):
+            os.rename(tmpfilename, filename)
+        return True
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def wait(self, poll=1):
+        while not self.plan.finished():
+            time.sleep(poll)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def request(address, message, filenames=None):
+    # One connection by message, the capture files are streamed after the message
+    connection = socket.create_connection(address)
+    try:
+        wfile = connection.makefile('wb')
+        rfile = connection.makefile('rb')
+        if filenames:
+            message = dict(message, sizes=[os.path.getsize(filename) for filename in filenames])
+        writeMessage(wfile, message)
+        for filename in filenames or []:
+            with open(filename, 'rb') as f:
+                while True:
+                    chunk = f.read(CHUNKSIZE)
+                    if not chunk:
+                        break
+                    wfile.write(chunk)
+        wfile.flush()
+
+        response = readMessage(rfile)
+    finally:
+        connection.close()
+
+    if 'error' in response:
+        raise Exception("Coordinator error: %s" % response['error'])
+
+    return response
+
+
+class Heartbeat(threading.Thread):
+    """Renew a lease while the window is captured"""
+
+    def __init__(self, address, leaseid, interval):
+        super(Heartbeat, self).__init__()
+        self.daemon = True
+        self.address = address
+        self.leaseid = leaseid
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                request(self.address, {'type': 'heartbeat', 'lease': self.leaseid})
+            except Exception as e:
+                print "Heartbeat failed: %s" % e
+
+    def stop(self):
+        self.stopped.set()
+
+
+class ClusterWorker(object):
+    """Capture the leased windows, capture(window) returns the capture filename"""
+
+    def __init__(self, address, name, capture, heartbeat=10, poll=5, keep=False, retries=3):
+        self.address = address
+        self.retries = retries
+        self.name = name
+        self.capture = capture
+        self.heartbeat = heartbeat
+        self.poll = poll
+        self.keep = keep
+
+    def runLease(self, lease):
+        heartbeat = Heartbeat(self.address, lease['lease'], self.heartbeat)
+        heartbeat.start()
+        try:
+            filename = self.capture(lease['window'])
+        except Exception as e:
+            request(self.address, {'type': 'fail', 'worker': self.name, 'lease': lease['lease'], 'error': '%s' % e})
+            return False
+        finally:
+            heartbeat.stop()
+            heartbeat.join()
+
+        # The extension keeps the compression of the capture
+        basename = commons.csvBasename(filename)
+        filenames = [filename] + ['%s%s' % (basename, ext) for ext in SIDECAREXTS if os.path.isfile('%s%s' % (basename, ext))]
+        exts = [name[len(basename):] for name in filenames]
+        response = request(
+            self.address, {'type': 'complete', 'worker': self.name, 'lease': lease['lease'], 'exts': exts}, filenames
+        )
+        if response['ok'] and not self.keep:
+            for name in filenames:
+                os.remove(name)
+
+        return response['ok']
+
+    def run(self):
+        nbcaptures = 0
+        nberrors = 0
+        while True:
+            try:
+                response = request(self.address, {'type': 'lease', 'worker': self.name})
+                nberrors = 0
+            except socket.error as e:
+                # No coordinator, or it has finished
+                nberrors += 1
+                if nberrors > self.retries:
+                    print "Coordinator %s:%s unreachable: %s" % (self.address[0], self.address[1], e)
+                    return nbcaptures
+                time.sleep(self.poll)
+                continue
+
+            if response['finished']:
+                return nbcaptures
+            if response['lease'] is None:
+                # The other workers have the last windows
+                time.sleep(self.poll)
+                continue
+            try:
+                if self.runLease(response['lease']):
+                    nbcaptures += 1
+            except socket.error as e:
+                # The lease expires, the window is captured again
+                print "Coordinator %s:%s unreachable: %s" % (self.address[0], self.address[1], e)
+                time.sleep(self.poll)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Colormap lookup tables for the heatmaps"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import numpy as np
+
+# Palettes control points (position, (red, green, blue))
+PALETTES = {
+    # Historical SDRHunter yellow ramp
+    'sdrhunter': [
+        (0.0, (0, 0, 50)),
+        (1.0, (255, 255, 50)),
+    ],
+    'grayscale': [
+        (0.0, (0, 0, 0)),
+        (1.0, (255, 255, 255)),
+    ],
+    'viridis': [
+        (0.000, (68, 1, 84)),
+        (0.125, (71, 44, 122)),
+        (0.250, (59, 81, 139)),
+        (0.375, (44, 113, 142)),
+        (0.500, (33, 145, 140)),
+        (0.625, (39, 173, 129)),
+        (0.750, (92, 200, 99)),
+        (0.875, (170, 220, 50)),
+        (1.000, (253, 231, 37)),
+    ],
+    # For the comparison maps, white is no deviation
+    'diverging': [
+        (0.0, (33, 102, 172)),
+        (0.5, (247, 247, 247)),
+        (1.0, (178, 24, 43)),
+    ],
+    'waterfall-classic': [
+        (0.00, (0, 0, 0)),
+        (0.25, (0, 0, 255)),
+        (0.50, (0, 255, 255)),
+        (0.75, (255, 255, 0)),
+        (1.00, (255, 0, 0)),
+    ],
+}
+
+LUTSIZES = [256, 1024]
+CLIPS = ['minmax', 'percentile', 'noisefloor']
+
+# Already computed lookup tables
+luts = {}
+
+
+def buildLUT(palette='sdrhunter', size=256):
+    if palette not in PALETTES:
+        raise Exception("Palette '%s' not in %s" % (palette, sorted(PALETTES.keys())))
+
+    if size not in LUTSIZES:
+        raise Exception("LUT size %s not in %s" % (size, LUTSIZES))
+
+    key = (palette, size)
+    if key not in luts:
+        positions = [point[0] for point in PALETTES[palette]]
+        colors = np.array([point[1] for point in PALETTES[palette]], dtype=np.float64)
+
+        # Interpolate each channel between the control points
+        x = np.linspace(0, 1, size)
+        red = np.round(np.interp(x, positions, colors[:, 0])).astype(np.uint32)
+        green = np.round(np.interp(x, positions, colors[:, 1])).astype(np.uint32)
+        blue = np.round(np.interp(x, positions, colors[:, 2])).astype(np.uint32)
+
+        # Same layout as QImage.Format_RGB32 (0xffRRGGBB)
+        lut = np.uint32(0xff000000) | (red << 16) | (green << 8) | blue
+        lut.flags.writeable = False
+        luts[key] = lut
+
+    return luts[key]
+
+
+def dbLimits(summaries, clip='minmax', percentiles=(5, 99.5)):
+    if clip == 'minmax':
+        dbmin = summaries['min']['min']
+        dbmax = summaries['max']['max']
+    elif clip == 'percentile':
+        dbmin = np.percentile(summaries['min']['signal'], percentiles[0])
+        dbmax = np.percentile(summaries['max']['signal'], percentiles[1])
+    elif clip == 'noisefloor':
+        dbmin = summaries['min']['peak']['min']['mean'] - summaries['min']['peak']['min']['std']
+        dbmax = summaries['max']['max']
+    else:
+        raise Exception("Clip method '%s' not in %s" % (clip, CLIPS))
+
+    return (float(dbmin), float(dbmax))
+
+
+def quantize(samples, dbmin, dbmax, size=256):
+    delta = dbmax - dbmin
+    if delta <= 0:
+        return np.zeros(samples.shape, dtype=np.uint16)
+
+    scale = size / delta
+    indexes = (samples - dbmin) * scale
+    np.clip(indexes, 0, size - 1, out=indexes)
+
+    return indexes.astype(np.uint16)
+
+
+def applyLUT(samples, dbmin, dbmax, palette='sdrhunter', size=256):
+    lut = buildLUT(palette, size)
+    return lut[quantize(samples, dbmin, dbmax, size)]
+
+
+def heatmapRGB(samples, summaries, palette='sdrhunter', clip='minmax', size=256):
+    (dbmin, dbmax) = dbLimits(summaries, clip)
+    return applyLUT(samples, dbmin, dbmax, palette, size)
+
+
+def saveHeatmapImage(filename, rgb):
+    from PIL import Image
+
+    # 0xffRRGGBB little endian words are stored as B, G, R, A bytes
+    (height, width) = rgb.shape
+    channels = rgb.astype('<u4').view(np.uint8).reshape((height, width, 4))
+    image = Image.fromarray(np.ascontiguousarray(channels[:, :, 2::-1]), 'RGB')
+    image.save(filename)
@@ -7,16 +7,32 @@ __description__ = """Tools for searching the radio of signal"""
 __license__ = 'GPL'
 __version__ = '0.0.1'
 
+import io
 import os
+import gzip
 import json
+import shutil
+import threading
+import subprocess
+from contextlib import contextmanager
 from collections import OrderedDict
 
 import numpy as np
-import scipy.signal as signal
+
+import colormap
+import units
 
 # Unit conversion
-HzUnities = {'M': 1e6, 'k': 1e3}
-secUnities = {'s': 1, 'm': 60, 'h': 3600}
+HzUnities = units.HzUnities
+secUnities = units.secUnities
+
+# Captures, plain or compressed by rtl_power scan
+CSVEXTS = ['.csv', '.csv.gz', '.csv.zst']
+COMPRESSIONS = {'gz': '.csv.gz', 'zst': '.csv.zst'}
+
+# Samples of a capture compacted by the retention
+COMPACTEXT = '.capture.npz'
+
 
 def getJSONConfigFilename():
     if os.name == "nt":
@@ -45,50 +61,351 @@ def saveJSON(filename,content):
         f.write(jsontext)
         f.close()
 
+    datacache.invalidate(filename)
 
-def unity2Float(stringvalue, unityobject):
-    # If allready number, we consider is the Hz
-    if isinstance(stringvalue, int) or isinstance(stringvalue, float):
-        return stringvalue
 
-    floatvalue = float(stringvalue[:-1])
-    unity = stringvalue[-1]
-    if (unity.lower() in unityobject or unity.upper() in unityobject):
-        floatvalue = floatvalue * unityobject[unity]
+def replaceFile(srcfilename, dstfilename):
+    # os.rename not overwrite an existing file on Windows
+    if os.name == "nt" and os.path.exists(dstfilename):
+        os.remove(dstfilename)
+    os.rename(srcfilename, dstfilename)
+
+
+def saveJSONAtomic(filename, content):
+    # Write a temporary file in the same directory, then replace the file
+    tmpfilename = '%s.tmp' % filename
+    with open(tmpfilename, 'w') as f:
+        jsontext = json.dumps(
+            content, sort_keys=True,
+            indent=4, separators=(',', ': ')
+        )
+        f.write(jsontext)
+        f.flush()
+        os.fsync(f.fileno())
+
+    replaceFile(tmpfilename, filename)
+    datacache.invalidate(filename)
 
-    return floatvalue
 
+class LRUCache(object):
+    """Process wide cache for the loaded files, keyed by path and mtime"""
 
-def hz2Float(stringvalue):
-    return unity2Float(stringvalue, HzUnities)
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize * 1024 * 1024
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.items = OrderedDict()
 
+        # HeapAnalyzer load files from worker threads
+        self.lock = threading.RLock()
 
-def sec2Float(stringvalue):
-    return unity2Float(stringvalue, secUnities)
+    def setMaxSize(self, maxsize):
+        with self.lock:
+            self.maxsize = maxsize * 1024 * 1024
+            self.evict()
 
-def float2Unity(value, unityobject, nbfloat=2, fillzero=False):
-    unitysorted = sorted(unityobject, key=lambda x: unityobject[x], reverse=True)
-
-    result = value
-    for unity in unitysorted:
-        if value >= unityobject[unity]:
-            txtnbfloat = "%s" % nbfloat
-            if fillzero:
-                result = ("%08." + txtnbfloat + "f%s") % (value / unityobject[unity], unity)
-            else:
-                result = ("%." + txtnbfloat + "f%s") % (value / unityobject[unity], unity)
-            break
+    def fileKey(self, filename):
+        stat = os.stat(filename)
+        return (stat.st_mtime, stat.st_size)
+
+    def contentSize(self, content, filesize):
+        if isinstance(content, dict) and 'samples' in content and isinstance(content['samples'], np.ndarray):
+            return content['samples'].nbytes
+
+        return filesize
+
+    def load(self, filename, loader, kind='json', sizeof=None):
+        if not os.path.isfile(filename):
+            return None
+
+        key = (kind, os.path.realpath(filename))
+        filekey = self.fileKey(filename)
+
+        # Cache hit, the file was not modified since loaded
+        with self.lock:
+            if key in self.items:
+                (cachedfilekey, size, content) = self.items.pop(key)
+                if cachedfilekey == filekey:
+                    self.items[key] = (cachedfilekey, size, content)
+                    self.hits += 1
+                    return content
+
+                self.size -= size
+
+            self.misses += 1
+
+        # Not locked, loading can be long
+        content = loader(filename)
+        if content is None:
+            return None
+
+        # The cached samples are shared between all users
+        if kind == 'csv':
+            content['samples'].flags.writeable = False
+
+        if sizeof:
+            size = sizeof(content)
+        else:
+            size = self.contentSize(content, filekey[1])
+        with self.lock:
+            if key in self.items:
+                (cachedfilekey, cachedsize, cachedcontent) = self.items.pop(key)
+                self.size -= cachedsize
 
+            if size <= self.maxsize:
+                self.items[key] = (filekey, size, content)
+                self.size += size
+                self.evict()
 
-    return str(result)
+        return content
+
+    def invalidate(self, filename):
+        realpath = os.path.realpath(filename)
+        with self.lock:
+            for key in [key for key in self.items if key[1] == realpath]:
+                (filekey, size, content) = self.items.pop(key)
+                self.size -= size
+
+    def evict(self):
+        # Remove the least recently used
+        while self.size > self.maxsize and self.items:
+            (key, (filekey, size, content)) = self.items.popitem(last=False)
+            self.size -= size
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.size = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'nbitems': len(self.items),
+            'size_mb': float(self.size) / (1024 * 1024),
+            'maxsize_mb': float(self.maxsize) / (1024 * 1024),
+        }
+
+
+datacache = LRUCache()
+
+
+def csvFilename(filename):
+    # The existing capture of a calcFilename, the compacted one or the plain one by default
+    for ext in CSVEXTS + [COMPACTEXT]:
+        if os.path.isfile('%s%s' % (filename, ext)):
+            return '%s%s' % (filename, ext)
+
+    return '%s.csv' % filename
+
+
+def csvBasename(csvfilename):
+    for ext in CSVEXTS + [COMPACTEXT]:
+        if csvfilename.endswith(ext):
+            return csvfilename[:-len(ext)]
+
+    return os.path.splitext(csvfilename)[0]
+
+
+@contextmanager
+def openCSVFile(filename):
+    # Streaming decompression, zstd with the command line tool
+    if filename.endswith('.zst'):
+        process = subprocess.Popen(['zstd', '-q', '-d', '-c', filename], stdout=subprocess.PIPE)
+        try:
+            yield process.stdout
+        finally:
+            process.stdout.close()
+            if process.wait() > 0:
+                raise Exception("zstd can't decompress %s" % filename)
+    elif filename.endswith('.gz'):
+        with io.BufferedReader(gzip.open(filename, 'rb')) as f:
+            yield f
+    else:
+        with open(filename, 'rb') as f:
+            yield f
+
+
+def loadCompactFile(filename):
+    # Same content as a loaded CSV, the samples were saved as float32
+    content = np.load(filename)
+    return {
+        'freq_start': float(content['freq_start']), 'freq_end': float(content['freq_end']),
+        'freq_step': float(content['freq_step']), 'times': content['times'].tolist(),
+        'samples': content['samples'].astype(np.float64), 'nbmalformed': 0,
+    }
+
+
+def isFloats(values):
+    # A bad last value is read as -1 by fromstring
+    try:
+        [float(value) for value in values.split(',')]
+    except ValueError:
+        return False
+
+    return True
+
+
+def parseCSVHops(f):
+    # One hop by rtl_power line, the powers of all lines parsed at once
+    times = []
+    hz_low = []
+    hz_high = []
+    hz_step = []
+    nbbins = []
+    lines = []
+    for line in f:
+        fields = line.split(',', 6)
+        if len(fields) < 7:
+            continue
+
+        values = fields[6].strip().rstrip(',')
+        times.append('%s %s' % (fields[0].strip(), fields[1].strip()))
+        hz_low.append(float(fields[2]))
+        hz_high.append(float(fields[3]))
+        hz_step.append(float(fields[4]))
+        nbbins.append(values.count(',') + 1)
+        lines.append(values)
+
+    # fromstring stops at the first bad value, the lines are parsed again one by one
+    powers = np.fromstring(','.join(lines), dtype=np.float64, sep=',')
+    valid = np.arange(len(lines))
+    if len(powers) != sum(nbbins) or (lines and not isFloats(lines[-1])):
+        # A malformed line, like the truncated last one of a killed rtl_power, is dropped
+        parsed = []
+        valid = []
+        for (idx, values) in enumerate(lines):
+            try:
+                parsed.append([float(value) for value in values.split(',')])
+            except ValueError:
+                continue
+            valid.append(idx)
+        powers = np.array([value for values in parsed for value in values], dtype=np.float64)
+        valid = np.array(valid, dtype=np.int64)
+
+    return {
+        'times': [times[idx] for idx in valid],
+        'hz_low': np.array(hz_low)[valid],
+        'hz_high': np.array(hz_high)[valid],
+        'hz_step': np.array(hz_step)[valid],
+        'nbbins': np.array(nbbins, dtype=np.int64)[valid],
+        'powers': powers,
+        'nbmalformed': len(lines) - len(valid),
+    }
+
+
+def reassembleHops(hops):
+    # A new sweep begins when the hop frequency goes back
+    hz_low = hops['hz_low']
+    hz_step = hops['hz_step']
+    nbbins = hops['nbbins']
+    newsweep = np.concatenate(([True], hz_low[1:] <= hz_low[:-1]))
+    sweepids = np.cumsum(newsweep) - 1
+    firsthops = np.nonzero(newsweep)[0]
+
+    # Global grid from the lowest hop with the most common step
+    (steps, counts) = np.unique(hz_step, return_counts=True)
+    freq_step = steps[np.argmax(counts)]
+    freq_start = hz_low.min()
+    freq_end = hops['hz_high'].max()
+    nbcolumns = int(np.round((freq_end - freq_start) / freq_step))
+    columns = np.round((hz_low - freq_start) / freq_step).astype(np.int64)
+    offsets = np.cumsum(nbbins) - nbbins
+
+    # Fast path, the hops of all sweeps tile the grid
+    nbsweeps = len(firsthops)
+    nbhops = len(hz_low) // nbsweeps
+    if (
+        nbhops * nbsweeps == len(hz_low) and np.all(nbbins == nbbins[0]) and nbhops * nbbins[0] == nbcolumns and
+        np.allclose(hz_step, freq_step, rtol=1e-9) and
+        np.all(columns == np.tile(np.arange(nbhops) * nbbins[0], nbsweeps))
+    ):
+        samples = hops['powers'].reshape((nbsweeps, nbcolumns))
+        times = [hops['times'][idx] for idx in firsthops]
+        return {'freq_start': freq_start, 'freq_end': freq_end, 'freq_step': freq_step, 'times': times, 'samples': samples}
+
+    samples = np.full((nbsweeps, nbcolumns), np.nan)
+    aligned = np.isclose(hz_step, freq_step, rtol=1e-6)
+    for (step, nbbin) in set(zip(hz_step, nbbins)):
+        hopids = np.nonzero((hz_step == step) & (nbbins == nbbin))[0]
+        if aligned[hopids[0]]:
+            # Same step, the bins are cropped to the grid
+            cols = columns[hopids][:, None] + np.arange(nbbin)
+            values = hops['powers'][offsets[hopids][:, None] + np.arange(nbbin)]
+        else:
+            # Other step, the bins are interpolated at the grid frequencies
+            first = np.ceil((hz_low[hopids] - freq_start) / freq_step - 1e-6).astype(np.int64)
+            cols = first[:, None] + np.arange(int(np.ceil(nbbin * step / freq_step)) + 1)
+            position = (freq_start + cols * freq_step - hz_low[hopids][:, None]) / step
+            index = np.clip(np.floor(position).astype(np.int64), 0, max(nbbin - 2, 0))
+            fraction = np.clip(position - index, 0, 1) if nbbin > 1 else np.zeros(position.shape)
+            base = offsets[hopids][:, None]
+            values = hops['powers'][base + index] * (1 - fraction)
+            values += hops['powers'][base + np.minimum(index + 1, nbbin - 1)] * fraction
+            cols = np.where(position < nbbin, cols, -1)
+
+        rows = np.repeat(sweepids[hopids][:, None], cols.shape[1], axis=1)
+        valid = (cols >= 0) & (cols < nbcolumns)
+        samples[rows[valid], cols[valid]] = values[valid]
+
+    # Drop the sweeps with missing hops, like the last one of a stopped scan
+    hopcounts = np.bincount(sweepids)
+    keep = hopcounts == hopcounts.max()
+    samples = samples[keep]
+    times = [hops['times'][idx] for idx in firsthops[keep]]
+
+    # Fill the columns between the hops from their neighbours
+    for row in samples:
+        missing = np.isnan(row)
+        if missing.any():
+            row[missing] = np.interp(np.nonzero(missing)[0], np.nonzero(~missing)[0], row[~missing])
+
+    return {'freq_start': freq_start, 'freq_end': freq_end, 'freq_step': freq_step, 'times': times, 'samples': samples}
+
+
+def writeCSVStream(stream, filename, compression=None):
+    # Write the rtl_power output, compressed while written
+    if compression not in [None] + COMPRESSIONS.keys():
+        raise Exception("Compression '%s' not in %s" % (compression, sorted(COMPRESSIONS.keys())))
+
+    if compression == 'zst':
+        with open(filename, 'wb') as f:
+            process = subprocess.Popen(['zstd', '-q', '-c'], stdin=stream, stdout=f)
+            if process.wait():
+                raise Exception("zstd can't compress %s" % filename)
+    elif compression == 'gz':
+        with gzip.open(filename, 'wb') as f:
+            shutil.copyfileobj(stream, f)
+    else:
+        with open(filename, 'wb') as f:
+            shutil.copyfileobj(stream, f)
+
+
+def loadCachedJSON(filename):
+    # The returned content is shared, don't modify it
+    return datacache.load(filename, loadJSON, 'json')
+
+
+def unity2Float(stringvalue, unityobject):
+    return units.unitsFor(unityobject).parse(stringvalue)
+
+
+# Bound parsers, no wrapper call in the loops
+hz2Float = units.hz.parse
+sec2Float = units.sec.parse
+
+
+def float2Unity(value, unityobject, nbfloat=2, fillzero=False):
+    return units.unitsFor(unityobject).format(value, nbfloat, fillzero)
 
 
 def float2Sec(value):
-    return float2Unity(value, secUnities)
+    return units.sec.format(value)
 
 
 def float2Hz(value, nbfloat=2, fillzero=False):
-    return float2Unity(value, HzUnities, nbfloat, fillzero)
+    return units.hz.format(value, nbfloat, fillzero)
 
 def smooth(x,window_len=11,window='hanning'):
     # http://wiki.scipy.org/Cookbook/SignalSmooth
@@ -116,7 +433,26 @@ def smooth(x,window_len=11,window='hanning'):
     y=np.convolve(w/w.sum(),s,mode='valid')
     return y
 
+def setHeatmapDefaults(heatmap):
+    if 'palette' not in heatmap:
+        heatmap['palette'] = 'sdrhunter'
+    if 'clip' not in heatmap:
+        heatmap['clip'] = 'minmax'
+    if 'lutsize' not in heatmap:
+        heatmap['lutsize'] = 256
+
+    return heatmap
+
 def loadConfigFile(filename, args):
+    # The modules only needed for their defaults, imported here to keep commons light
+    import baseline
+    import bursts
+    import cluster
+    import jobs
+    import metrics
+    import retention
+    import transfer
+
     config = loadJSON(filename)
 
     if config is None:
@@ -139,6 +475,53 @@ def loadConfigFile(filename, args):
         config['global']['gains'] = [0, 25, 50]
     if 'verbose' not in config['global']:
         config['global']['verbose'] = True
+    if 'device' not in config['global']:
+        config['global']['device'] = 0
+    if 'retries' not in config['global']:
+        config['global']['retries'] = 2
+    if 'cachesize' not in config['global']:
+        config['global']['cachesize'] = 256
+    datacache.setMaxSize(config['global']['cachesize'])
+
+    # Check baseline section
+    if 'baseline' not in config['global']:
+        config['global']['baseline'] = {}
+    baseline.setBaselineDefaults(config['global']['baseline'])
+
+    # Check bursts section
+    if 'bursts' not in config['global']:
+        config['global']['bursts'] = {}
+    bursts.setBurstsDefaults(config['global']['bursts'])
+
+    # Check cluster section
+    if 'cluster' not in config['global']:
+        config['global']['cluster'] = {}
+    cluster.setClusterDefaults(config['global']['cluster'])
+
+    # Check jobs section
+    if 'jobs' not in config['global']:
+        config['global']['jobs'] = {}
+    jobs.setJobsDefaults(config['global']['jobs'])
+
+    # Check metrics section
+    if 'metrics' not in config['global']:
+        config['global']['metrics'] = {}
+    metrics.setMetricsDefaults(config['global']['metrics'])
+
+    # Check retention section
+    if 'retention' not in config['global']:
+        config['global']['retention'] = {}
+    retention.setRetentionDefaults(config['global']['retention'])
+
+    # Check transfer section
+    if 'transfer' not in config['global']:
+        config['global']['transfer'] = {}
+    transfer.setTransferDefaults(config['global']['transfer'])
+
+    # Check heatmap section
+    if 'heatmap' not in config['global']:
+        config['global']['heatmap'] = {}
+    setHeatmapDefaults(config['global']['heatmap'])
 
     # Check in global scan section
     if 'scans' not in config['global']:
@@ -147,6 +530,8 @@ def loadConfigFile(filename, args):
         config['global']['scans']['splitwindows'] = False
     if 'scanfromstations' not in config['global']['scans']:
         config['global']['scans']['scanfromstations'] = False
+    if 'compression' not in config['global']['scans']:
+        config['global']['scans']['compression'] = None
 
     # Replace Global variables
 
@@ -211,10 +596,64 @@ def loadConfigFile(filename, args):
 class SDRDatas(object):
     def __init__(self, csvfilename):
         self.csvfilename = csvfilename
-        self.csv = self.loadCSVFile(csvfilename)
-        self.scaninfo = self.loadScanInfo()
-        self.summaries = self.getSummaries()
-        self.hparam = self.getHeatParams()
+
+        # Loaded on demand, see the properties below
+        self._csv = None
+        self._scaninfo = None
+        self._summaries = None
+        self._hparam = None
+
+    @property
+    def csv(self):
+        if self._csv is None:
+            self._csv = datacache.load(self.csvfilename, self.loadCSVFile, 'csv')
+
+        return self._csv
+
+    @property
+    def samples(self):
+        return self.csv['samples']
+
+    @property
+    def times(self):
+        return self.csv['times']
+
+    @property
+    def freq_start(self):
+        return self.csv['freq_start']
+
+    @property
+    def freq_end(self):
+        return self.csv['freq_end']
+
+    @property
+    def freq_step(self):
+        return self.csv['freq_step']
+
+    @property
+    def nbmalformed(self):
+        return self.csv['nbmalformed']
+
+    @property
+    def scaninfo(self):
+        if self._scaninfo is None:
+            self._scaninfo = self.loadScanInfo()
+
+        return self._scaninfo
+
+    @property
+    def summaries(self):
+        if self._summaries is None:
+            self._summaries = self.getSummaries()
+
+        return self._summaries
+
+    @property
+    def hparam(self):
+        if self._hparam is None:
+            self._hparam = self.getHeatParams()
+
+        return self._hparam
 
     def loadScanInfo(self):
         scaninfo = loadJSON(self.getFilenameFor('scaninfo'))
@@ -229,11 +668,12 @@ class SDRDatas(object):
         if 'maxnb_lines' not in scaninfo['global']['heatmap']:
             scaninfo['global']['heatmap']['maxnb_lines'] = 10
 
+        setHeatmapDefaults(scaninfo['global']['heatmap'])
+
         return scaninfo
 
     def getFilenameFor(self,newext):
-        (filename, ext) = os.path.splitext(self.csvfilename)
-        return '%s.%s' % (filename, newext)
+        return '%s.%s' % (csvBasename(self.csvfilename), newext)
 
     def loadCSVFile(self, filename):
 
@@ -241,55 +681,21 @@ class SDRDatas(object):
         if not exists:
             return None
 
-        # Load a file
-        f = open(filename, "rb")
-
-        scaninfo = OrderedDict()
-        timelist = OrderedDict()
-        for line in f:
-            line = [s.strip() for s in line.strip().split(',')]
-            line = [s for s in line if s]
+        if filename.endswith(COMPACTEXT):
+            return loadCompactFile(filename)
 
-            # Get freq for CSV line
-            linefreq_start = float(line[2])
-            linefreq_end = float(line[3])
-            freq_step = float(line[4])
-            freqkey = (linefreq_start, linefreq_end, freq_step)
-            nbsamples4line = int(np.round((linefreq_end - linefreq_start) / freq_step))
+        # Load a file, plain or compressed
+        with openCSVFile(filename) as f:
+            hops = parseCSVHops(f)
 
-            # Calc time key
-            dtime = '%s %s' % (line[0], line[1])
-            if dtime not in timelist:
-                timelist[dtime] = np.array([])
+        if not len(hops['hz_low']):
+            raise Exception("No samples in %s" % filename)
 
-            # Add a uniq freq key
-            if freqkey not in scaninfo:
-                scaninfo[freqkey] = None
+        # The ignored lines, shown by the caller
+        csv = reassembleHops(hops)
+        csv['nbmalformed'] = hops['nbmalformed']
 
-            # Get power dB
-            linepower = [float(value) for value in line[6:nbsamples4line + 6]]
-            timelist[dtime] = np.append(timelist[dtime], linepower)
-
-        nbsubrange = len(scaninfo)
-        self.freq_start = float(scaninfo.items()[0][0][0])
-        self.freq_end = float(scaninfo.items()[nbsubrange - 1][0][1])
-        nblines = len(timelist)
-        nbstep = int(np.round((self.freq_end - self.freq_start) / freq_step))
-
-        allrangestep = nbsamples4line * nbsubrange
-        if allrangestep != nbstep:
-            raise Exception('No same numbers samples')
-
-        globalfreq_step = (self.freq_end - self.freq_start) / allrangestep
-
-        self.times = timelist.keys()
-        self.samples = np.array([])
-        for freqkey, content in timelist.items():
-            self.samples = np.append(self.samples, content)
-
-        self.samples = self.samples.reshape((nblines,nbstep))
-
-        return {'freq_start': self.freq_start, 'freq_end': self.freq_end, 'freq_step': globalfreq_step, 'times': self.times, 'samples': self.samples}
+        return csv
 
 
     def getSummaries(self):
@@ -298,13 +704,17 @@ class SDRDatas(object):
         if exists:
             summaries = self.loadSummariesFromFile(summaryfilename)
         else:
-            summaries = self.genSummarizeSignal()
+            # Keep the generated summaries while the capture is unchanged
+            summaries = datacache.load(
+                self.csvfilename, lambda filename: self.genSummarizeSignal(), 'summary',
+                lambda summaries: summaries['samples']['nbsamplescolumn'] * 4 * 32
+            )
 
         return summaries
 
 
     def loadSummariesFromFile(self,summaryfilename):
-        summaries = loadJSON(summaryfilename)
+        summaries = loadCachedJSON(summaryfilename)
         # if 'location' not in summaries or ('location' in summaries and 'name' not in summaries['location']):
         #     summaries['location'] = {'name': 'UNKNOW LOCATION'}
 
@@ -396,7 +806,9 @@ class SDRDatas(object):
         summaries[summaryname]['mean'] = np.mean(spectre)
         summaries[summaryname]['std'] = np.std(spectre)
 
-        # Compute Ground Noise of signal
+        # Compute Ground Noise of signal, scipy is slow to import
+        import scipy.signal as signal
+
         lensignal = len(spectre)
         smooth_signal = smooth(spectre,10, 'flat')
         peakmin = signal.argrelextrema(smooth_signal[:lensignal], np.less)
@@ -423,7 +835,11 @@ class SDRDatas(object):
 
         return summaries
 
-    def power2RGB(self, power):
-        g = (power - self.summaries['min']['min']) / (self.summaries['max']['max'] - self.summaries['min']['min'])
+    def power2RGB(self, power, clip='minmax'):
+        (dbmin, dbmax) = colormap.dbLimits(self.summaries, clip)
+        g = np.clip((power - dbmin) / (dbmax - dbmin), 0, 1)
         return g
 
+    def heatmapRGB(self, palette='sdrhunter', clip='minmax', lutsize=256):
+        return colormap.heatmapRGB(self.samples, self.summaries, palette, clip, lutsize)
+
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Compare captures of a same window (difference, ratio, z-score)"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import warnings
+
+import numpy as np
+
+import colormap
+
+MODES = ['difference', 'ratio', 'zscore']
+
+# Lower std used for the z-score, in dB
+MINSTD = 0.1
+
+
+def gridFreqs(freq_start, freq_end, freq_step):
+    nbstep = int(np.round((freq_end - freq_start) / freq_step))
+    return freq_start + (np.arange(nbstep) * freq_step)
+
+
+def resample(values, freq_start, freq_step, freqs):
+    # Linear interpolation on the last axis, NaN outside the captured range
+    values = np.asarray(values, dtype=np.float64)
+    nbcolumns = values.shape[-1]
+    positions = (np.asarray(freqs, dtype=np.float64) - freq_start) / freq_step
+
+    outside = (positions < 0) | (positions > nbcolumns - 1)
+    positions = np.clip(positions, 0, nbcolumns - 1)
+    left = np.minimum(positions.astype(np.int64), max(nbcolumns - 2, 0))
+    right = np.minimum(left + 1, nbcolumns - 1)
+    frac = positions - left
+
+    result = (values[..., left] * (1 - frac)) + (values[..., right] * frac)
+    result[..., outside] = np.nan
+
+    return result
+
+
+def alignSamples(sdrdatas, freqs, nblines=None):
+    samples = sdrdatas.samples
+    if nblines is not None:
+        samples = samples[:nblines]
+
+    if sdrdatas.freq_start == freqs[0] and sdrdatas.freq_step == freqs[1] - freqs[0] \
+            and samples.shape[1] == len(freqs):
+        return samples
+
+    return resample(samples, sdrdatas.freq_start, sdrdatas.freq_step, freqs)
+
+
+def summariesBaseline(summarieslist, freqs):
+    # Per bin mean and std of the avg signals, from the historical summaries
+    signals = []
+    deltas = []
+    for summaries in summarieslist:
+        freq = summaries['freq']
+        signals.append(resample(summaries['avg']['signal'], freq['start'], freq['step'], freqs))
+        deltas.append(resample(summaries['delta']['signal'], freq['start'], freq['step'], freqs))
+
+    signals = np.array(signals)
+    with warnings.catch_warnings():
+        # Bins without any data stay NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mean = np.nanmean(signals, axis=0)
+        if len(signals) > 1:
+            std = np.nanstd(signals, axis=0)
+        else:
+            # Only one capture, range rule of thumb on the min/max spread
+            std = np.nanmean(np.array(deltas), axis=0) / 4
+
+    return (mean, np.maximum(np.nan_to_num(std), MINSTD))
+
+
+class Comparison(object):
+    """Compare a reference capture with one or more other captures"""
+
+    def __init__(self, reference, others):
+        self.reference = reference
+        self.others = others
+
+        # The reference capture grid, the map fits the reference heatmap
+        self.freqs = gridFreqs(reference.freq_start, reference.freq_end, reference.freq_step)
+        self.nblines = min([reference.samples.shape[0]] + [other.samples.shape[0] for other in others])
+
+        self._aligned = None
+        self._baseline = None
+
+    @property
+    def aligned(self):
+        # Mean of the others captures, aligned on the reference grid
+        if self._aligned is None:
+            aligned = [alignSamples(other, self.freqs, self.nblines) for other in self.others]
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                self._aligned = np.nanmean(np.array(aligned), axis=0)
+
+        return self._aligned
+
+    @property
+    def baseline(self):
+        if self._baseline is None:
+            self._baseline = summariesBaseline([other.summaries for other in self.others], self.freqs)
+
+        return self._baseline
+
+    def compute(self, mode='difference'):
+        samples = self.reference.samples[:self.nblines]
+        if mode == 'difference':
+            return samples - self.aligned
+        elif mode == 'ratio':
+            # Power ratio, the samples are in dB
+            return np.power(10, (samples - self.aligned) / 10)
+        elif mode == 'zscore':
+            (mean, std) = self.baseline
+            return (samples - mean) / std
+
+        raise Exception("Compare mode '%s' not in %s" % (mode, MODES))
+
+
+def mapLimits(values, mode='difference', percentile=99):
+    # Symmetric limits, the same color for the same deviation on both sides
+    finite = values[np.isfinite(values)]
+    if not finite.size:
+        return (0.1, 10.0) if mode == 'ratio' else (-1.0, 1.0)
+
+    if mode == 'ratio':
+        limit = max(np.percentile(np.abs(np.log10(finite[finite > 0])), percentile), 1e-3)
+        return (10 ** -limit, 10 ** limit)
+
+    limit = max(np.percentile(np.abs(finite), percentile), 1e-3)
+    return (-limit, limit)
+
+
+def compareRGB(values, mode='difference', palette='diverging', size=256):
+    (vmin, vmax) = mapLimits(values, mode)
+    if mode == 'ratio':
+        # Logarithmic scale, 1 is in the middle of the palette
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.log10(values)
+        (vmin, vmax) = (np.log10(vmin), np.log10(vmax))
+
+    nodata = ~np.isfinite(values)
+    rgb = colormap.applyLUT(np.where(nodata, vmin, values), vmin, vmax, palette, size)
+
+    # Transparent where no data to compare
+    rgb[nodata] = 0
+
+    return rgb
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Stations exports (Text, Uniden)"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import sys
+
+import numpy as np
+
+import units
+
+EXPORTS = ['txt', 'uniden']
+
+# Uniden channels used for the stations without a fixed channel
+UNIDEN_MAXCHANNEL = 499
+
+
+def bandEdges(bands):
+    # Sorted and merged bands, the ends are increasing too
+    starts = []
+    ends = []
+    for (bstart, bend) in sorted(bands):
+        if ends and bstart <= ends[-1]:
+            ends[-1] = max(ends[-1], bend)
+        else:
+            starts.append(bstart)
+            ends.append(bend)
+
+    return (np.array(starts, dtype=np.float64), np.array(ends, dtype=np.float64))
+
+
+def inBands(freqs, bands):
+    # Bands limits are included
+    freqs = np.asarray(freqs, dtype=np.float64)
+    (starts, ends) = bandEdges(bands)
+    if not len(starts):
+        return np.zeros(freqs.shape, dtype=bool)
+
+    idx = np.searchsorted(starts, freqs, side='right') - 1
+    return (idx >= 0) & (freqs <= ends[np.maximum(idx, 0)])
+
+
+def unidenChannels(jsonfreqs, bands, maxchannel=UNIDEN_MAXCHANNEL):
+    stations = jsonfreqs['stations']
+    if not stations:
+        return []
+
+    # Bands are in MHz
+    freqs = units.hz.parseArray([station['freq_center'] for station in stations]) / 1e6
+    inband = inBands(freqs, bands)
+
+    # Stations with a fixed uniden channel
+    channels = {}
+    fixed = np.array(['uniden' in station.get('othervalues', {}) for station in stations], dtype=bool)
+    for idx in np.flatnonzero(inband & fixed).tolist():
+        channels[stations[idx]['othervalues']['uniden']['channel']] = idx
+
+    # The others get the first free channels, by frequency order
+    others = np.flatnonzero(inband & ~fixed)
+    others = others[np.argsort(freqs[others], kind='mergesort')]
+    free = np.setdiff1d(np.arange(1, maxchannel + 1), np.array(channels.keys(), dtype=np.int64))
+    nbassigned = min(len(others), len(free))
+    for (channel, idx) in zip(free[:nbassigned].tolist(), others[:nbassigned].tolist()):
+        channels[channel] = idx
+
+    return [(channel, stations[channels[channel]], freqs[channels[channel]]) for channel in sorted(channels)]
+
+
+def writeTXT(f, jsonfreqs):
+    for station in jsonfreqs['stations']:
+        f.write("%s %s\n" % (station['freq_center'], station.get('name', '')))
+
+
+def writeUniden(f, jsonfreqs, bands, maxchannel=UNIDEN_MAXCHANNEL):
+    f.write('[\n')
+    for (channel, station, freq) in unidenChannels(jsonfreqs, bands, maxchannel):
+        mode = station.get('mode', 'UNDEFINED')
+        if mode == "UNDEFINED":
+            mode = "AUTO"
+
+        f.write(
+            "{\n"
+            "cmd => 'CIN',\n"
+            "index => '%s',\n"
+            "name => '%s',\n"
+            "frq => '%s',\n"
+            "mod => '%s',\n"
+            "ctcss_dcs => '0',\n"
+            "dly => '0',\n"
+            "lout => '0',\n"
+            "pri => '0',\n"
+            "},\n" % (channel, station.get('name', '').replace("'", "")[:15], freq, mode)
+        )
+    f.write(']\n')
+
+
+def exportStations(filename, jsonfreqs, exportformat, config=None):
+    if exportformat not in EXPORTS:
+        raise Exception("Export format '%s' not in %s" % (exportformat, EXPORTS))
+
+    # Checked before the file is truncated
+    bands = None
+    if exportformat == 'uniden':
+        bands = ((config or {}).get('global', {}).get('export', {}).get('uniden', {})).get('bands')
+        if not bands:
+            raise Exception("No export uniden bands in the global section of the config")
+
+    # Streamed to the file, '-' for the standard output
+    f = sys.stdout if filename == '-' else open(filename, 'w')
+    try:
+        if exportformat == 'txt':
+            writeTXT(f, jsonfreqs)
+        else:
+            writeUniden(f, jsonfreqs, bands)
+    finally:
+        if f is not sys.stdout:
+            f.close()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Power readout under the heatmap cursor"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import math
+
+import numpy as np
+
+import commons
+
+
+def decimate(values, width):
+    # Keep the max of each bucket, peaks must stay visible
+    if width <= 0 or len(values) <= width:
+        return values
+
+    edges = np.linspace(0, len(values), width, endpoint=False).astype(np.int64)
+    return np.maximum.reduceat(values, edges)
+
+
+class CursorInspector(object):
+    """Lookup the samples matrix from a heatmap position"""
+
+    def __init__(self, samples, freqstart, freqstep, times=None):
+        self.samples = samples
+        (self.nblines, self.nbcolumns) = samples.shape
+        self.freqstart = freqstart
+        self.freqstep = freqstep
+        self.times = times if times is not None else []
+
+        self.snapstep = 0
+        self.snappixels = 1.0
+
+    def setSnapStep(self, snapstep):
+        # Computed once, when the snap step changes
+        self.snapstep = commons.hz2Float(snapstep)
+        self.snappixels = max(self.snapstep / self.freqstep, 1e-9)
+
+    def snapPos(self, posx):
+        return int(math.floor(posx / self.snappixels)) * self.snappixels
+
+    def cell(self, posx, posy):
+        # Floor, the positions in ]-1, 0[ are outside the heatmap
+        column = int(math.floor(posx))
+        line = int(math.floor(posy))
+        if 0 <= line < self.nblines and 0 <= column < self.nbcolumns:
+            return (line, column)
+
+        return None
+
+    def power(self, line, column):
+        return self.samples[line, column]
+
+    def spectrumSlice(self, line):
+        return self.samples[line]
+
+    def timeSlice(self, column):
+        return self.samples[:, column]
+
+    def readout(self, posx, posy):
+        cell = self.cell(posx, posy)
+        if cell is None:
+            return None
+
+        (line, column) = cell
+        result = {
+            'line': line,
+            'column': column,
+            'freq': self.freqstart + (column * self.freqstep),
+            'power': float(self.samples[line, column]),
+        }
+        if line < len(self.times):
+            result['time'] = self.times[line]
+
+        return result
@@ -0,0 +1,397 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Jobs queue of the SDRHunter worker, and its thin client"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+# Only the standard library, the client must start fast
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import traceback
+
+ACTIONS = [
+    'infos', 'scan', 'zoomedscan', 'gensummaries', 'searchstations', 'searchbursts', 'genheatmapparameters',
+    'genheatmaps', 'genspectres', 'exporttxt', 'exportuniden', 'retention'
+]
+
+# The actions using the dongle share its concurrency limit
+DONGLEACTIONS = ['scan', 'zoomedscan']
+
+# The actions rewriting the files of a location, scanresult.json, its journal or the summaries
+WRITERACTIONS = [
+    'gensummaries', 'searchstations', 'searchbursts', 'genheatmapparameters', 'genheatmaps', 'genspectres',
+    'exporttxt', 'exportuniden', 'retention'
+]
+
+STATUS = ['queued', 'running', 'done', 'failed']
+
+
+def setJobsDefaults(jobs):
+    # Empty database is jobs.sqlite in the rootdir
+    if 'database' not in jobs:
+        jobs['database'] = ''
+    if 'poll' not in jobs:
+        jobs['poll'] = 0.05
+    if 'concurrency' not in jobs:
+        jobs['concurrency'] = {}
+    if 'total' not in jobs['concurrency']:
+        jobs['concurrency']['total'] = 2
+    if 'dongle' not in jobs['concurrency']:
+        jobs['concurrency']['dongle'] = 1
+
+    # Writer jobs by location
+    if 'location' not in jobs['concurrency']:
+        jobs['concurrency']['location'] = 1
+
+    return jobs
+
+
+def databaseFilename(config):
+    # From the loaded config or the raw JSON file
+    jobs = config['global'].get('jobs', {})
+    if jobs.get('database'):
+        return jobs['database']
+
+    rootdir = config['global'].get('rootdir') or os.path.join(os.path.expanduser("~"), 'SDRHunter')
+    return os.path.join(rootdir, 'jobs.sqlite')
+
+
+def limitKey(action):
+    return 'dongle' if action in DONGLEACTIONS else action
+
+
+class JobQueue(object):
+    """Jobs by priority then by submission, shared by the client and the worker processes"""
+
+    fields = ['id', 'action', 'location', 'configname', 'output', 'priority', 'status', 'error',
+              'submitted', 'started', 'finished']
+
+    def __init__(self, filename):
+        dirname = os.path.dirname(filename)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(filename, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id INTEGER PRIMARY KEY, action TEXT, location TEXT, configname TEXT, output TEXT, '
+            'priority INTEGER, status TEXT, error TEXT, submitted REAL, started REAL, finished REAL)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (status, priority, id)')
+
+    def submit(self, action, location, configname=None, priority=0, output=None):
+        if action not in ACTIONS:
+            raise Exception("Action '%s' not in %s" % (action, ACTIONS))
+
+        with self.lock:
+            cursor = self.db.execute(
+                'INSERT INTO jobs (action, location, configname, output, priority, status, submitted) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (action, location, configname, output, priority, 'queued', time.time())
+            )
+            return cursor.lastrowid
+
+    def claim(self, actions, busylocations=()):
+        # The next queued job of these actions, running from now, no writer for the busy locations
+        if not actions:
+            return None
+
+        sql = 'SELECT %s FROM jobs WHERE status = ? AND action IN (%s)' % (
+            ', '.join(self.fields), ', '.join(['?'] * len(actions))
+        )
+        params = ['queued'] + list(actions)
+        if busylocations:
+            sql += ' AND NOT (action IN (%s) AND location IN (%s))' % (
+                ', '.join(['?'] * len(WRITERACTIONS)), ', '.join(['?'] * len(busylocations))
+            )
+            params += WRITERACTIONS + list(busylocations)
+        sql += ' ORDER BY priority DESC, id LIMIT 1'
+
+        with self.lock:
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.db.execute(sql, params).fetchone()
+                if row is not None:
+                    self.db.execute(
+                        'UPDATE jobs SET status = ?, started = ? WHERE id = ?', ('running', time.time(), row[0])
+                    )
+                self.db.execute('COMMIT')
+            except Exception:
+                self.db.execute('ROLLBACK')
+                raise
+
+        if row is None:
+            return None
+
+        job = dict(zip(self.fields, row))
+        job['status'] = 'running'
+        return job
+
+    def finish(self, jobid, error=None):
+        with self.lock:
+            self.db.execute(
+                'UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?',
+                ('failed' if error else 'done', error, time.time(), jobid)
+            )
+
+    def requeueRunning(self):
+        # The jobs of a stopped worker
+        with self.lock:
+            return self.db.execute(
+                'UPDATE jobs SET status = ?, started = NULL WHERE status = ?', ('queued', 'running')
+            ).rowcount
+
+    def get(self, jobid):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT %s FROM jobs WHERE id = ?' % ', '.join(self.fields), (jobid,)
+            ).fetchone()
+
+        return dict(zip(self.fields, row)) if row else None
+
+    def list(self, status=None):
+        sql = 'SELECT %s FROM jobs' % ', '.join(self.fields)
+        params = []
+        if status:
+            sql += ' WHERE status = ?'
+            params.append(status)
+        sql += ' ORDER BY id'
+
+        with self.lock:
+            return [dict(zip(self.fields, row)) for row in self.db.execute(sql, params)]
+
+    def wait(self, jobid, timeout=None, poll=0.05):
+        begin = time.time()
+        while True:
+            job = self.get(jobid)
+            if job is None or job['status'] in ['done', 'failed']:
+                return job
+            if timeout is not None and time.time() - begin > timeout:
+                return job
+            time.sleep(poll)
+
+    def close(self):
+        self.db.close()
+
+
+class JobWorker(object):
+    """Run the queued jobs in threads, within the concurrency limits"""
+
+    def __init__(self, queue, execute, concurrency, poll=0.05):
+        self.queue = queue
+        self.execute = execute
+        self.concurrency = concurrency
+        self.poll = poll
+        self.running = {}
+        self.stopped = False
+
+    def allowedActions(self):
+        # The actions under their limit, and under the total
+        if len(self.running) >= self.concurrency['total']:
+            return []
+
+        counts = {}
+        for job in self.running.values():
+            counts[limitKey(job['action'])] = counts.get(limitKey(job['action']), 0) + 1
+
+        return [
+            action for action in ACTIONS
+            if counts.get(limitKey(action), 0) < self.concurrency.get(limitKey(action), self.concurrency['total'])
+        ]
+
+    def busyLocations(self):
+        # The locations with their writer jobs limit reached
+        counts = {}
+        for job in self.running.values():
+            if job['action'] in WRITERACTIONS:
+                counts[job['location']] = counts.get(job['location'], 0) + 1
+
+        return [location for (location, count) in counts.items() if count >= self.concurrency['location']]
+
+    def runJob(self, job):
+        error = None
+        try:
+            self.execute(job)
+        except (Exception, SystemExit):
+            # argparse exits on the bad job arguments
+            error = traceback.format_exc()
+        self.queue.finish(job['id'], error)
+
+    def step(self):
+        # Start the allowed jobs, True if a job was started
+        for (thread, job) in self.running.items():
+            if not thread.is_alive():
+                del self.running[thread]
+
+        job = self.queue.claim(self.allowedActions(), self.busyLocations())
+        if job is None:
+            return False
+
+        thread = threading.Thread(target=self.runJob, args=(job,))
+        thread.daemon = True
+        self.running[thread] = job
+        thread.start()
+
+        return True
+
+    def run(self, maxjobs=None):
+        nbjobs = 0
+        while not self.stopped and (maxjobs is None or nbjobs < maxjobs):
+            if self.step():
+                nbjobs += 1
+            else:
+                time.sleep(self.poll)
+
+        for thread in self.running.keys():
+            thread.join()
+
+    def stop(self):
+        self.stopped = True
+
+
+def getJSONConfigFilename():
+    # Same as commons, without its imports
+    jsonfilename = "sdrhunter.json" if os.name == "nt" else ".sdrhunter.json"
+    return os.path.join(os.path.expanduser("~"), jsonfilename)
+
+
+def parse_arguments(cmdline=""):
+    """Parse the arguments"""
+
+    parser = argparse.ArgumentParser(
+        description=__description__,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        'command',
+        choices=['submit', 'status', 'list'],
+        help='Submit a job, show a job status or list the jobs'
+    )
+
+    parser.add_argument(
+        '-a', '--action',
+        action='store',
+        dest='action',
+        default='infos',
+        choices=ACTIONS,
+        help='Action of the submitted job'
+    )
+
+    parser.add_argument(
+        '-l', '--location',
+        action='store',
+        dest='location',
+        default=None,
+        help='Scan location of the submitted job'
+    )
+
+    parser.add_argument(
+        '-c', '--configname',
+        action='store',
+        dest='configname',
+        default=None,
+        help='Config name'
+    )
+
+    parser.add_argument(
+        '-o', '--output',
+        action='store',
+        dest='output',
+        default=None,
+        help='Export filename (- for stdout)'
+    )
+
+    parser.add_argument(
+        '-p', '--priority',
+        action='store',
+        dest='priority',
+        type=int,
+        default=0,
+        help='The highest priority runs first'
+    )
+
+    parser.add_argument(
+        '-j', '--job',
+        action='store',
+        dest='job',
+        type=int,
+        default=None,
+        help='Job id for status'
+    )
+
+    parser.add_argument(
+        '-w', '--wait',
+        action='store_true',
+        dest='wait',
+        default=False,
+        help='Wait the end of the submitted job'
+    )
+
+    parser.add_argument(
+        '-d', '--database',
+        action='store',
+        dest='database',
+        default=None,
+        help='Jobs database, from the JSON config by default'
+    )
+
+    return parser.parse_args(cmdline)
+
+
+def showJob(job):
+    duration = ''
+    if job['finished']:
+        duration = '%.3fs' % (job['finished'] - job['started'])
+    print "%s %s %s priority %s: %s %s" % (
+        job['id'], job['action'], job['location'], job['priority'], job['status'], duration
+    )
+    if job['error']:
+        print job['error']
+
+
+def main():
+    args = parse_arguments(sys.argv[1:])
+
+    database = args.database
+    if database is None:
+        with open(getJSONConfigFilename()) as f:
+            database = databaseFilename(json.load(f))
+    queue = JobQueue(database)
+
+    if args.command == 'submit':
+        if args.location is None:
+            raise Exception("A location is required for the jobs")
+        jobid = queue.submit(args.action, args.location, args.configname, args.priority, args.output)
+        print "Job %s submitted" % jobid
+        if args.wait:
+            job = queue.wait(jobid)
+            showJob(job)
+            if job['status'] == 'failed':
+                sys.exit(1)
+
+    if args.command == 'status':
+        job = queue.get(args.job)
+        if job is None:
+            raise Exception("No job %s in %s" % (args.job, database))
+        showJob(job)
+
+    if args.command == 'list':
+        for job in queue.list():
+            showJob(job)
+
+    queue.close()
+
+
+if __name__ == '__main__':
+    main()  # pragma: no cover
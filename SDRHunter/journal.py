@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Edit journal for the stations file"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import os
+import json
+import time
+import shutil
+
+import commons
+
+
+class StationJournal(object):
+    """Append only stations edits, compacted from time to time into the stations file"""
+
+    def __init__(self, filename, maxsnapshots=5, compactafter=50):
+        self.filename = filename
+        self.journalfilename = '%s.journal' % filename
+        self.maxsnapshots = maxsnapshots
+        self.compactafter = compactafter
+
+        # Deltas not yet written in the journal file
+        self.pending = []
+        self.nbjournaled = self.countJournaled()
+
+    def countJournaled(self):
+        if not os.path.isfile(self.journalfilename):
+            return 0
+
+        with open(self.journalfilename) as f:
+            return len([line for line in f if line.strip()])
+
+    def record(self, action, values, oldvalues=None):
+        if action not in ['add', 'update', 'delete']:
+            raise Exception("Journal action '%s' unknown" % action)
+
+        delta = {'time': time.time(), 'action': action, 'values': self.stationValues(values)}
+        if oldvalues is not None:
+            delta['oldvalues'] = self.stationValues(oldvalues)
+        self.pending.append(delta)
+
+    def stationValues(self, values):
+        # Only keep the saved fields
+        fields = ['freq_center', 'bw', 'name', 'mode', 'authorname', 'othervalues']
+        return dict([(field, values[field]) for field in fields if field in values])
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        with open(self.journalfilename, 'a') as f:
+            for delta in self.pending:
+                f.write('%s\n' % json.dumps(delta, sort_keys=True))
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.nbjournaled += len(self.pending)
+        self.pending = []
+
+    def needCompact(self):
+        return self.nbjournaled >= self.compactafter
+
+    def isDirty(self):
+        return len(self.pending) > 0 or self.nbjournaled > 0
+
+    def stationKey(self, station):
+        return (commons.hz2Float(station['freq_center']), commons.hz2Float(station['bw']), station.get('name', ''))
+
+    def findStation(self, stations, station):
+        key = self.stationKey(station)
+        for idx in range(len(stations)):
+            if self.stationKey(stations[idx]) == key:
+                return idx
+
+        return -1
+
+    def replay(self, jsonfreqs):
+        # Apply the journal not yet compacted (ex: after a crash)
+        if not os.path.isfile(self.journalfilename):
+            return jsonfreqs
+
+        stations = jsonfreqs['stations']
+        with open(self.journalfilename) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+
+                try:
+                    delta = json.loads(line)
+                except ValueError:
+                    # Last line partially written
+                    break
+
+                if delta['action'] == 'add':
+                    # Already in the stations file if the last compaction was interrupted
+                    if self.findStation(stations, delta['values']) == -1:
+                        stations.append(delta['values'])
+                else:
+                    idx = self.findStation(stations, delta.get('oldvalues', delta['values']))
+                    if idx == -1:
+                        continue
+                    if delta['action'] == 'update':
+                        stations[idx] = delta['values']
+                    else:
+                        del stations[idx]
+
+        jsonfreqs['stations'] = sorted(stations, key=lambda x: commons.hz2Float(x['freq_center']))
+        return jsonfreqs
+
+    def snapshotFilename(self, idx):
+        return '%s.%s' % (self.filename, idx)
+
+    def rotateSnapshots(self):
+        if not os.path.isfile(self.filename):
+            return
+
+        # scanresult.json.1 is the most recent
+        oldest = self.snapshotFilename(self.maxsnapshots)
+        if os.path.isfile(oldest):
+            os.remove(oldest)
+        for idx in range(self.maxsnapshots - 1, 0, -1):
+            if os.path.isfile(self.snapshotFilename(idx)):
+                commons.replaceFile(self.snapshotFilename(idx), self.snapshotFilename(idx + 1))
+
+        # Copy, the stations file must always exist
+        shutil.copyfile(self.filename, self.snapshotFilename(1))
+
+    def compact(self, jsonfreqs):
+        # Kept in the journal until the stations file is written
+        self.flush()
+        if self.maxsnapshots > 0:
+            self.rotateSnapshots()
+        commons.saveJSONAtomic(self.filename, jsonfreqs)
+
+        # All edits are now in the stations file
+        if os.path.isfile(self.journalfilename):
+            os.remove(self.journalfilename)
+        self.nbjournaled = 0
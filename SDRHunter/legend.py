@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Legend rows layout for the heatmaps"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import bisect
+
+import commons
+
+
+class LegendLayout(object):
+    """Pack the stations legends into rows, without overlapping in a same row"""
+
+    def __init__(self, textwidth, maxnb_lines=10):
+        # textwidth(name) return the text size in pixels
+        self.textwidth = textwidth
+        self.widths = {}
+        self.maxnb_lines = maxnb_lines
+
+        self.freqstart = 0
+        self.freqend = 0
+        self.freqstep = 1
+        self.width = 0
+
+        # Rows are sorted by cropminleft, starts is used for the bisect search
+        self.rows = []
+        self.starts = []
+        self.overflow = []
+        self.entries = {}
+
+    def setView(self, freqstart, freqend, freqstep, width):
+        self.freqstart = freqstart
+        self.freqend = freqend
+        self.freqstep = freqstep
+        self.width = width
+
+    def textWidth(self, name):
+        if name not in self.widths:
+            self.widths[name] = self.textwidth(name)
+
+        return self.widths[name]
+
+    def stationKey(self, station):
+        if 'freq_left' in station:
+            freq_left = commons.hz2Float(station['freq_left'])
+            freq_right = commons.hz2Float(station['freq_right'])
+        else:
+            freq_center = commons.hz2Float(station['freq_center'])
+            bw = commons.hz2Float(station['bw'])
+            freq_left = freq_center - (bw / 2)
+            freq_right = freq_left + bw
+
+        return (freq_left, freq_right, station['name'])
+
+    def computeGeometry(self, station):
+        (freq_left, freq_right, name) = self.stationKey(station)
+        entry = {
+            'key': (freq_left, freq_right, name),
+            'name': name,
+            'freq_left': freq_left,
+            'freq_right': freq_right,
+            'bw': freq_right - freq_left,
+            'freq_center': freq_left + ((freq_right - freq_left) / 2),
+        }
+
+        # Calc Cropped freq (for drawing in heatmap)
+        textsizex = self.textWidth(name)
+        entry['cropped_left'] = max(freq_left, self.freqstart - self.freqstep)
+        entry['cropped_right'] = min(freq_right, self.freqend + self.freqstep)
+        entry['cropped_bw'] = entry['cropped_right'] - entry['cropped_left']
+        entry['cropped_center'] = entry['cropped_left'] + (entry['cropped_bw'] / 2)
+        entry['posleft'] = (entry['cropped_left'] - self.freqstart) / self.freqstep
+        entry['poscenter'] = (entry['cropped_center'] - self.freqstart) / self.freqstep
+        entry['posright'] = (entry['cropped_right'] - self.freqstart) / self.freqstep
+        entry['textleft'] = entry['poscenter'] - (textsizex / 2)
+        entry['textright'] = entry['poscenter'] + (textsizex / 2)
+
+        # calc min and max position (line or text)
+        entry['cropminleft'] = min(entry['posleft'], entry['textleft'])
+        entry['cropmaxright'] = max(entry['posright'], entry['textright'])
+
+        return entry
+
+    def isVisible(self, entry):
+        if 0 <= entry['cropminleft'] <= self.width or 0 <= entry['cropmaxright'] <= self.width:
+            return True
+
+        return entry['cropminleft'] <= 0 and entry['cropmaxright'] >= self.width
+
+    def fitInRow(self, rowidx, entry):
+        row = self.rows[rowidx]
+        idx = bisect.bisect_right(self.starts[rowidx], entry['cropminleft'])
+        if idx > 0 and row[idx - 1]['cropmaxright'] > entry['cropminleft']:
+            return -1
+        if idx < len(row) and entry['cropmaxright'] > row[idx]['cropminleft']:
+            return -1
+
+        return idx
+
+    def place(self, entry):
+        # First row with a free place
+        for rowidx in range(len(self.rows)):
+            idx = self.fitInRow(rowidx, entry)
+            if idx != -1:
+                self.rows[rowidx].insert(idx, entry)
+                self.starts[rowidx].insert(idx, entry['cropminleft'])
+                return True
+
+        if len(self.rows) + 1 <= self.maxnb_lines:
+            self.rows.append([entry])
+            self.starts.append([entry['cropminleft']])
+            return True
+
+        self.overflow.append(entry)
+        return False
+
+    def unplace(self, entry):
+        for idx in range(len(self.overflow)):
+            if self.overflow[idx] is entry:
+                del self.overflow[idx]
+                return
+
+        for rowidx in range(len(self.rows)):
+            idx = bisect.bisect_left(self.starts[rowidx], entry['cropminleft'])
+            row = self.rows[rowidx]
+            while idx < len(row) and row[idx]['cropminleft'] == entry['cropminleft']:
+                if row[idx] is entry:
+                    del row[idx]
+                    del self.starts[rowidx][idx]
+                    if not row:
+                        del self.rows[rowidx]
+                        del self.starts[rowidx]
+                    self.placeOverflow(entry['cropminleft'], entry['cropmaxright'])
+                    return
+                idx += 1
+
+    def placeOverflow(self, freedleft, freedright):
+        # Try again the legends without free place, only near the freed place
+        overflow = sorted(self.overflow, key=lambda x: x['bw'], reverse=True)
+        self.overflow = []
+        for entry in overflow:
+            if entry['cropmaxright'] >= freedleft and entry['cropminleft'] <= freedright:
+                self.place(entry)
+            else:
+                self.overflow.append(entry)
+
+    def layout(self, jsonstations):
+        self.rows = []
+        self.starts = []
+        self.overflow = []
+        self.entries = {}
+
+        legends_can_draw = []
+        for jsoncontent in jsonstations:
+            for station in jsoncontent['stations']:
+                if 'name' in station:
+                    entry = self.computeGeometry(station)
+                    self.entries.setdefault(entry['key'], []).append(entry)
+                    if self.isVisible(entry):
+                        legends_can_draw.append(entry)
+
+        # Order legends by bandwith
+        legends_can_draw = sorted(legends_can_draw, key=lambda x: x['bw'], reverse=True)
+        for entry in legends_can_draw:
+            self.place(entry)
+
+    def addStation(self, station):
+        if 'name' not in station:
+            return
+
+        entry = self.computeGeometry(station)
+        self.entries.setdefault(entry['key'], []).append(entry)
+        if self.isVisible(entry):
+            self.place(entry)
+
+    def removeStation(self, station):
+        if 'name' not in station:
+            return
+
+        key = self.stationKey(station)
+        if key not in self.entries:
+            return
+
+        entry = self.entries[key].pop()
+        if not self.entries[key]:
+            del self.entries[key]
+
+        if self.isVisible(entry):
+            self.unplace(entry)
+
+    def updateStation(self, oldstation, newstation):
+        self.removeStation(oldstation)
+        self.addStation(newstation)
+
+    def displayRows(self):
+        # The widest bandwidths are drawn in the last row
+        rows = list(self.rows)
+        rows.reverse()
+
+        return rows
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Prometheus metrics of the long running scans"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import threading
+import BaseHTTPServer
+
+# name: (type, help)
+METRICS = {
+    'sdrhunter_windows_completed_total': ('counter', 'Windows captured, by scan level'),
+    'sdrhunter_windows_pending': ('gauge', 'Windows not yet captured in the current sweep, by scan level'),
+    'sdrhunter_rtlpower_seconds_total': ('counter', 'rtl_power running time'),
+    'sdrhunter_rtlpower_last_seconds': ('gauge', 'rtl_power running time of the last window'),
+    'sdrhunter_lines_ingested_total': ('counter', 'rtl_power CSV lines captured'),
+    'sdrhunter_lines_per_second': ('gauge', 'rtl_power CSV lines by second for the last window'),
+    'sdrhunter_capture_bytes_total': ('counter', 'Bytes of the captured CSV files'),
+    'sdrhunter_failures_total': ('counter', 'rtl_power failures, by scan level'),
+    'sdrhunter_retries_total': ('counter', 'rtl_power retries, by scan level'),
+    'sdrhunter_dongle_window': ('gauge', 'Window captured by a dongle, 1 while running'),
+    'sdrhunter_sweeps_total': ('counter', 'Sweeps done by the daemon'),
+}
+
+
+def setMetricsDefaults(metrics):
+    if 'host' not in metrics:
+        metrics['host'] = '127.0.0.1'
+    if 'port' not in metrics:
+        metrics['port'] = 9150
+    if 'interval' not in metrics:
+        metrics['interval'] = 60
+
+    return metrics
+
+
+def labelsKey(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def escapeLabel(value):
+    return ('%s' % value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry(object):
+    """Metrics values by name and labels, updated from the scan thread"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+        # The costly metrics are only computed while a server exports them
+        self.exported = False
+
+    def check(self, name):
+        if name not in METRICS:
+            raise Exception("Metric '%s' not in %s" % (name, sorted(METRICS.keys())))
+
+    def inc(self, name, value=1, labels=None):
+        self.check(name)
+        with self.lock:
+            series = self.values.setdefault(name, {})
+            key = labelsKey(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, labels=None):
+        self.check(name)
+        with self.lock:
+            self.values.setdefault(name, {})[labelsKey(labels)] = value
+
+    def remove(self, name, labels=None):
+        with self.lock:
+            self.values.get(name, {}).pop(labelsKey(labels), None)
+
+    def get(self, name, labels=None):
+        with self.lock:
+            return self.values.get(name, {}).get(labelsKey(labels))
+
+    def render(self):
+        # Prometheus text format
+        lines = []
+        with self.lock:
+            for name in sorted(self.values):
+                (metrictype, metrichelp) = METRICS[name]
+                lines.append('# HELP %s %s' % (name, metrichelp))
+                lines.append('# TYPE %s %s' % (name, metrictype))
+                for (key, value) in sorted(self.values[name].items()):
+                    labels = ''
+                    if key:
+                        labels = '{%s}' % ','.join(['%s="%s"' % (label, escapeLabel(text)) for (label, text) in key])
+                    lines.append('%s%s %s' % (name, labels, repr(float(value))))
+
+        return '%s\n' % '\n'.join(lines)
+
+
+class MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        content = self.server.registry.render()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        # No access log on the scan output
+        pass
+
+
+class MetricsServer(object):
+    """HTTP /metrics endpoint, served from a daemon thread"""
+
+    def __init__(self, registry, port=9150, host='127.0.0.1'):
+        self.httpd = BaseHTTPServer.HTTPServer((host, port), MetricsHandler)
+        self.httpd.registry = registry
+        self.port = self.httpd.server_port
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.httpd.registry.exported = True
+
+    def stop(self):
+        self.httpd.registry.exported = False
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Timers by stage and window, enabled with --profile"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import os
+import json
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+def peakRSS():
+    # In KB
+    if resource is None:
+        return None
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Profiler(object):
+    """Write a JSON line by window with the stages durations and the I/O"""
+
+    summaryheaders = ['Action', 'Stage', 'Windows', 'Total s', 'Mean ms', 'Max ms', 'Read', 'Written']
+
+    def __init__(self):
+        self.enabled = False
+        self.tracefilename = None
+        self.trace = None
+        self.records = []
+        self.current = None
+
+    def start(self, tracefilename):
+        dirname = os.path.dirname(tracefilename)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        self.enabled = True
+        self.tracefilename = tracefilename
+        self.trace = open(tracefilename, 'a')
+        self.records = []
+
+    def stop(self):
+        if self.trace:
+            self.trace.close()
+        self.enabled = False
+        self.trace = None
+        self.current = None
+
+    @contextmanager
+    def window(self, action, scanlevel, start, gain=None):
+        if not self.enabled:
+            yield
+            return
+
+        self.current = {
+            'action': action, 'scanlevel': scanlevel, 'start': start, 'gain': gain,
+            'stages': {}, 'bytes_read': 0, 'bytes_written': 0,
+        }
+        begin = time.time()
+        try:
+            yield
+        finally:
+            record = self.current
+            record['duration'] = time.time() - begin
+            record['peak_rss_kb'] = peakRSS()
+            self.current = None
+
+            self.records.append(record)
+            self.trace.write('%s\n' % json.dumps(record, sort_keys=True))
+            self.trace.flush()
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled or self.current is None:
+            yield
+            return
+
+        begin = time.time()
+        try:
+            yield
+        finally:
+            stages = self.current['stages']
+            stages[name] = stages.get(name, 0) + (time.time() - begin)
+
+    def addBytes(self, field, filename):
+        if self.enabled and self.current is not None and os.path.isfile(filename):
+            self.current[field] += os.path.getsize(filename)
+
+    def addRead(self, filename):
+        self.addBytes('bytes_read', filename)
+
+    def addWritten(self, filename):
+        self.addBytes('bytes_written', filename)
+
+    def summary(self):
+        # By action and stage: count, total, mean and max durations
+        stats = {}
+        for record in self.records:
+            stages = dict(record['stages'])
+            stages['total'] = record['duration']
+            for (stage, duration) in stages.items():
+                key = (record['action'], stage)
+                if key not in stats:
+                    stats[key] = {'count': 0, 'total': 0.0, 'max': 0.0, 'bytes_read': 0, 'bytes_written': 0}
+                stats[key]['count'] += 1
+                stats[key]['total'] += duration
+                stats[key]['max'] = max(stats[key]['max'], duration)
+                if stage == 'total':
+                    stats[key]['bytes_read'] += record['bytes_read']
+                    stats[key]['bytes_written'] += record['bytes_written']
+
+        rows = []
+        for ((action, stage), stat) in sorted(stats.items()):
+            rows.append([
+                action, stage, stat['count'], '%.3f' % stat['total'], '%.1f' % (stat['total'] * 1000 / stat['count']),
+                '%.1f' % (stat['max'] * 1000), stat['bytes_read'], stat['bytes_written'],
+            ])
+
+        return rows
+
+
+profiler = Profiler()
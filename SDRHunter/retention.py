@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Retention of the captures: compaction, daily rollups and disk high water mark"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import os
+import glob
+import time
+import threading
+
+import numpy as np
+
+import commons
+
+COMPACTEXT = commons.COMPACTEXT
+
+# Files of a capture besides the CSV, the images are generated again from the compacted capture
+CAPTUREEXTS = [COMPACTEXT, '.summary', '.scaninfo', '.hparam', '_heatmap.png', '_spectre.png']
+REGENERATED = ['_heatmap.png', '_spectre.png']
+
+# The background compaction and the high water mark don't work on the same capture
+retentionlock = threading.Lock()
+
+
+def setRetentionDefaults(retention):
+    # Days before the compaction and the rollup, null keeps forever
+    if 'rawdays' not in retention:
+        retention['rawdays'] = None
+    if 'rollupdays' not in retention:
+        retention['rollupdays'] = None
+
+    # Disk usage ratio, null never frees the disk before a capture
+    if 'highwater' not in retention:
+        retention['highwater'] = None
+    if 'lowwater' not in retention:
+        retention['lowwater'] = 0.8
+    if 'background' not in retention:
+        retention['background'] = False
+
+    return retention
+
+
+def scanlevelPolicy(config, scanlevel):
+    # The scanlevel retention overrides the global one
+    policy = dict(config['global']['retention'])
+    policy.update(scanlevel.get('retention', {}))
+
+    return policy
+
+
+def diskUsage(path):
+    # Used ratio of the filesystem, None when unknown
+    if not hasattr(os, 'statvfs') or not os.path.isdir(path):
+        return None
+
+    stat = os.statvfs(path)
+    if not stat.f_blocks:
+        return None
+
+    return 1.0 - (float(stat.f_bavail) / stat.f_blocks)
+
+
+def captureDirs(config, scanlevel):
+    # The scanlevel directories of all the locations
+    return sorted(glob.glob(os.path.join(config['global']['rootdir'], '*', scanlevel['name'])))
+
+
+def listCaptures(dirname):
+    # (mtime, basename, compacted) of the captures, the oldest first
+    captures = []
+    for name in os.listdir(dirname):
+        if name.endswith(COMPACTEXT):
+            basename = name[:-len(COMPACTEXT)]
+            compacted = True
+        elif [ext for ext in commons.CSVEXTS if name.endswith(ext)]:
+            basename = commons.csvBasename(name)
+            compacted = False
+        else:
+            continue
+
+        fullname = os.path.join(dirname, name)
+        captures.append((os.path.getmtime(fullname), os.path.join(dirname, basename), compacted))
+
+    return sorted(captures)
+
+
+def isCaptured(basename):
+    return os.path.isfile(commons.csvFilename(basename))
+
+
+def isCompacted(basename):
+    return commons.csvFilename(basename).endswith(COMPACTEXT)
+
+
+def loadCapture(basename):
+    # The CSV or the compacted capture
+    filename = commons.csvFilename(basename)
+    return commons.SDRDatas(filename).loadCSVFile(filename)
+
+
+def removeFiles(basename, exts):
+    freed = 0
+    for ext in exts:
+        filename = '%s%s' % (basename, ext)
+        if os.path.isfile(filename):
+            freed += os.path.getsize(filename)
+            os.remove(filename)
+            commons.datacache.invalidate(filename)
+
+    return freed
+
+
+def compactCapture(basename):
+    # CSV to compressed float32 samples, the summaries and the heatmap parameters are kept
+    csvfilename = commons.csvFilename(basename)
+    csv = loadCapture(basename)
+    mtime = os.path.getmtime(csvfilename)
+
+    tmpfilename = '%s.tmp.npz' % basename
+    np.savez_compressed(
+        tmpfilename, samples=csv['samples'].astype(np.float32), times=np.array(csv['times']),
+        freq_start=csv['freq_start'], freq_end=csv['freq_end'], freq_step=csv['freq_step']
+    )
+    compactfilename = '%s%s' % (basename, COMPACTEXT)
+    commons.replaceFile(tmpfilename, compactfilename)
+
+    # Keep the capture age
+    os.utime(compactfilename, (mtime, mtime))
+
+    return removeFiles(basename, commons.CSVEXTS + REGENERATED) - os.path.getsize(compactfilename)
+
+
+def rollupCapture(basename):
+    # Min, max and mean spectrums in the rollup of the capture day, the capture files are removed
+    csv = loadCapture(basename)
+    dirname = os.path.join(os.path.dirname(basename), 'rollups')
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    day = csv['times'][0][:10] if len(csv['times']) else time.strftime('%Y-%m-%d')
+    rollupfilename = os.path.join(dirname, '%s.npz' % day)
+    rollup = {}
+    if os.path.isfile(rollupfilename):
+        content = np.load(rollupfilename)
+        rollup = dict([(key, content[key]) for key in content.files])
+
+    samples = csv['samples']
+    name = os.path.basename(basename)
+    rollup['%s|min' % name] = samples.min(axis=0).astype(np.float32)
+    rollup['%s|max' % name] = samples.max(axis=0).astype(np.float32)
+    rollup['%s|mean' % name] = samples.mean(axis=0).astype(np.float32)
+    rollup['%s|freqs' % name] = np.array([csv['freq_start'], csv['freq_end'], csv['freq_step']])
+    rollup['%s|nblines' % name] = np.array(samples.shape[0])
+
+    tmpfilename = '%s.tmp.npz' % rollupfilename[:-len('.npz')]
+    np.savez_compressed(tmpfilename, **rollup)
+    commons.replaceFile(tmpfilename, rollupfilename)
+
+    return removeFiles(basename, commons.CSVEXTS + CAPTUREEXTS)
+
+
+def applyRetention(config, scanlevel, now=None):
+    # Compact or rollup the captures older than the scanlevel policy
+    policy = scanlevelPolicy(config, scanlevel)
+    now = time.time() if now is None else now
+
+    result = {'compacted': 0, 'rolledup': 0, 'freed': 0}
+    for dirname in captureDirs(config, scanlevel):
+        for (mtime, basename, compacted) in listCaptures(dirname):
+            days = (now - mtime) / 86400.0
+            with retentionlock:
+                if not isCaptured(basename):
+                    continue
+                if policy['rollupdays'] is not None and days > policy['rollupdays']:
+                    result['freed'] += rollupCapture(basename)
+                    result['rolledup'] += 1
+                elif policy['rawdays'] is not None and days > policy['rawdays'] and not compacted:
+                    result['freed'] += compactCapture(basename)
+                    result['compacted'] += 1
+
+    return result
+
+
+def enforceHighWater(config, usage=diskUsage):
+    # Before a capture, compact then rollup the oldest captures until the low water mark
+    retention = config['global']['retention']
+    rootdir = config['global']['rootdir']
+    if retention['highwater'] is None:
+        return False
+
+    current = usage(rootdir)
+    if current is None or current < retention['highwater']:
+        return False
+
+    captures = []
+    for scanlevel in config.get('scans', []):
+        for dirname in captureDirs(config, scanlevel):
+            captures += listCaptures(dirname)
+    captures = sorted(set(captures))
+
+    for step in [compactCapture, rollupCapture]:
+        for (mtime, basename, compacted) in captures:
+            if usage(rootdir) < retention['lowwater']:
+                return True
+            if step == compactCapture and compacted:
+                continue
+            with retentionlock:
+                if isCaptured(basename) and (step == rollupCapture or not isCompacted(basename)):
+                    step(basename)
+
+    current = usage(rootdir)
+    if current >= retention['highwater']:
+        raise Exception("Disk usage of %s is %.0f%%, above the high water mark" % (rootdir, current * 100))
+
+    return True
+
+
+class RetentionWorker(threading.Thread):
+    """Apply the retention of the scanlevels while the captures are running"""
+
+    def __init__(self, config):
+        super(RetentionWorker, self).__init__()
+        self.daemon = True
+        self.config = config
+        self.results = {}
+
+    def run(self):
+        for scanlevel in self.config.get('scans', []):
+            try:
+                self.results[scanlevel['name']] = applyRetention(self.config, scanlevel)
+            except Exception as e:
+                print "Retention of '%s' failed: %s" % (scanlevel['name'], e)
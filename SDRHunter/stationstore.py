@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Column oriented stations store"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import json
+
+import numpy as np
+
+import commons
+import units
+
+
+class StationStore(object):
+    """Stations kept by column, with precomputed sort keys and filter"""
+
+    headers = ["Freq", "Bw", 'Name', 'Mode', 'Author', "Others"]
+    textcolumns = ['freq_center', 'bw', 'name', 'mode', 'authorname']
+    freqcolumn, bwcolumn, namecolumn, modecolumn, authorcolumn, othercolumn = range(6)
+
+    def __init__(self, stations=None):
+        self.sortcolumn = self.freqcolumn
+        self.descending = False
+        self.filtertext = ''
+        self.load(stations or [])
+
+    def load(self, stations):
+        # Numeric columns, all the frequencies parsed in one pass
+        self.freqs = units.hz.parseArray([values['freq_center'] for values in stations]).tolist()
+        self.bws = units.hz.parseArray([values['bw'] for values in stations]).tolist()
+
+        # Text columns
+        self.texts = dict([(column, []) for column in self.textcolumns])
+        self.othervalues = []
+        self.searchtexts = []
+
+        for values in stations:
+            self.appendTexts(values)
+
+        self.invalidate()
+
+    def appendValues(self, values):
+        self.freqs.append(commons.hz2Float(values['freq_center']))
+        self.bws.append(commons.hz2Float(values['bw']))
+        self.appendTexts(values)
+
+    def appendTexts(self, values):
+        self.othervalues.append(values.get('othervalues', {}))
+
+        defaults = {'name': '', 'mode': 'UNDEFINED', 'authorname': 'UNDEFINED'}
+        for column in self.textcolumns:
+            self.texts[column].append('%s' % values.get(column, defaults.get(column)))
+
+        self.searchtexts.append(self.searchText(len(self.searchtexts)))
+
+    def searchText(self, row):
+        return ' '.join([self.texts[column][row] for column in self.textcolumns]).lower()
+
+    def invalidate(self):
+        self.sortkeys = {}
+        self.refreshOrder()
+
+    def sortKey(self, column):
+        if column not in self.sortkeys:
+            if column == self.freqcolumn:
+                keys = np.array(self.freqs, dtype=np.float64)
+            elif column == self.bwcolumn:
+                keys = np.array(self.bws, dtype=np.float64)
+            elif column == self.othercolumn:
+                keys = np.array([self.display(row, column) for row in range(len(self.freqs))], dtype=np.unicode_)
+            else:
+                keys = np.array([text.lower() for text in self.texts[self.textcolumns[column]]], dtype=np.unicode_)
+
+            self.sortkeys[column] = keys
+
+        return self.sortkeys[column]
+
+    def refreshOrder(self):
+        if not self.freqs:
+            self.order = np.array([], dtype=np.int64)
+            return
+
+        order = np.argsort(self.sortKey(self.sortcolumn), kind='mergesort')
+        if self.descending:
+            order = order[::-1]
+
+        if self.filtertext:
+            mask = np.array([self.filtertext in text for text in self.searchtexts], dtype=bool)
+            order = order[mask[order]]
+
+        self.order = order
+
+    def sort(self, column, descending=False):
+        self.sortcolumn = column
+        self.descending = descending
+        self.refreshOrder()
+
+    def setFilter(self, text):
+        self.filtertext = text.lower()
+        self.refreshOrder()
+
+    def rowCount(self):
+        return len(self.order)
+
+    def row(self, viewrow):
+        return int(self.order[viewrow])
+
+    def display(self, row, column):
+        if column == self.othercolumn:
+            return json.dumps(self.othervalues[row], sort_keys=True)
+
+        return self.texts[self.textcolumns[column]][row]
+
+    def station(self, row):
+        values = dict([(column, self.texts[column][row]) for column in self.textcolumns])
+        values['othervalues'] = self.othervalues[row]
+        values['freq_hz'] = self.freqs[row]
+        values['bw_hz'] = self.bws[row]
+
+        return values
+
+    def append(self, values):
+        self.appendValues(values)
+        self.invalidate()
+
+        return len(self.freqs) - 1
+
+    def update(self, row, values):
+        self.freqs[row] = commons.hz2Float(values['freq_center'])
+        self.bws[row] = commons.hz2Float(values['bw'])
+        self.othervalues[row] = values.get('othervalues', {})
+        for column in self.textcolumns:
+            if column in values:
+                self.texts[column][row] = '%s' % values[column]
+        self.searchtexts[row] = self.searchText(row)
+        self.invalidate()
+
+    def remove(self, rows):
+        for row in sorted(rows, reverse=True):
+            del self.freqs[row]
+            del self.bws[row]
+            del self.othervalues[row]
+            del self.searchtexts[row]
+            for column in self.textcolumns:
+                del self.texts[column][row]
+        self.invalidate()
+
+    def toJSON(self):
+        # Saved by frequency
+        jsonfreqs = {'stations': []}
+        for row in np.argsort(self.sortKey(self.freqcolumn), kind='mergesort'):
+            item = dict([(column, self.texts[column][row]) for column in self.textcolumns])
+            item['othervalues'] = self.othervalues[row]
+            jsonfreqs['stations'].append(item)
+
+        return jsonfreqs
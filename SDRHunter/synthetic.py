@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Deterministic rtl_power like captures, for the tests and benchmarks"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import datetime
+
+import numpy as np
+
+
+def carrier(freq_center, bw, powerdb, startline=0, nblines=None):
+    return {'freq_center': freq_center, 'bw': bw, 'powerdb': powerdb, 'startline': startline, 'nblines': nblines}
+
+
+def generateSamples(nblines=128, nbcolumns=2048, freq_start=100e6, freq_step=1000.0, noisefloor=-50.0,
+                    noisestd=1.0, carriers=None, seed=42):
+    random = np.random.RandomState(seed)
+    samples = random.normal(noisefloor, noisestd, (nblines, nbcolumns))
+
+    # Carriers over the noise floor
+    freqs = freq_start + (np.arange(nbcolumns) * freq_step)
+    for item in carriers or []:
+        columns = np.abs(freqs - item['freq_center']) <= item['bw'] / 2.0
+        lastline = nblines if item['nblines'] is None else item['startline'] + item['nblines']
+        shape = samples[item['startline']:lastline, columns].shape
+        samples[item['startline']:lastline, columns] = item['powerdb'] + random.normal(0, noisestd / 4, shape)
+
+    return samples
+
+
+def writeCapture(filename, samples, nbsubrange=1, freq_start=100e6, freq_step=1000.0, interval=1,
+                 start=datetime.datetime(2014, 11, 25, 12, 0, 0)):
+    (nblines, nbcolumns) = samples.shape
+    if nbcolumns % nbsubrange:
+        raise Exception("%s columns can't be splitted in %s sub ranges" % (nbcolumns, nbsubrange))
+
+    # rtl_power writes one line by sub range and by time
+    nbsamples = nbcolumns / nbsubrange
+    with open(filename, 'w') as f:
+        for line in range(nblines):
+            dtime = start + datetime.timedelta(seconds=line * interval)
+            prefix = dtime.strftime('%Y-%m-%d, %H:%M:%S')
+            for subrange in range(nbsubrange):
+                hz_low = freq_start + (subrange * nbsamples * freq_step)
+                hz_high = hz_low + (nbsamples * freq_step)
+                powers = samples[line, subrange * nbsamples:(subrange + 1) * nbsamples]
+                f.write('%s, %d, %d, %.2f, %d, %s\n' % (
+                    prefix, hz_low, hz_high, freq_step, nbsamples, ', '.join(['%.2f' % power for power in powers])
+                ))
+
+
+def generateCapture(filename, nblines=128, nbsubrange=4, nbsamples=512, freq_start=100e6, freq_step=1000.0,
+                    noisefloor=-50.0, noisestd=1.0, carriers=None, seed=42, interval=1):
+    samples = generateSamples(
+        nblines, nbsubrange * nbsamples, freq_start, freq_step, noisefloor, noisestd, carriers, seed
+    )
+    writeCapture(filename, samples, nbsubrange, freq_start, freq_step, interval)
+
+    return samples
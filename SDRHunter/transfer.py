@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Send the finished captures of a scanner to the analysis host"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import os
+import time
+import socket
+import hashlib
+import tarfile
+import threading
+import SocketServer
+
+import cluster
+import commons
+import retention
+
+# Written with the capture, sent when the capture is finished
+SIDECAREXTS = ['.scaninfo', '.summary', '.hparam', '_heatmap.png', '_spectre.png']
+
+# Not compressed again in the batches
+COMPRESSEDEXTS = ['.gz', '.zst', '.npz', '.png']
+
+CHUNKSIZE = 64 * 1024
+
+
+def setTransferDefaults(transfer):
+    if 'host' not in transfer:
+        transfer['host'] = '0.0.0.0'
+    if 'port' not in transfer:
+        transfer['port'] = 9170
+
+    # Bytes of the small files sent in one archive
+    if 'batchsize' not in transfer:
+        transfer['batchsize'] = 4 * 1024 * 1024
+
+    # Batches received at the same time, then the senders wait
+    if 'maxbusy' not in transfer:
+        transfer['maxbusy'] = 2
+    if 'retry' not in transfer:
+        transfer['retry'] = 1
+
+    return transfer
+
+
+def fileHash(filename):
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNKSIZE), ''):
+            sha1.update(chunk)
+
+    return sha1.hexdigest()
+
+
+def finishedFiles(rootdir, dirnames):
+    # Relative paths of the finished captures and their sidecars
+    paths = []
+    for dirname in dirnames:
+        for name in sorted(os.listdir(dirname)):
+            filename = os.path.join(dirname, name)
+            if name.endswith(retention.COMPACTEXT):
+                basename = filename[:-len(retention.COMPACTEXT)]
+            elif [ext for ext in commons.CSVEXTS if name.endswith(ext)]:
+                basename = commons.csvBasename(filename)
+            else:
+                continue
+
+            paths.append(filename)
+            paths += ['%s%s' % (basename, ext) for ext in SIDECAREXTS if os.path.isfile('%s%s' % (basename, ext))]
+
+    return [os.path.relpath(path, rootdir).replace(os.sep, '/') for path in paths]
+
+
+def changedFiles(rootdir, paths, manifest):
+    # The files not yet sent with their content, the hashes are reused for the unchanged files
+    changed = []
+    for path in paths:
+        filename = os.path.join(rootdir, path)
+        stat = os.stat(filename)
+        entry = manifest.get(path)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            continue
+
+        sha1 = fileHash(filename)
+        if entry and entry['sha1'] == sha1:
+            entry['mtime'] = stat.st_mtime
+            continue
+
+        changed.append({'path': path, 'sha1': sha1, 'size': stat.st_size, 'mtime': stat.st_mtime})
+
+    return changed
+
+
+def makeBatches(files, batchsize):
+    # Small files together, a big file alone
+    batches = []
+    current = []
+    size = 0
+    for item in files:
+        if current and size + item['size'] > batchsize:
+            batches.append(current)
+            current = []
+            size = 0
+        current.append(item)
+        size += item['size']
+
+    if current:
+        batches.append(current)
+
+    return batches
+
+
+def batchCompression(batch):
+    compressed = [item for item in batch if [ext for ext in COMPRESSEDEXTS if item['path'].endswith(ext)]]
+    return None if len(compressed) == len(batch) else 'gz'
+
+
+def safePath(rootdir, path):
+    filename = os.path.normpath(os.path.join(rootdir, path))
+    if os.path.isabs(path) or not filename.startswith(os.path.normpath(rootdir) + os.sep):
+        raise Exception("Path %s outside of %s" % (path, rootdir))
+
+    return filename
+
+
+class ChunkedWriter(object):
+    """Length prefixed chunks, the archive size is not known before its end"""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, data):
+        if data:
+            self.wfile.write('%x\n' % len(data))
+            self.wfile.write(data)
+
+    def close(self):
+        self.wfile.write('0\n')
+        self.wfile.flush()
+
+
+class ChunkedReader(object):
+    def __init__(self, rfile):
+        self.rfile = rfile
+        self.buffer = ''
+        self.ended = False
+
+    def read(self, size=-1):
+        while not self.ended and (size < 0 or len(self.buffer) < size):
+            length = int(self.rfile.readline(), 16)
+            if not length:
+                self.ended = True
+                break
+            self.buffer += self.rfile.read(length)
+
+        if size < 0:
+            size = len(self.buffer)
+        (data, self.buffer) = (self.buffer[:size], self.buffer[size:])
+
+        return data
+
+    def drain(self):
+        while self.read(CHUNKSIZE):
+            pass
+
+
+class ReceiverHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        receiver = self.server.receiver
+        offer = cluster.readMessage(self.rfile)
+        needed = receiver.needed(offer['files'])
+        if not needed:
+            cluster.writeMessage(self.wfile, {'needed': []})
+            return
+
+        # Back-pressure, the sender retries later
+        if not receiver.slots.acquire(False):
+            cluster.writeMessage(self.wfile, {'busy': True})
+            return
+
+        try:
+            cluster.writeMessage(self.wfile, {'needed': [item['path'] for item in needed]})
+            reader = ChunkedReader(self.rfile)
+            try:
+                stored = receiver.receive(needed, reader, offer['compression'])
+                reader.drain()
+                response = {'stored': stored}
+            except Exception as e:
+                response = {'error': '%s' % e}
+            cluster.writeMessage(self.wfile, response)
+        finally:
+            receiver.slots.release()
+
+
+class ReceiverServer(SocketServer.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class Receiver(object):
+    """Store the files received under its rootdir, with their hashes"""
+
+    def __init__(self, rootdir, host='0.0.0.0', port=9170, maxbusy=2):
+        self.rootdir = rootdir
+        self.slots = threading.Semaphore(maxbusy)
+        self.lock = threading.Lock()
+        self.manifestfilename = os.path.join(rootdir, 'received-manifest.json')
+        self.manifest = commons.loadJSON(self.manifestfilename) or {}
+        self.server = ReceiverServer((host, port), ReceiverHandler)
+        self.server.receiver = self
+        self.port = self.server.server_address[1]
+
+    def needed(self, files):
+        with self.lock:
+            return [item for item in files if self.manifest.get(item['path']) != item['sha1']]
+
+    def receive(self, needed, reader, compression):
+        # Extract the archive, each file is checked before its rename
+        expected = dict([(item['path'], item['sha1']) for item in needed])
+        stored = []
+        archive = tarfile.open(fileobj=reader, mode='r|gz' if compression == 'gz' else 'r|')
+        for member in archive:
+            if member.name not in expected:
+                raise Exception("%s not offered" % member.name)
+
+            filename = safePath(self.rootdir, member.name)
+            dirname = os.path.dirname(filename)
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+
+            tmpfilename = '%s.receiving' % filename
+            sha1 = hashlib.sha1()
+            source = archive.extractfile(member)
+            with open(tmpfilename, 'wb') as f:
+                for chunk in iter(lambda: source.read(CHUNKSIZE), ''):
+                    sha1.update(chunk)
+                    f.write(chunk)
+
+            if sha1.hexdigest() != expected[member.name]:
+                os.remove(tmpfilename)
+                raise Exception("%s hash mismatch" % member.name)
+
+            commons.replaceFile(tmpfilename, filename)
+            stored.append(member.name)
+
+        with self.lock:
+            for path in stored:
+                self.manifest[path] = expected[path]
+            commons.saveJSONAtomic(self.manifestfilename, self.manifest)
+
+        return stored
+
+    def start(self):
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Sender(object):
+    """Send the changed files by batches, the manifest keeps the sent files for the next run"""
+
+    def __init__(self, rootdir, address, batchsize=4 * 1024 * 1024, retry=1):
+        self.rootdir = rootdir
+        self.address = address
+        self.batchsize = batchsize
+        self.retry = retry
+        self.manifestfilename = os.path.join(rootdir, 'transfer-manifest.json')
+        self.manifest = commons.loadJSON(self.manifestfilename) or {}
+        self.nbbusy = 0
+
+    def sendBatch(self, batch):
+        # Offer the batch, then stream the files the receiver needs
+        compression = batchCompression(batch)
+        offer = {'files': [{'path': item['path'], 'sha1': item['sha1']} for item in batch], 'compression': compression}
+
+        connection = socket.create_connection(self.address)
+        try:
+            wfile = connection.makefile('wb')
+            rfile = connection.makefile('rb')
+            cluster.writeMessage(wfile, offer)
+            response = cluster.readMessage(rfile)
+            if response.get('busy'):
+                return None
+
+            needed = set(response['needed'])
+            if needed:
+                writer = ChunkedWriter(wfile)
+                archive = tarfile.open(fileobj=writer, mode='w|gz' if compression == 'gz' else 'w|')
+                for item in batch:
+                    if item['path'] in needed:
+                        archive.add(os.path.join(self.rootdir, item['path']), arcname=item['path'])
+                archive.close()
+                writer.close()
+
+                response = cluster.readMessage(rfile)
+                if 'error' in response:
+                    raise Exception("Receiver error: %s" % response['error'])
+        finally:
+            connection.close()
+
+        return batch
+
+    def send(self, dirnames):
+        files = changedFiles(self.rootdir, finishedFiles(self.rootdir, dirnames), self.manifest)
+        nbsent = 0
+        for batch in makeBatches(files, self.batchsize):
+            # Wait while the receiver is busy
+            delay = self.retry
+            while self.sendBatch(batch) is None:
+                self.nbbusy += 1
+                time.sleep(delay)
+                delay = min(delay * 2, self.retry * 30)
+
+            for item in batch:
+                self.manifest[item['path']] = {'sha1': item['sha1'], 'size': item['size'], 'mtime': item['mtime']}
+            commons.saveJSONAtomic(self.manifestfilename, self.manifest)
+            nbsent += len(batch)
+
+        # The mtimes of the unchanged files
+        commons.saveJSONAtomic(self.manifestfilename, self.manifest)
+
+        return nbsent
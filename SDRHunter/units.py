@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Units parsing and formatting (ex: 118.5M <=> 118500000.0)"""
+__license__ = 'GPL'
+__version__ = '0.0.1'
+
+import numpy as np
+
+# Unit conversion
+HzUnities = {'M': 1e6, 'k': 1e3}
+secUnities = {'s': 1, 'm': 60, 'h': 3600}
+
+# Size of the format memo, emptied when full
+MEMOSIZE = 4096
+
+
+class Units(object):
+    """Parsers and formatters computed once for a units table"""
+
+    def __init__(self, unityobject, memosize=MEMOSIZE):
+        self.unityobject = dict(unityobject)
+        self.memosize = memosize
+
+        # Biggest unit first
+        self.unitysorted = sorted(self.unityobject.items(), key=lambda x: x[1], reverse=True)
+        self.factors = np.array([item[1] for item in reversed(self.unitysorted)], dtype=np.float64)
+        self.unitynames = [item[0] for item in reversed(self.unitysorted)]
+
+        # Memo caches, the parsing is not memoized, a dict lookup costs as much
+        self.formatted = {}
+        self.formats = {}
+
+    def parse(self, stringvalue):
+        # If allready number, we consider is the Hz
+        if isinstance(stringvalue, int) or isinstance(stringvalue, float):
+            return stringvalue
+
+        unityobject = self.unityobject
+        floatvalue = float(stringvalue[:-1])
+        unity = stringvalue[-1]
+        if (unity.lower() in unityobject or unity.upper() in unityobject):
+            floatvalue = floatvalue * unityobject[unity]
+
+        return floatvalue
+
+    def numberFormat(self, nbfloat, fillzero):
+        key = (nbfloat, fillzero)
+        if key not in self.formats:
+            if fillzero:
+                self.formats[key] = "%%08.%sf%%s" % nbfloat
+            else:
+                self.formats[key] = "%%.%sf%%s" % nbfloat
+
+        return self.formats[key]
+
+    def formatNumber(self, value, nbfloat=2, fillzero=False):
+        for (unity, factor) in self.unitysorted:
+            if value >= factor:
+                return self.numberFormat(nbfloat, fillzero) % (value / factor, unity)
+
+        return str(value)
+
+    def format(self, value, nbfloat=2, fillzero=False):
+        # 500 and 500.0 are the same key but not the same text
+        key = (type(value), value, nbfloat, fillzero)
+        try:
+            return self.formatted[key]
+        except (KeyError, TypeError):
+            pass
+
+        result = self.formatNumber(value, nbfloat, fillzero)
+        if len(self.formatted) >= self.memosize:
+            self.formatted.clear()
+        self.formatted[key] = result
+
+        return result
+
+    def parseArray(self, stringvalues):
+        # A list can mix numbers and strings
+        if isinstance(stringvalues, np.ndarray) and stringvalues.dtype.kind in 'iuf':
+            return stringvalues.astype(np.float64)
+
+        return np.array([self.parse(value) for value in stringvalues], dtype=np.float64)
+
+    def formatArray(self, values, nbfloat=2, fillzero=False):
+        values = np.asarray(values, dtype=np.float64)
+        if not values.size:
+            return []
+
+        # Each distinct value is formatted only one time
+        (uniques, inverse) = np.unique(values.ravel(), return_inverse=True)
+
+        # Unit index of each value, -1 when lower than all units
+        unityidx = np.searchsorted(self.factors, uniques, side='right') - 1
+        numberformat = self.numberFormat(nbfloat, fillzero)
+
+        texts = []
+        for (value, idx) in zip(uniques.tolist(), unityidx.tolist()):
+            if idx < 0:
+                texts.append(str(value))
+            else:
+                texts.append(numberformat % (value / self.factors[idx], self.unitynames[idx]))
+
+        return [texts[idx] for idx in inverse.tolist()]
+
+    def clear(self):
+        self.formatted.clear()
+
+
+# Units objects by table
+unitstables = {}
+
+
+def unitsFor(unityobject):
+    key = tuple(sorted(unityobject.items()))
+    if key not in unitstables:
+        unitstables[key] = Units(unityobject)
+
+    return unitstables[key]
+
+
+hz = unitsFor(HzUnities)
+sec = unitsFor(secUnities)
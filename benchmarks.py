@@ -0,0 +1,371 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__authors__ = 'Bruno Adelé <bruno@adele.im>'
+__copyright__ = 'Copyright (C) 2014 Bruno Adelé'
+__description__ = """Benchmarks of the hot paths, on synthetic captures"""
+__license__ = 'GPLv3'
+
+
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import timeit
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+from tabulate import tabulate
+
+from SDRHunter import SDRHunter
+from SDRHunter import bursts
+from SDRHunter import colormap
+from SDRHunter import commons
+from SDRHunter import legend
+from SDRHunter import synthetic
+from SDRHunter import units
+
+# Captures sizes (nblines, nbsubrange, nbsamples by sub range)
+SIZES = {
+    'small': (32, 4, 256),
+    'medium': (128, 4, 1024),
+    'large': (512, 8, 1024),
+}
+
+FREQ_START = 100e6
+FREQ_STEP = 1000.0
+
+# Seconds of a repeat, shorter ones are noisy
+MINBENCHTIME = 0.02
+
+
+def oldUnity2Float(stringvalue, unityobject):
+    # Reference, the conversion before the units module
+    if isinstance(stringvalue, int) or isinstance(stringvalue, float):
+        return stringvalue
+
+    floatvalue = float(stringvalue[:-1])
+    unity = stringvalue[-1]
+    if (unity.lower() in unityobject or unity.upper() in unityobject):
+        floatvalue = floatvalue * unityobject[unity]
+
+    return floatvalue
+
+
+def oldFloat2Unity(value, unityobject, nbfloat=2, fillzero=False):
+    # Reference, the conversion before the units module
+    unitysorted = sorted(unityobject, key=lambda x: unityobject[x], reverse=True)
+
+    result = value
+    for unity in unitysorted:
+        if value >= unityobject[unity]:
+            txtnbfloat = "%s" % nbfloat
+            if fillzero:
+                result = ("%08." + txtnbfloat + "f%s") % (value / unityobject[unity], unity)
+            else:
+                result = ("%." + txtnbfloat + "f%s") % (value / unityobject[unity], unity)
+            break
+
+    return str(result)
+
+
+def timeBench(bench, repeat=3, number=None):
+    # Best time of the repeats, in seconds, the fast benches are looped for at least MINBENCHTIME
+    if number is None:
+        number = 1
+        while timeit.timeit(bench, number=number) < MINBENCHTIME:
+            number *= 10
+
+    return min(timeit.repeat(bench, repeat=repeat, number=number)) / number
+
+
+def captureCarriers(nbcolumns):
+    # Some carriers of the usual bandwidths, and short bursts
+    carriers = []
+    for idx in range(1, 9):
+        freq_center = FREQ_START + (idx * nbcolumns * FREQ_STEP / 9)
+        carriers.append(synthetic.carrier(freq_center, 12500.0 * idx, -50 + (idx * 4)))
+    carriers.append(synthetic.carrier(FREQ_START + (nbcolumns * FREQ_STEP / 3), 25e3, -15, 2, 3))
+
+    return carriers
+
+
+class Capture(object):
+    """Synthetic capture of a size, generated once"""
+
+    def __init__(self, tmpdir, size):
+        (self.nblines, nbsubrange, nbsamples) = SIZES[size]
+        self.nbcolumns = nbsubrange * nbsamples
+        self.filename = os.path.join(tmpdir, 'capture-%s.csv' % size)
+        synthetic.generateCapture(
+            self.filename, self.nblines, nbsubrange, nbsamples, FREQ_START, FREQ_STEP,
+            carriers=captureCarriers(self.nbcolumns)
+        )
+
+        # Same capture compressed by rtl_power scan
+        self.gzfilename = '%s.gz' % self.filename
+        with open(self.filename, 'rb') as f:
+            commons.writeCSVStream(f, self.gzfilename, 'gz')
+
+        self.sdrdatas = commons.SDRDatas(self.filename)
+        self.csv = self.sdrdatas.loadCSVFile(self.filename)
+        self.sdrdatas._csv = self.csv
+        self.summaries = self.sdrdatas.genSummarizeSignal()
+
+    def nbvalues(self):
+        return self.nblines * self.nbcolumns
+
+
+def benchCapture(capture, repeat=3):
+    sdrdatas = capture.sdrdatas
+    summaries = capture.summaries
+    maxsignal = np.array(summaries['max']['signal'])
+    smooth_max = commons.smooth(maxsignal, 10, 'flat')
+    limitmin = summaries['min']['peak']['min']['mean'] - summaries['min']['peak']['min']['std']
+    limitmax = summaries['max']['mean'] + summaries['max']['std']
+    scanlevel = {'minscanbw': '10k', 'maxscanbw': '200k', 'minrelativedb': 5}
+
+    benchs = [
+        ('loadCSVFile', capture.nbvalues(), lambda: sdrdatas.loadCSVFile(capture.filename)),
+        ('loadCSVFile gz', capture.nbvalues(), lambda: sdrdatas.loadCSVFile(capture.gzfilename)),
+        ('genSummarizeSignal', capture.nbvalues(), sdrdatas.genSummarizeSignal),
+        ('computeAvgSignal', capture.nbcolumns, lambda: sdrdatas.computeAvgSignal({}, 'max', maxsignal)),
+        ('smooth', capture.nbcolumns, lambda: commons.smooth(maxsignal, 10, 'flat')),
+        ('searchStation', capture.nbcolumns,
+         lambda: SDRHunter.searchStation(scanlevel, [], summaries, smooth_max, limitmin, limitmax)),
+        ('heatmapRGB', capture.nbvalues(), lambda: colormap.heatmapRGB(capture.csv['samples'], summaries)),
+        ('detectBursts', capture.nbvalues(),
+         lambda: bursts.detectBursts(capture.csv['samples'], FREQ_START, FREQ_STEP, capture.csv['times'])),
+    ]
+
+    # searchStation prints the found stations
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        return [(name, nbvalues, timeBench(bench, repeat)) for (name, nbvalues, bench) in benchs]
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def benchLegend(capture, repeat=3):
+    # One legend for 16 columns
+    nbstations = capture.nbcolumns / 16
+    freqs = FREQ_START + (np.arange(nbstations) * 16 * FREQ_STEP)
+    jsonstations = [{'stations': [
+        {'freq_center': freq, 'bw': 12500.0 * (1 + (idx % 4)), 'name': 'Station %s' % idx}
+        for (idx, freq) in enumerate(freqs.tolist())
+    ]}]
+
+    def layout():
+        legendlayout = legend.LegendLayout(lambda name: len(name) * 7)
+        legendlayout.setView(FREQ_START, FREQ_START + (capture.nbcolumns * FREQ_STEP), FREQ_STEP, capture.nbcolumns)
+        legendlayout.layout(jsonstations)
+
+    return [('LegendLayout.layout', nbstations, timeBench(layout, repeat))]
+
+
+def benchConfig(repeat=3):
+    filename = os.path.join(os.path.dirname(os.path.abspath(SDRHunter.__file__)), 'sdrhunter.json')
+    args = argparse.Namespace(location='benchmark', configname=None)
+
+    return [('loadConfigFile', 1, timeBench(lambda: commons.loadConfigFile(filename, args), repeat))]
+
+
+def importModules(module, modules=()):
+    # Import in a new interpreter, the time and the modules loaded among the given ones
+    code = "import sys, time; begin = time.time(); import %s; print time.time() - begin, ' '.join(" \
+        "[name for name in %r if name in sys.modules])" % (module, list(modules))
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)))
+    fields = output.split()
+
+    return (float(fields[0]), fields[1:])
+
+
+def benchStartup(repeat=3):
+    # Python startup alone, then the CLI and the heavy modules imports
+    benchs = [
+        ('python', lambda: subprocess.check_call([sys.executable, '-c', 'pass'])),
+        ('import SDRHunter', lambda: importModules('SDRHunter.SDRHunter')),
+        ('import scipy.signal', lambda: importModules('scipy.signal')),
+    ]
+
+    return [(name, 1, timeBench(bench, repeat)) for (name, bench) in benchs]
+
+
+def benchUnits(repeat=3, nbvalues=10000, nbdistinct=500):
+    # Station like frequencies, with many repeated values
+    freqs = 88e6 + (np.arange(nbvalues) % nbdistinct) * 12.5e3
+    strings = ['%.4fM' % (freq / 1e6) for freq in freqs]
+    freqlist = freqs.tolist()
+
+    benchs = [
+        ('parse old', lambda: [oldUnity2Float(value, units.HzUnities) for value in strings]),
+        ('parse hz2Float', lambda: [commons.hz2Float(value) for value in strings]),
+        ('parse parseArray', lambda: units.hz.parseArray(strings)),
+        ('format old', lambda: [oldFloat2Unity(value, units.HzUnities) for value in freqlist]),
+        ('format float2Hz', lambda: [commons.float2Hz(value) for value in freqlist]),
+        ('format formatArray', lambda: units.hz.formatArray(freqs)),
+    ]
+
+    result = []
+    for (name, bench) in benchs:
+        units.hz.clear()
+        result.append((name, nbvalues, timeBench(bench, repeat)))
+
+    return result
+
+
+def runBenchmarks(groups, sizes, repeat=3):
+    results = []
+    for group in groups:
+        if group == 'units':
+            rows = [('-', row) for row in benchUnits(repeat)]
+        elif group == 'config':
+            rows = [('-', row) for row in benchConfig(repeat)]
+        elif group == 'startup':
+            rows = [('-', row) for row in benchStartup(repeat)]
+        else:
+            rows = []
+            tmpdir = tempfile.mkdtemp()
+            try:
+                for size in sizes:
+                    capture = Capture(tmpdir, size)
+                    if group == 'capture':
+                        rows += [(size, row) for row in benchCapture(capture, repeat)]
+                    else:
+                        rows += [(size, row) for row in benchLegend(capture, repeat)]
+            finally:
+                shutil.rmtree(tmpdir)
+
+        for (size, (name, nbvalues, duration)) in rows:
+            results.append({
+                'group': group, 'bench': name, 'size': size, 'nbvalues': nbvalues, 'ms': duration * 1000
+            })
+
+    return results
+
+
+def resultKey(result):
+    return '%s/%s/%s' % (result['group'], result['bench'], result['size'])
+
+
+def compareResults(results, baselinefilename, threshold):
+    # Ratio with the previous results, the regressions are above the threshold
+    baseline = dict([(resultKey(result), result) for result in json.load(open(baselinefilename))['results']])
+
+    regressions = []
+    for result in results:
+        previous = baseline.get(resultKey(result))
+        if previous and previous['ms'] > 0:
+            result['ratio'] = result['ms'] / previous['ms']
+            if result['ratio'] > threshold:
+                regressions.append(result)
+
+    return regressions
+
+
+GROUPS = ['capture', 'legend', 'config', 'units', 'startup']
+
+
+def parse_arguments(cmdline=""):
+    """Parse the arguments"""
+
+    parser = argparse.ArgumentParser(
+        description=__description__,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        'groups',
+        nargs='*',
+        default=GROUPS,
+        help='Benchmark groups in %s' % GROUPS
+    )
+
+    parser.add_argument(
+        '-s', '--sizes',
+        action='store',
+        dest='sizes',
+        default='small,medium',
+        help='Captures sizes in %s' % sorted(SIZES.keys())
+    )
+
+    parser.add_argument(
+        '-r', '--repeat',
+        action='store',
+        dest='repeat',
+        type=int,
+        default=3,
+        help='Number of repeats, the best is kept'
+    )
+
+    parser.add_argument(
+        '-o', '--output',
+        action='store',
+        dest='output',
+        default=None,
+        help='Save the results in this JSON file'
+    )
+
+    parser.add_argument(
+        '-b', '--baseline',
+        action='store',
+        dest='baseline',
+        default=None,
+        help='Compare with the results of this JSON file'
+    )
+
+    parser.add_argument(
+        '-t', '--threshold',
+        action='store',
+        dest='threshold',
+        type=float,
+        default=1.25,
+        help='Regression when slower than baseline * threshold'
+    )
+
+    return parser.parse_args(cmdline)
+
+
+def main():
+    args = parse_arguments(sys.argv[1:])
+    sizes = args.sizes.split(',')
+    for name in args.groups:
+        if name not in GROUPS:
+            raise Exception("Benchmark '%s' not in %s" % (name, GROUPS))
+    for size in sizes:
+        if size not in SIZES:
+            raise Exception("Size '%s' not in %s" % (size, sorted(SIZES.keys())))
+
+    results = runBenchmarks(args.groups, sizes, args.repeat)
+
+    regressions = []
+    if args.baseline:
+        regressions = compareResults(results, args.baseline, args.threshold)
+
+    table = []
+    for result in results:
+        ratio = '%.2f' % result['ratio'] if 'ratio' in result else ''
+        table.append([
+            result['group'], result['bench'], result['size'], result['nbvalues'], '%.3f' % result['ms'],
+            '%.2f' % (result['ms'] * 1e6 / result['nbvalues']), ratio
+        ])
+    print tabulate(table, headers=['Group', 'Bench', 'Size', 'Values', 'ms', 'ns/value', 'Ratio'], stralign="right")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'time': time.time(), 'results': results}, f, indent=4, sort_keys=True, separators=(',', ': '))
+
+    if regressions:
+        print
+        print "Regressions: %s" % ', '.join([resultKey(result) for result in regressions])
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,9 +8,53 @@ __license__ = 'GPLv3'
 
 
 import os
+import sys
+import datetime
+import gzip
+import json
+import shutil
+import tempfile
+import urllib2
+import threading
 import unittest
 
+import numpy as np
+
+import benchmarks
+
 from SDRHunter import SDRHunter
+from SDRHunter import commons
+from SDRHunter import colormap
+from SDRHunter import legend
+from SDRHunter import stationstore
+from SDRHunter import journal
+from SDRHunter import inspector
+from SDRHunter import units
+from SDRHunter import export
+from SDRHunter import compare
+from SDRHunter import baseline
+from SDRHunter import bursts
+from SDRHunter import candidates
+from SDRHunter import synthetic
+from SDRHunter import profiling
+from SDRHunter import metrics
+from SDRHunter import retention
+from SDRHunter import jobs
+from SDRHunter import cluster
+from SDRHunter import transfer
+
+
+def writeCSVFile(filename, nblines=4, nbsubrange=2, nbsamples=64, freq_start=100e6, freq_step=1000.0):
+    # Write a small rtl_power like capture
+    with open(filename, 'w') as f:
+        for line in range(nblines):
+            for subrange in range(nbsubrange):
+                hz_low = freq_start + (subrange * nbsamples * freq_step)
+                hz_high = hz_low + (nbsamples * freq_step)
+                powers = ['%.2f' % (-40 + ((idx * 7 + line * 3) % 11)) for idx in range(nbsamples)]
+                f.write('2014-11-25, 12:00:%02d, %d, %d, %.2f, 8, %s\n' % (
+                    line, hz_low, hz_high, freq_step, ', '.join(powers)
+                ))
 
 
 class TestPackages(unittest.TestCase):
@@ -25,5 +69,1017 @@ class TestPackages(unittest.TestCase):
         self.assertEqual(cm.exception.code, 0)
 
 
+class TestSDRDatas(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.csvfilename = os.path.join(self.tmpdir, 'capture.csv')
+        writeCSVFile(self.csvfilename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_lazy_loading(self):
+        datas = commons.SDRDatas(self.csvfilename)
+        self.assertIsNone(datas._csv)
+        self.assertIsNone(datas._summaries)
+
+        self.assertEqual(datas.samples.shape, (4, 128))
+        self.assertIsNone(datas._summaries)
+
+    def test_summaries_computed_once(self):
+        datas = commons.SDRDatas(self.csvfilename)
+        calls = []
+        gensummarize = datas.genSummarizeSignal
+
+        def countedGenSummarize():
+            calls.append(1)
+            return gensummarize()
+
+        datas.genSummarizeSignal = countedGenSummarize
+        SDRHunter.saveJSON(datas.getFilenameFor('summary.test'), datas.summaries)
+        self.assertEqual(datas.summaries['samples']['nblines'], 4)
+        self.assertEqual(len(calls), 1)
+
+
+class TestColormap(unittest.TestCase):
+
+    def test_lut(self):
+        lut = colormap.buildLUT('grayscale', 1024)
+        self.assertEqual(len(lut), 1024)
+        self.assertEqual(lut[0], 0xff000000)
+        self.assertEqual(lut[-1], 0xffffffff)
+
+    def test_apply_lut_clip(self):
+        samples = commons.np.array([[-100.0, -50.0, 0.0, 50.0]])
+        rgb = colormap.applyLUT(samples, -50.0, 0.0, 'grayscale')
+        self.assertEqual(list(rgb[0]), [0xff000000, 0xff000000, 0xffffffff, 0xffffffff])
+
+    def test_save_image(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            csvfilename = os.path.join(tmpdir, 'capture.csv')
+            writeCSVFile(csvfilename)
+            datas = commons.SDRDatas(csvfilename)
+            imgfilename = os.path.join(tmpdir, 'capture_heatmap.png')
+            colormap.saveHeatmapImage(imgfilename, datas.heatmapRGB('viridis', 'percentile'))
+            self.assertTrue(os.path.isfile(imgfilename))
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestLegendLayout(unittest.TestCase):
+
+    def setUp(self):
+        self.widths = []
+
+        def textwidth(name):
+            self.widths.append(name)
+            return len(name) * 6
+
+        self.layout = legend.LegendLayout(textwidth, maxnb_lines=2)
+        self.layout.setView(100e6, 101e6, 1000.0, 1000)
+        self.stations = {'stations': [
+            {'freq_center': '100.1M', 'bw': '100k', 'name': 'A'},
+            {'freq_center': '100.15M', 'bw': '20k', 'name': 'B'},
+            {'freq_center': '100.145M', 'bw': '10k', 'name': 'C'},
+            {'freq_center': '100.8M', 'bw': '10k', 'name': 'A'},
+        ]}
+
+    def test_layout(self):
+        self.layout.layout([self.stations])
+        self.assertEqual(len(self.layout.rows), 2)
+        self.assertEqual([entry['name'] for entry in self.layout.rows[0]], ['A', 'A'])
+        self.assertEqual(len(self.layout.overflow), 1)
+
+        # Text widths are computed once per name
+        self.assertEqual(sorted(self.widths), ['A', 'B', 'C'])
+
+    def test_incremental(self):
+        self.layout.layout([self.stations])
+        self.layout.removeStation(self.stations['stations'][1])
+        names = [[entry['name'] for entry in row] for row in self.layout.rows]
+        self.assertEqual(names, [['A', 'A'], ['C']])
+        self.assertEqual(self.layout.overflow, [])
+
+        self.layout.addStation({'freq_center': '100.5M', 'bw': '10k', 'name': 'D'})
+        self.assertEqual([entry['name'] for entry in self.layout.rows[0]], ['A', 'D', 'A'])
+
+
+class TestStationStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = stationstore.StationStore([
+            {'freq_center': '118.5M', 'bw': '12.5k', 'name': 'Tower', 'othervalues': {'uniden': {'channel': 3}}},
+            {'freq_center': '99.8M', 'bw': '200k', 'name': 'Radio'},
+            {'freq_center': '433.92M', 'bw': '25k', 'name': 'Sensor tower'},
+        ])
+
+    def test_sort(self):
+        names = [self.store.display(self.store.row(idx), 2) for idx in range(self.store.rowCount())]
+        self.assertEqual(names, ['Radio', 'Tower', 'Sensor tower'])
+
+        self.store.sort(self.store.bwcolumn, True)
+        self.assertEqual(self.store.display(self.store.row(0), 2), 'Radio')
+
+    def test_filter(self):
+        self.store.setFilter('TOWER')
+        self.assertEqual(self.store.rowCount(), 2)
+
+        self.store.append({'freq_center': '120M', 'bw': '10k', 'name': 'Approach tower'})
+        self.assertEqual(self.store.rowCount(), 3)
+
+    def test_update_remove_json(self):
+        self.store.update(1, {'freq_center': '600M', 'bw': '200k', 'name': 'Radio'})
+        self.store.remove([0])
+        jsonfreqs = self.store.toJSON()
+        self.assertEqual([station['name'] for station in jsonfreqs['stations']], ['Sensor tower', 'Radio'])
+        self.assertEqual(jsonfreqs['stations'][0]['mode'], 'UNDEFINED')
+
+
+class TestStationJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'scanresult.json')
+        commons.saveJSON(self.filename, {'stations': [
+            {'freq_center': '118.5M', 'bw': '12.5k', 'name': 'Tower'},
+            {'freq_center': '99.8M', 'bw': '200k', 'name': 'Radio'},
+        ]})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_replay(self):
+        stationjournal = journal.StationJournal(self.filename)
+        stationjournal.record('add', {'freq_center': '433.92M', 'bw': '25k', 'name': 'Sensor'})
+        stationjournal.record(
+            'update', {'freq_center': '118.5M', 'bw': '25k', 'name': 'Approach'},
+            {'freq_center': '118.5M', 'bw': '12.5k', 'name': 'Tower'}
+        )
+        stationjournal.record('delete', {'freq_center': '99.8M', 'bw': '200k', 'name': 'Radio'})
+        stationjournal.flush()
+
+        # Stations file not modified until the compaction
+        self.assertEqual(len(commons.loadJSON(self.filename)['stations']), 2)
+        stations = journal.StationJournal(self.filename).replay(commons.loadJSON(self.filename))
+        self.assertEqual([station['name'] for station in stations['stations']], ['Approach', 'Sensor'])
+
+    def test_compact_rotate(self):
+        stationjournal = journal.StationJournal(self.filename, maxsnapshots=2)
+        for idx in range(3):
+            stationjournal.record('add', {'freq_center': '%sM' % (100 + idx), 'bw': '10k', 'name': 'S%s' % idx})
+            stationjournal.flush()
+            stationjournal.compact({'stations': []})
+
+        self.assertFalse(os.path.exists(stationjournal.journalfilename))
+        self.assertTrue(os.path.exists('%s.2' % self.filename))
+        self.assertFalse(os.path.exists('%s.3' % self.filename))
+        self.assertFalse(stationjournal.isDirty())
+
+    def test_compact_failed(self):
+        stationjournal = journal.StationJournal(self.filename, maxsnapshots=0)
+        stationjournal.record('add', {'freq_center': '433.92M', 'bw': '25k', 'name': 'Sensor'})
+
+        # The edits not yet flushed survive a failed compaction
+        def failedSave(filename, content):
+            raise Exception('Disk full')
+
+        saveJSONAtomic = commons.saveJSONAtomic
+        commons.saveJSONAtomic = failedSave
+        try:
+            self.assertRaises(Exception, stationjournal.compact, {'stations': []})
+        finally:
+            commons.saveJSONAtomic = saveJSONAtomic
+
+        stations = journal.StationJournal(self.filename).replay(commons.loadJSON(self.filename))
+        self.assertEqual([station['name'] for station in stations['stations']], ['Radio', 'Tower', 'Sensor'])
+
+    def test_replay_compacted(self):
+        stationjournal = journal.StationJournal(self.filename)
+        stationjournal.record('add', {'freq_center': '433.92M', 'bw': '25k', 'name': 'Sensor'})
+        stationjournal.flush()
+
+        # Interrupted after the stations file was written, before the journal removal
+        stations = stationjournal.replay(commons.loadJSON(self.filename))
+        commons.saveJSONAtomic(self.filename, stations)
+        stations = journal.StationJournal(self.filename).replay(commons.loadJSON(self.filename))
+        self.assertEqual([station['name'] for station in stations['stations']], ['Radio', 'Tower', 'Sensor'])
+
+
+class TestCursorInspector(unittest.TestCase):
+    def test_readout(self):
+        samples = np.arange(12, dtype=np.float64).reshape((3, 4))
+        cursor = inspector.CursorInspector(samples, 100e6, 1000.0, ['t0', 't1', 't2'])
+        cursor.setSnapStep('2.5k')
+
+        self.assertEqual(cursor.snapPos(6.2), 5.0)
+        self.assertEqual(cursor.readout(2.5, 1.9)['power'], 6.0)
+        self.assertEqual(cursor.readout(2.5, 1.9)['freq'], 100002000.0)
+        self.assertEqual(cursor.readout(2.5, 1.9)['time'], 't1')
+        self.assertIsNone(cursor.readout(4, 0))
+        self.assertIsNone(cursor.readout(0, -1))
+        self.assertIsNone(cursor.readout(-0.5, 1))
+        self.assertIsNone(cursor.readout(1, -0.5))
+        self.assertEqual(list(cursor.timeSlice(1)), [1.0, 5.0, 9.0])
+
+    def test_decimate(self):
+        values = np.array([1, 5, 2, 8, 3, 1, 0, 9], dtype=np.float64)
+        self.assertEqual(list(inspector.decimate(values, 4)), [5.0, 8.0, 3.0, 9.0])
+        self.assertEqual(len(inspector.decimate(values, 16)), 8)
+
+
+class TestUnits(unittest.TestCase):
+    def test_parse_format(self):
+        self.assertEqual(commons.hz2Float('118.5M'), 118.5e6)
+        self.assertEqual(commons.hz2Float('12.5k'), 12500.0)
+        self.assertEqual(commons.hz2Float(1000), 1000)
+        self.assertEqual(commons.sec2Float('2m'), 120.0)
+        self.assertEqual(commons.float2Hz(118.5e6), '118.50M')
+        self.assertEqual(commons.float2Hz(12500.0, 3, True), '0012.500k')
+        self.assertEqual(commons.float2Hz(500.0), '500.0')
+        self.assertEqual(commons.float2Sec(7200), '2.00h')
+
+        # The memo tells the int from the float
+        hz = units.Units(units.HzUnities)
+        self.assertEqual([hz.format(500), hz.format(500.0)], ['500', '500.0'])
+
+    def test_arrays(self):
+        values = units.hz.parseArray(['118.5M', '12.5k', 1000, '118.5M'])
+        self.assertEqual(list(values), [118.5e6, 12500.0, 1000.0, 118.5e6])
+        self.assertEqual(units.hz.parseArray([]).shape, (0,))
+
+        freqs = [118.5e6, 500.0, 12500.0, 118.5e6]
+        self.assertEqual(units.hz.formatArray(freqs), [commons.float2Hz(freq) for freq in freqs])
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.bands = [[108, 174], [25, 88]]
+        self.jsonfreqs = {'stations': [
+            {'freq_center': '20.000M', 'bw': '12.5k', 'name': 'Out', 'mode': 'FM', 'othervalues': {}},
+            {'freq_center': '88.000M', 'bw': '12.5k', 'name': "Radio's", 'mode': 'UNDEFINED', 'othervalues': {}},
+            {'freq_center': '118.500M', 'bw': '12.5k', 'name': 'Tower', 'mode': 'AM',
+             'othervalues': {'uniden': {'channel': 1}}},
+            {'freq_center': '145.500k', 'bw': '12.5k', 'name': 'Low', 'mode': 'FM', 'othervalues': {}},
+            {'freq_center': '160.000M', 'bw': '12.5k', 'name': 'Port', 'mode': 'FM', 'othervalues': {}},
+        ]}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_bands(self):
+        inband = export.inBands([20, 25, 88, 100, 108, 174, 175], self.bands)
+        self.assertEqual(list(inband), [False, True, True, False, True, True, False])
+        self.assertEqual(list(export.inBands([100], [])), [False])
+
+    def test_uniden_channels(self):
+        channels = export.unidenChannels(self.jsonfreqs, self.bands)
+        self.assertEqual([(channel, station['name']) for (channel, station, freq) in channels],
+                         [(1, 'Tower'), (2, "Radio's"), (3, 'Port')])
+        self.assertEqual(len(export.unidenChannels(self.jsonfreqs, self.bands, 2)), 2)
+
+        # By frequency, not by the stations order
+        self.jsonfreqs['stations'].reverse()
+        channels = export.unidenChannels(self.jsonfreqs, self.bands)
+        self.assertEqual([station['name'] for (channel, station, freq) in channels], ['Tower', "Radio's", 'Port'])
+
+    def test_export_files(self):
+        # The shipped config with its uniden bands, rooted in the temporary directory
+        config = commons.loadJSON(os.path.join(os.path.dirname(os.path.abspath(commons.__file__)), 'sdrhunter.json'))
+        config['global']['rootdir'] = self.tmpdir
+        configfile = os.path.join(self.tmpdir, 'sdrhunter.json')
+        commons.saveJSON(configfile, config)
+        config = commons.loadConfigFile(configfile, None)
+        filename = os.path.join(self.tmpdir, 'export.uniden')
+        export.exportStations(filename, self.jsonfreqs, 'uniden', config)
+        content = open(filename).read()
+        self.assertIn("index => '2',\nname => 'Radios',\nfrq => '88.0',\nmod => 'AUTO',", content)
+        self.assertEqual(content.count("cmd => 'CIN'"), 3)
+
+        filename = os.path.join(self.tmpdir, 'export.txt')
+        export.exportStations(filename, self.jsonfreqs, 'txt')
+        self.assertEqual(open(filename).readline(), '20.000M Out\n')
+        self.assertRaises(Exception, export.exportStations, filename, self.jsonfreqs, 'csv')
+
+        # A config without bands leaves the previous export
+        self.assertRaises(Exception, export.exportStations, filename, self.jsonfreqs, 'uniden', {'global': {}})
+        self.assertEqual(open(filename).readline(), '20.000M Out\n')
+
+
+class TestCompare(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_resample(self):
+        values = np.array([[0.0, 10.0, 20.0], [1.0, 2.0, 3.0]])
+        result = compare.resample(values, 100.0, 10.0, [95.0, 100.0, 105.0, 120.0, 125.0])
+        self.assertTrue(np.isnan(result[0, 0]) and np.isnan(result[1, 4]))
+        self.assertEqual(list(result[0, 1:4]), [0.0, 5.0, 20.0])
+
+    def test_comparison(self):
+        reference = os.path.join(self.tmpdir, 'reference.csv')
+        other = os.path.join(self.tmpdir, 'other.csv')
+        writeCSVFile(reference)
+        writeCSVFile(other, nblines=3, nbsamples=32, freq_step=2000.0)
+
+        comparison = compare.Comparison(commons.SDRDatas(reference), [commons.SDRDatas(other)])
+        difference = comparison.compute('difference')
+        self.assertEqual(difference.shape, (3, 128))
+        self.assertTrue(np.isnan(difference[0, -1]))
+        self.assertEqual(np.count_nonzero(np.isnan(comparison.compute('zscore'))), 1 * 3)
+
+        rgb = compare.compareRGB(comparison.compute('ratio'), 'ratio')
+        self.assertEqual(rgb[0, -1], 0)
+        self.assertRaises(Exception, comparison.compute, 'sum')
+
+
+class TestNoiseBaseline(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'baseline.npz')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_update_thresholds(self):
+        noisebaseline = baseline.NoiseBaseline(self.filename, 100e6, 100.008e6, 1000.0, history=4, minobs=3)
+        for (idx, level) in enumerate([-40, -42, -41, -10]):
+            noisebaseline.update(100.002e6, [level] * 4, 'capture%s.summary' % idx)
+        self.assertFalse(noisebaseline.update(100.002e6, [0] * 4, 'capture0.summary'))
+
+        (floor, thresholds) = noisebaseline.thresholds(100e6, 4, minrelativedb=5, nbstd=3)
+        self.assertTrue(np.all(np.isnan(floor[:2])))
+        self.assertEqual(list(floor[2:]), [-40.5, -40.5])
+        self.assertTrue(np.all(thresholds[2:] >= floor[2:] + 5))
+
+        # Reloaded from the file
+        noisebaseline.save()
+        reloaded = baseline.NoiseBaseline(self.filename, 100e6, 100.008e6, 1000.0, history=4, minobs=3)
+        self.assertEqual(list(reloaded.nbobs), [0, 0, 4, 4, 4, 4, 0, 0])
+        self.assertIn('capture3.summary', reloaded.sources)
+
+    def test_search_noisy(self):
+        scanlevel = {
+            'name': 'test', 'scandir': self.tmpdir, 'windows': 256e3, 'binsize': 1000.0, 'interval': 1.0,
+            'quitafter': 64.0, 'minrelativedb': 5, 'minscanbw': 5e3, 'maxscanbw': 50e3,
+        }
+        config = {'global': {'verbose': False, 'baseline': {'nbstd': 3}}}
+        noisebaseline = baseline.NoiseBaseline(self.filename, 100e6, 100.256e6, 1000.0, history=4, minobs=3)
+        filename = SDRHunter.calcFilename(scanlevel, 100e6, 0)
+
+        def search(seed, carriers=None):
+            # A new capture of the same window, with a 2.5 dB noise std
+            samples = synthetic.generateSamples(64, 256, noisestd=2.5, carriers=carriers, seed=seed)
+            start = datetime.datetime(2014, 11, 25, 12, 0, 0) + datetime.timedelta(hours=seed)
+            synthetic.writeCapture('%s.csv' % filename, samples, 4, start=start)
+            commons.datacache.clear()
+            if os.path.isfile('%s.summary' % filename):
+                os.remove('%s.summary' % filename)
+            commons.saveJSON('%s.summary' % filename, commons.SDRDatas('%s.csv' % filename).summaries)
+
+            stationcandidates = []
+            SDRHunter.executeSearchStations(config, stationcandidates, scanlevel, 100e6, 0, noisebaseline)
+            return stationcandidates
+
+        for seed in range(3):
+            search(seed)
+        self.assertEqual(list(noisebaseline.nbobs), [3] * 256)
+
+        # Noise only, the window is skipped
+        self.assertEqual(search(3), [])
+
+        stationcandidates = search(4, [synthetic.carrier(100.128e6, 20e3, -30)])
+        self.assertEqual(len(stationcandidates), 1)
+        self.assertAlmostEqual(stationcandidates[0]['freq_center'], 100.128e6, delta=10e3)
+
+    def test_upper_runs(self):
+        (startups, endups) = SDRHunter.upperRuns(np.array([True, False, True, True, False, True]))
+        self.assertEqual(list(startups), [0, 2, 5])
+        self.assertEqual(list(endups), [0, 3, 5])
+
+
+class TestBursts(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_detect(self):
+        samples = np.zeros((20, 30)) - 50
+        samples[5:7, 10:13] = -20
+        samples[6, 12] = -10
+        samples[15, 25] = -20
+        times = ['2014-11-25 12:00:%02d' % (line * 2) for line in range(20)]
+
+        events = bursts.detectBursts(samples, 100e6, 1000.0, times)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['start'], '2014-11-25 12:00:10')
+        self.assertEqual(events[0]['duration'], 4.0)
+        self.assertEqual(events[0]['freq_center'], 100011000.0)
+        self.assertEqual(events[0]['bw'], 3000.0)
+        self.assertEqual(events[0]['freq_peak'], 100012000.0)
+        self.assertEqual(events[0]['relativedb'], 40.0)
+        self.assertEqual(len(bursts.detectBursts(samples, 100e6, 1000.0, times, minsize=1)), 2)
+
+    def test_line_fraction(self):
+        samples = np.zeros((20, 30)) - 50
+        samples[0:10, 10:13] = -20
+        times = ['2014-11-25 12:00:%02d' % line for line in range(20)]
+        floor = np.zeros(30) - 50
+
+        # Half of the lines is still a burst, not one line more
+        self.assertEqual(len(bursts.detectBursts(samples, 100e6, 1000.0, times, maxlinefraction=0.5, floor=floor)), 1)
+        samples[10, 10:13] = -20
+        self.assertEqual(len(bursts.detectBursts(samples, 100e6, 1000.0, times, maxlinefraction=0.5, floor=floor)), 0)
+
+        # Not seconds
+        self.assertRaises(Exception, bursts.setBurstsDefaults, {'maxlinefraction': 30})
+        self.assertRaises(Exception, bursts.setBurstsDefaults, {'maxduration': 0.5})
+
+    def test_store(self):
+        store = bursts.EventStore(os.path.join(self.tmpdir, 'bursts.sqlite'))
+        event = {
+            'start': '2014-11-25 12:00:10', 'duration': 4.0, 'freq_center': 100011000.0, 'bw': 3000.0,
+            'freq_peak': 100012000.0, 'peakdb': -10.0, 'relativedb': 40.0, 'nbcells': 6
+        }
+        store.add('capture1.csv', [event])
+        store.add('capture2.csv', [])
+        store.add('capture1.csv', [event, dict(event, freq_center=433.92e6)])
+
+        self.assertTrue(store.hasCapture('capture2.csv'))
+        self.assertEqual(len(store.query()), 2)
+        self.assertEqual(len(store.query(freq_min=400e6)), 1)
+        self.assertEqual(len(store.query(start_max='2014-11-25 12:00:00')), 0)
+        store.close()
+
+
+class TestCandidates(unittest.TestCase):
+    def candidate(self, freq_center, powerdb, bw=12500.0):
+        return {'freq_center': freq_center, 'bw': bw, 'powerdb': powerdb, 'relativedb': powerdb + 60}
+
+    def test_cluster(self):
+        found = [
+            self.candidate(145.5e6, -30), self.candidate(100.0e6, -40), self.candidate(145.51e6, -20),
+            self.candidate(145.5e6, -25), self.candidate(433.92e6, -35),
+        ]
+        merged = candidates.clusterCandidates(found)
+        self.assertEqual([(item['freq_center'], item['powerdb'], item['hits']) for item in merged],
+                         [(100.0e6, -40, 1), (145.51e6, -20, 3), (433.92e6, -35, 1)])
+        self.assertEqual(candidates.clusterCandidates([]), [])
+
+    def test_merge_stations(self):
+        stations = {'stations': [{'freq_center': '145.5000M', 'bw': '12.500k', 'name': 'Repeater'}]}
+        found = [self.candidate(145.505e6, -20), self.candidate(433.92e6, -35), self.candidate(433.925e6, -30)]
+
+        added = candidates.mergeStations(stations, found)
+        self.assertEqual(len(added), 1)
+        self.assertEqual(added[0]['freq_center'], '433.93M')
+        self.assertEqual(added[0]['hits'], 2)
+        self.assertEqual([station.get('name') for station in stations['stations']], ['Repeater', None])
+
+
+class TestSynthetic(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_capture(self):
+        filename = os.path.join(self.tmpdir, 'capture.csv')
+        carriers = [synthetic.carrier(100.1e6, 10e3, -20), synthetic.carrier(100.05e6, 2e3, -10, 2, 3)]
+        samples = synthetic.generateCapture(filename, 8, 4, 64, carriers=carriers)
+
+        # Same samples after a rtl_power CSV round trip
+        sdrdatas = commons.SDRDatas(filename)
+        self.assertEqual(sdrdatas.samples.shape, (8, 256))
+        self.assertTrue(np.allclose(sdrdatas.samples, samples, atol=0.01))
+        self.assertEqual(sdrdatas.times[1], '2014-11-25 12:00:01')
+        self.assertTrue(np.all(sdrdatas.samples[:, 100] > -25))
+        self.assertEqual(np.count_nonzero(sdrdatas.samples[:, 50] > -15), 3)
+
+        # Deterministic
+        self.assertTrue(np.array_equal(synthetic.generateSamples(8, 256, seed=1), synthetic.generateSamples(8, 256, seed=1)))
+        self.assertRaises(Exception, synthetic.writeCapture, filename, samples, 3)
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_arguments(self):
+        args = SDRHunter.parse_arguments(['-a', 'infos', '-l', 'home', '--cprofile'])
+        self.assertTrue(args.profile)
+
+    def test_trace(self):
+        filename = os.path.join(self.tmpdir, 'capture.csv')
+        writeCSVFile(filename)
+
+        profiler = profiling.Profiler()
+        with profiler.window('gensummaries', 'test', 100e6, 25):
+            pass
+
+        tracefilename = os.path.join(self.tmpdir, 'profiles', 'trace.jsonl')
+        profiler.start(tracefilename)
+        for idx in range(2):
+            with profiler.window('gensummaries', 'test', 100e6, 25):
+                with profiler.stage('parse'):
+                    profiler.addRead(filename)
+                with profiler.stage('parse'):
+                    pass
+        profiler.stop()
+
+        records = [json.loads(line) for line in open(tracefilename)]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['bytes_read'], os.path.getsize(filename))
+        self.assertEqual(records[0]['stages'].keys(), ['parse'])
+        self.assertEqual([row[:3] for row in profiler.summary()],
+                         [['gensummaries', 'parse', 2], ['gensummaries', 'total', 2]])
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.MetricsRegistry()
+        self.registry.set('sdrhunter_windows_pending', 4, {'scanlevel': 'test'})
+        self.registry.inc('sdrhunter_windows_completed_total', 1, {'scanlevel': 'test'})
+        self.registry.inc('sdrhunter_windows_completed_total', 2, {'scanlevel': 'test'})
+        self.registry.inc('sdrhunter_capture_bytes_total', 1024)
+
+    def test_render(self):
+        content = self.registry.render()
+        self.assertIn('# TYPE sdrhunter_windows_completed_total counter', content)
+        self.assertIn('sdrhunter_windows_completed_total{scanlevel="test"} 3.0', content)
+        self.assertIn('sdrhunter_windows_pending{scanlevel="test"} 4.0', content)
+        self.assertIn('sdrhunter_capture_bytes_total 1024.0', content)
+        self.assertRaises(Exception, self.registry.inc, 'unknown_total')
+
+    def test_server(self):
+        server = metrics.MetricsServer(self.registry, 0)
+        self.assertFalse(self.registry.exported)
+        server.start()
+        self.assertTrue(self.registry.exported)
+        try:
+            url = 'http://127.0.0.1:%s' % server.port
+            response = urllib2.urlopen('%s/metrics' % url)
+            self.assertTrue(response.info()['Content-Type'].startswith('text/plain'))
+            self.assertIn('sdrhunter_capture_bytes_total 1024.0', response.read())
+            self.assertRaises(urllib2.HTTPError, urllib2.urlopen, '%s/other' % url)
+        finally:
+            server.stop()
+        self.assertFalse(self.registry.exported)
+
+
+class TestRetention(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.scandir = os.path.join(self.tmpdir, 'location', 'test')
+        os.makedirs(self.scandir)
+        self.config = {
+            'global': {
+                'rootdir': self.tmpdir,
+                'retention': retention.setRetentionDefaults({'rollupdays': 30, 'highwater': 0.9}),
+            },
+            'scans': [{'name': 'test', 'retention': {'rawdays': 1}}],
+        }
+
+        # A capture of 2 days and another of 40 days
+        self.basenames = []
+        for (name, days) in [('recent', 2), ('old', 40)]:
+            basename = os.path.join(self.scandir, name)
+            writeCSVFile('%s.csv' % basename)
+            open('%s.summary' % basename, 'w').write('{}')
+            open('%s_heatmap.png' % basename, 'w').write('png')
+            open('%s.hparam' % basename, 'w').write('{}')
+            mtime = 1e9 - (days * 86400)
+            os.utime('%s.csv' % basename, (mtime, mtime))
+            self.basenames.append(basename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_defaults(self):
+        # Nothing is removed without a retention in the config
+        config = {'global': {'rootdir': self.tmpdir, 'retention': retention.setRetentionDefaults({})}}
+        result = retention.applyRetention(config, {'name': 'test'}, now=1e9)
+        self.assertEqual((result['compacted'], result['rolledup']), (0, 0))
+        self.assertFalse(retention.enforceHighWater(config, lambda path: 0.99))
+        self.assertFalse(config['global']['retention']['background'])
+
+    def test_apply(self):
+        (recent, old) = self.basenames
+        samples = retention.loadCapture(recent)['samples']
+
+        result = retention.applyRetention(self.config, self.config['scans'][0], now=1e9)
+        self.assertEqual((result['compacted'], result['rolledup']), (1, 1))
+
+        # Compressed samples and summaries
+        self.assertFalse(os.path.isfile('%s.csv' % recent))
+        self.assertFalse(os.path.isfile('%s_heatmap.png' % recent))
+        self.assertTrue(os.path.isfile('%s.summary' % recent))
+        self.assertTrue(os.path.isfile('%s.hparam' % recent))
+        self.assertTrue(retention.isCaptured(recent))
+        self.assertTrue(np.allclose(retention.loadCapture(recent)['samples'], samples))
+
+        # The actions read the compacted capture
+        filename = commons.csvFilename(recent)
+        self.assertEqual(filename, '%s.capture.npz' % recent)
+        sdrdatas = commons.SDRDatas(filename)
+        self.assertEqual(sdrdatas.getFilenameFor('summary'), '%s.summary' % recent)
+        self.assertTrue(np.allclose(sdrdatas.samples, samples))
+
+        # Daily rollup only
+        self.assertFalse(os.path.isfile('%s.summary' % old))
+        self.assertFalse(retention.isCaptured(old))
+        rollup = np.load(os.path.join(self.scandir, 'rollups', '2014-11-25.npz'))
+        self.assertEqual(rollup['old|max'].shape, (128,))
+
+    def test_high_water(self):
+        self.assertFalse(retention.enforceHighWater(self.config, lambda path: 0.5))
+
+        # Compaction is enough for the low water mark
+        usages = [0.95, 0.95, 0.5]
+        self.assertTrue(retention.enforceHighWater(self.config, lambda path: usages.pop(0) if usages else 0.5))
+        self.assertTrue(os.path.isfile('%s.summary' % self.basenames[1]))
+        self.assertFalse(os.path.isfile('%s.csv' % self.basenames[1]))
+
+        self.assertRaises(Exception, retention.enforceHighWater, self.config, lambda path: 0.95)
+
+
+class TestCompressedCSV(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.basename = os.path.join(self.tmpdir, 'capture')
+        writeCSVFile('%s.csv' % self.basename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_filenames(self):
+        self.assertEqual(commons.csvFilename(self.basename), '%s.csv' % self.basename)
+        self.assertEqual(commons.csvBasename('%s.csv.gz' % self.basename), self.basename)
+        self.assertEqual(commons.SDRDatas('%s.csv.zst' % self.basename).getFilenameFor('summary'),
+                         '%s.summary' % self.basename)
+
+    def test_gzip(self):
+        csvfilename = '%s.csv' % self.basename
+        expected = commons.SDRDatas(csvfilename).loadCSVFile(csvfilename)
+
+        gzfilename = '%s.csv.gz' % self.basename
+        with open(csvfilename, 'rb') as f:
+            commons.writeCSVStream(f, gzfilename, 'gz')
+        os.remove(csvfilename)
+        self.assertEqual(commons.csvFilename(self.basename), gzfilename)
+        self.assertEqual(gzip.open(gzfilename).readline()[:20], '2014-11-25, 12:00:00')
+
+        csv = commons.SDRDatas(gzfilename).loadCSVFile(gzfilename)
+        self.assertEqual(csv['times'], expected['times'])
+        self.assertTrue(np.array_equal(csv['samples'], expected['samples']))
+        self.assertRaises(Exception, commons.writeCSVStream, open(gzfilename, 'rb'), gzfilename, 'bz2')
+
+
+class TestHopsReassembly(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.csvfilename = os.path.join(self.tmpdir, 'capture.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def loadLines(self, lines):
+        with open(self.csvfilename, 'w') as f:
+            f.write(''.join(lines))
+        return commons.SDRDatas(self.csvfilename).loadCSVFile(self.csvfilename)
+
+    def test_aligned(self):
+        writeCSVFile(self.csvfilename, nblines=3, nbsubrange=2, nbsamples=4, freq_step=1000.0)
+        csv = commons.SDRDatas(self.csvfilename).loadCSVFile(self.csvfilename)
+        self.assertEqual(csv['samples'].shape, (3, 8))
+        self.assertEqual(csv['times'], ['2014-11-25 12:00:00', '2014-11-25 12:00:01', '2014-11-25 12:00:02'])
+        self.assertEqual((csv['freq_start'], csv['freq_end'], csv['freq_step']), (100e6, 100.008e6, 1000.0))
+
+    def test_uneven_hops(self):
+        # A sweep straddles a second, its second hop has one bin more and a partial last sweep
+        csv = self.loadLines([
+            '2014-11-25, 12:00:00, 1000, 5000, 1000, 8, 1, 2, 3, 4\n',
+            '2014-11-25, 12:00:00, 5000, 9000, 1000, 8, 5, 6, 7, 8, 9\n',
+            '2014-11-25, 12:00:00, 1000, 5000, 1000, 8, 11, 12, 13, 14\n',
+            '2014-11-25, 12:00:01, 5000, 9000, 1000, 8, 15, 16, 17, 18, 19\n',
+            '2014-11-25, 12:00:01, 1000, 5000, 1000, 8, 21, 22, 23, 24\n',
+        ])
+        self.assertEqual(csv['times'], ['2014-11-25 12:00:00', '2014-11-25 12:00:00'])
+        self.assertEqual(csv['samples'].tolist(), [range(1, 9), range(11, 19)])
+
+    def test_malformed_line(self):
+        # The last line of a killed rtl_power, the second hop of its sweep is missing
+        csv = self.loadLines([
+            '2014-11-25, 12:00:00, 1000, 5000, 1000, 8, 1, 2, 3, 4\n',
+            '2014-11-25, 12:00:00, 5000, 9000, 1000, 8, 5, 6, 7, 8\n',
+            '2014-11-25, 12:00:01, 1000, 5000, 1000, 8, 11, 12, 1-\n',
+            '2014-11-25, 12:00:01, 5000, 9000, 1000, 8, 15, 16, 17, 18\n',
+            '2014-11-25, 12:00:02, 1000, 5000, 1000, 8, 21, 22, 23, 24\n',
+            '2014-11-25, 12:00:02, 5000, 9000, 1000, 8, 25, 26, 2',
+        ])
+        self.assertEqual(csv['times'], ['2014-11-25 12:00:00', '2014-11-25 12:00:02'])
+        self.assertEqual(csv['samples'][0].tolist(), range(1, 9))
+        self.assertEqual(csv['samples'][1].tolist(), [21, 22, 23, 24, 25, 26, 2, 2])
+        self.assertEqual(csv['nbmalformed'], 1)
+
+        # Not read as -1 at the end of the capture
+        csv = self.loadLines([
+            '2014-11-25, 12:00:00, 1000, 5000, 1000, 8, 1, 2, 3, 4\n',
+            '2014-11-25, 12:00:01, 1000, 5000, 1000, 8, 11, 12, x\n',
+        ])
+        self.assertEqual(csv['samples'].tolist(), [[1, 2, 3, 4]])
+        self.assertEqual(csv['nbmalformed'], 1)
+
+    def test_other_step(self):
+        # The second hop is interpolated, the gap between the hops is filled
+        csv = self.loadLines([
+            '2014-11-25, 12:00:00, 1000, 4000, 1000, 8, 1, 2, 3\n',
+            '2014-11-25, 12:00:00, 5000, 9000, 2000, 8, 5, 7\n',
+        ])
+        self.assertEqual(csv['freq_step'], 1000.0)
+        self.assertEqual(csv['samples'].tolist(), [[1, 2, 3, 4, 5, 6, 7, 7]])
+
+
+class TestStartup(unittest.TestCase):
+    def test_lazy_imports(self):
+        # The heavy modules are imported by the actions using them
+        (duration, modules) = benchmarks.importModules('SDRHunter.SDRHunter', ['scipy', 'tabulate', 'PIL', 'PySide'])
+        self.assertEqual(modules, [])
+        self.assertLess(duration, 2)
+
+        # And the modules of the workers, servers and archives
+        (duration, modules) = benchmarks.importModules('SDRHunter.SDRHunter', [
+            'SDRHunter.jobs', 'SDRHunter.cluster', 'SDRHunter.transfer', 'SDRHunter.bursts', 'SDRHunter.retention',
+            'SDRHunter.metrics', 'sqlite3', 'SocketServer', 'BaseHTTPServer', 'tarfile'
+        ])
+        self.assertEqual(modules, [])
+
+        # The networking, jobs and archive modules are loaded with the config
+        (duration, modules) = benchmarks.importModules('SDRHunter.commons', ['sqlite3', 'SocketServer', 'tarfile'])
+        self.assertEqual(modules, [])
+
+
+class TestJobs(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.queue = jobs.JobQueue(os.path.join(self.tmpdir, 'jobs.sqlite'))
+
+    def tearDown(self):
+        self.queue.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_queue(self):
+        low = self.queue.submit('gensummaries', 'home')
+        high = self.queue.submit('searchstations', 'home', priority=5)
+        self.assertRaises(Exception, self.queue.submit, 'unknown', 'home')
+
+        self.assertEqual(self.queue.claim(['gensummaries', 'searchstations'])['id'], high)
+        self.assertEqual(self.queue.claim(['searchstations']), None)
+        self.assertEqual(self.queue.claim(['gensummaries'])['id'], low)
+
+        self.queue.finish(high)
+        self.queue.finish(low, 'Traceback')
+        self.assertEqual([job['status'] for job in self.queue.list()], ['failed', 'done'])
+        self.assertEqual(self.queue.wait(high)['status'], 'done')
+
+    def test_worker_concurrency(self):
+        concurrency = jobs.setJobsDefaults({})['concurrency']
+        release = threading.Event()
+        executed = []
+
+        def execute(job):
+            executed.append(job['id'])
+            release.wait(5)
+
+        worker = jobs.JobWorker(self.queue, execute, concurrency)
+        scans = [self.queue.submit('scan', 'home', priority=1) for idx in range(2)]
+        summaries = self.queue.submit('gensummaries', 'home')
+
+        # One scan by dongle, the summaries in the second slot
+        self.assertTrue(worker.step())
+        self.assertTrue(worker.step())
+        self.assertFalse(worker.step())
+        self.assertEqual(sorted([job['id'] for job in worker.running.values()]), [scans[0], summaries])
+
+        release.set()
+        worker.run(maxjobs=1)
+        self.assertEqual([job['status'] for job in self.queue.list()], ['done'] * 3)
+        self.assertEqual(sorted(executed), sorted(scans + [summaries]))
+
+    def test_worker_locations(self):
+        release = threading.Event()
+        worker = jobs.JobWorker(self.queue, lambda job: release.wait(5), jobs.setJobsDefaults({})['concurrency'])
+        first = self.queue.submit('searchstations', 'home')
+        self.queue.submit('searchstations', 'home')
+        other = self.queue.submit('searchstations', 'car')
+
+        # One writer by location, the second job of home waits
+        self.assertTrue(worker.step())
+        self.assertTrue(worker.step())
+        self.assertEqual(sorted([job['id'] for job in worker.running.values()]), [first, other])
+        self.assertEqual(self.queue.claim(['searchstations'], ['home', 'car']), None)
+
+        release.set()
+        worker.run(maxjobs=1)
+        self.assertEqual([job['status'] for job in self.queue.list()], ['done'] * 3)
+
+    def test_worker_arguments(self):
+        execute = lambda job: SDRHunter.parse_arguments(['-a', job['action'], '-l', job['location']])
+        worker = jobs.JobWorker(self.queue, execute, jobs.setJobsDefaults({})['concurrency'])
+        jobid = self.queue.submit('searchstations', '-x')
+
+        # The usage error of argparse
+        stderr = sys.stderr
+        sys.stderr = open(os.devnull, 'w')
+        try:
+            worker.runJob(self.queue.claim(jobs.ACTIONS))
+        finally:
+            sys.stderr.close()
+            sys.stderr = stderr
+
+        job = self.queue.get(jobid)
+        self.assertEqual(job['status'], 'failed')
+        self.assertIn('SystemExit', job['error'])
+
+
+class TestCluster(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.windows = [{'scanlevel': 'test', 'start': 100e6 + (idx * 256e3), 'gain': 25} for idx in range(6)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_lease_expiry(self):
+        plan = cluster.SweepPlan(self.windows[:2], lease=10)
+        first = plan.acquire('pi1', now=0)
+        second = plan.acquire('pi2', now=0)
+        self.assertEqual(plan.acquire('pi3', now=5), None)
+
+        # The first worker is alive, the second lease expires
+        self.assertTrue(plan.heartbeat(first['lease'], now=8))
+        third = plan.acquire('pi3', now=15)
+        self.assertEqual(third['window'], second['window'])
+        self.assertFalse(plan.heartbeat(second['lease'], now=15))
+
+        self.assertEqual(plan.complete(second['lease']), None)
+        plan.complete(first['lease'])
+        plan.complete(third['lease'])
+        self.assertTrue(plan.finished())
+
+    def test_localhost_sweep(self):
+        def capturefilename(window, ext):
+            return os.path.join(self.tmpdir, 'coordinator', '%(scanlevel)s-%(start)d-%(gain)s' % window + ext)
+
+        plan = cluster.SweepPlan(self.windows, lease=5)
+        coordinator = cluster.Coordinator(plan, capturefilename, '127.0.0.1', 0)
+        coordinator.start()
+
+        def capture(window):
+            if window['start'] == self.windows[1]['start'] and not failed:
+                failed.append(window)
+                raise Exception('rtl_power failed')
+            filename = os.path.join(self.tmpdir, 'worker-%(start)d.csv.gz' % window)
+            writeCSVFile(filename, freq_start=window['start'])
+            open(os.path.join(self.tmpdir, 'worker-%(start)d.scaninfo' % window), 'w').write('{}')
+            return filename
+
+        failed = []
+        results = []
+        workers = [
+            cluster.ClusterWorker(('127.0.0.1', coordinator.port), 'pi%s' % idx, capture, heartbeat=0.05, poll=0.05)
+            for idx in range(2)
+        ]
+        threads = [threading.Thread(target=lambda worker=worker: results.append(worker.run())) for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        coordinator.stop()
+
+        # Each window captured once, the failed one by a worker again
+        self.assertEqual(sum(results), 6)
+        self.assertEqual(len(failed), 1)
+        self.assertEqual(plan.status(), {'pending': 0, 'leased': 0, 'done': 6})
+        received = sorted(os.listdir(os.path.join(self.tmpdir, 'coordinator')))
+        expected = ['test-%d-25%s' % (window['start'], ext) for window in self.windows for ext in ['.csv.gz', '.scaninfo']]
+        self.assertEqual(received, sorted(expected))
+        self.assertEqual(os.listdir(self.tmpdir), ['coordinator'])
+
+    def test_coordinator_lost(self):
+        # The failure can't be reported, the worker stops after its retries
+        coordinator = cluster.Coordinator(cluster.SweepPlan(self.windows, lease=5), None, '127.0.0.1', 0)
+        coordinator.start()
+
+        def capture(window):
+            coordinator.stop()
+            raise Exception('rtl_power failed')
+
+        worker = cluster.ClusterWorker(('127.0.0.1', coordinator.port), 'pi1', capture, poll=0.01, retries=1)
+        self.assertEqual(worker.run(), 0)
+
+
+class TestTransfer(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.scannerdir = os.path.join(self.tmpdir, 'scanner')
+        self.scandir = os.path.join(self.scannerdir, 'home', 'test')
+        os.makedirs(self.scandir)
+
+        # A finished capture with sidecars, a compressed one, and a running one
+        writeCSVFile(os.path.join(self.scandir, 'a.csv'))
+        open(os.path.join(self.scandir, 'a.summary'), 'w').write('{}')
+        with open(os.path.join(self.scandir, 'a.csv'), 'rb') as f:
+            commons.writeCSVStream(f, os.path.join(self.scandir, 'b.csv.gz'), 'gz')
+        open(os.path.join(self.scandir, 'c.running'), 'w').write('partial')
+        open(os.path.join(self.scandir, 'c.scaninfo'), 'w').write('{}')
+
+        self.analysisdir = os.path.join(self.tmpdir, 'analysis')
+        os.makedirs(self.analysisdir)
+        self.receiver = transfer.Receiver(self.analysisdir, '127.0.0.1', 0, maxbusy=1)
+        self.receiver.start()
+
+    def tearDown(self):
+        self.receiver.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def sender(self):
+        return transfer.Sender(self.scannerdir, ('127.0.0.1', self.receiver.port), batchsize=1024, retry=0.05)
+
+    def test_batches(self):
+        files = [{'path': 'f%s.csv' % idx, 'size': size} for (idx, size) in enumerate([100, 800, 300, 5000, 10])]
+        self.assertEqual([len(batch) for batch in transfer.makeBatches(files, 1024)], [2, 1, 1, 1])
+        self.assertEqual(transfer.batchCompression(files[:1]), 'gz')
+        self.assertEqual(transfer.batchCompression([{'path': 'b.csv.gz'}]), None)
+        self.assertRaises(Exception, transfer.safePath, self.analysisdir, '../outside')
+
+    def test_send_resume(self):
+        self.assertEqual(self.sender().send([self.scandir]), 3)
+        received = sorted(os.listdir(os.path.join(self.analysisdir, 'home', 'test')))
+        self.assertEqual(received, ['a.csv', 'a.summary', 'b.csv.gz'])
+        for name in received:
+            self.assertEqual(transfer.fileHash(os.path.join(self.analysisdir, 'home', 'test', name)),
+                             transfer.fileHash(os.path.join(self.scandir, name)))
+
+        # The manifest keeps the sent files, only the modified ones are sent again
+        self.assertEqual(self.sender().send([self.scandir]), 0)
+        open(os.path.join(self.scandir, 'a.summary'), 'w').write('{"avg": {}}')
+        self.assertEqual(self.sender().send([self.scandir]), 1)
+
+    def test_back_pressure(self):
+        self.receiver.slots.acquire()
+        threading.Timer(0.2, self.receiver.slots.release).start()
+
+        sender = self.sender()
+        self.assertEqual(sender.send([self.scandir]), 3)
+        self.assertTrue(sender.nbbusy > 0)
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'stations.json')
+        commons.saveJSON(self.filename, {'stations': []})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_hits_and_misses(self):
+        cache = commons.LRUCache()
+        first = cache.load(self.filename, commons.loadJSON)
+        second = cache.load(self.filename, commons.loadJSON)
+        self.assertIs(first, second)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_reload_modified_file(self):
+        cache = commons.LRUCache()
+        cache.load(self.filename, commons.loadJSON)
+        commons.saveJSON(self.filename, {'stations': [{'freq_center': '118.5M'}]})
+        content = cache.load(self.filename, commons.loadJSON)
+        self.assertEqual(len(content['stations']), 1)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_eviction(self):
+        cache = commons.LRUCache(maxsize=1)
+        for idx in range(3):
+            cache.load(self.filename, commons.loadJSON, 'json%s' % idx, lambda content: 400 * 1024)
+
+        self.assertEqual(cache.stats()['nbitems'], 2)
+        self.assertNotIn(('json0', os.path.realpath(self.filename)), cache.items)
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)